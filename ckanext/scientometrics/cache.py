@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.scientometrics import config
+
+log = logging.getLogger(__name__)
+
+_cache: MetricsCache | None = None
+_lock = threading.Lock()
+
+# key of `Session.info` with users whose cached metrics are dropped on commit
+_PENDING_INVALIDATION = "scim_invalidate_metrics"
+
+
+class MetricsCache:
+    """Base class for caches of user metrics.
+
+    Values are JSON-serializable dicts, keyed by user ID.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    def get(self, user_id: str) -> dict[str, Any] | None:
+        """Return cached metrics or None if they are missing or expired."""
+        raise NotImplementedError
+
+    def set(self, user_id: str, value: dict[str, Any]):
+        """Cache metrics of the user."""
+        raise NotImplementedError
+
+    def get_many(self, user_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """Return cached metrics of multiple users, omitting missing ones."""
+        result: dict[str, dict[str, Any]] = {}
+        for user_id in user_ids:
+            value = self.get(user_id)
+            if value is not None:
+                result[user_id] = value
+        return result
+
+    def set_many(self, values: dict[str, dict[str, Any]]):
+        """Cache metrics of multiple users."""
+        for user_id, value in values.items():
+            self.set(user_id, value)
+
+    def invalidate(self, user_id: str):
+        """Drop cached metrics of the user."""
+        raise NotImplementedError
+
+    def invalidate_many(self, user_ids: Iterable[str]):
+        """Drop cached metrics of multiple users."""
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+
+class NullCache(MetricsCache):
+    """Cache that never keeps anything."""
+
+    def get(self, user_id: str) -> dict[str, Any] | None:
+        return None
+
+    def set(self, user_id: str, value: dict[str, Any]):
+        pass
+
+    def invalidate(self, user_id: str):
+        pass
+
+
+class MemoryCache(MetricsCache):
+    """In-process LRU cache with TTL.
+
+    Every process/worker keeps its own copy, so entries invalidated by
+    another process remain visible here until they expire.
+    """
+
+    def __init__(self, ttl: int, size: int):
+        super().__init__(ttl)
+        self.size = size
+        self._data: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is None:
+                return None
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[user_id]
+                return None
+
+            self._data.move_to_end(user_id)
+        return copy.deepcopy(value)
+
+    def set(self, user_id: str, value: dict[str, Any]):
+        with self._lock:
+            self._data[user_id] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+
+class RedisCache(MetricsCache):
+    """Cache shared by all CKAN processes, stored in Redis."""
+
+    def __init__(self, ttl: int):
+        super().__init__(ttl)
+        site_id = tk.config["ckan.site_id"]
+        self.prefix = f"ckan:{site_id}:scim:user_metrics:"
+
+    def get(self, user_id: str) -> dict[str, Any] | None:
+        value = connect_to_redis().get(self.prefix + user_id)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, user_id: str, value: dict[str, Any]):
+        connect_to_redis().setex(self.prefix + user_id, self.ttl, json.dumps(value))
+
+    def get_many(self, user_ids: list[str]) -> dict[str, dict[str, Any]]:
+        if not user_ids:
+            return {}
+        values = connect_to_redis().mget([self.prefix + user_id for user_id in user_ids])
+        return {
+            user_id: json.loads(value) for user_id, value in zip(user_ids, values, strict=True) if value is not None
+        }
+
+    def set_many(self, values: dict[str, dict[str, Any]]):
+        if not values:
+            return
+        pipe = connect_to_redis().pipeline(transaction=False)
+        for user_id, value in values.items():
+            pipe.setex(self.prefix + user_id, self.ttl, json.dumps(value))
+        pipe.execute()
+
+    def invalidate(self, user_id: str):
+        connect_to_redis().delete(self.prefix + user_id)
+
+    def invalidate_many(self, user_ids: Iterable[str]):
+        keys = [self.prefix + user_id for user_id in user_ids]
+        if keys:
+            connect_to_redis().delete(*keys)
+
+
+def get_cache() -> MetricsCache:
+    """Cache configured by `ckanext.scientometrics.cache.*` options."""
+    global _cache  # noqa: PLW0603
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = _make_cache()
+    return _cache
+
+
+def reset():
+    """Forget the current cache, so it's rebuilt from config on next access."""
+    global _cache  # noqa: PLW0603
+    _cache = None
+
+
+def invalidate_on_commit(session: Session, user_ids: Iterable[str]):
+    """Drop cached metrics of users once the session's transaction is committed.
+
+    Invalidating before commit lets a concurrent reader cache the old
+    committed rows again.
+    """
+    session.info.setdefault(_PENDING_INVALIDATION, set()).update(user_ids)
+
+
+@sa.event.listens_for(model.Session, "after_commit")
+def _invalidate_committed(session: Session):
+    user_ids = session.info.pop(_PENDING_INVALIDATION, None)
+    if user_ids:
+        get_cache().invalidate_many(user_ids)
+
+
+def _make_cache() -> MetricsCache:
+    backend = config.cache_backend()
+    ttl = config.cache_ttl()
+    if not ttl or backend == "none":
+        return NullCache(ttl)
+    if backend == "redis":
+        return RedisCache(ttl)
+    return MemoryCache(ttl, config.cache_size())
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any
+
+import ckan.plugins.toolkit as tk
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.scientometrics import config
+from ckanext.scientometrics.sessions import ProviderError
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+_breakers: dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+
+
+class CircuitOpenError(ProviderError):
+    """Requests to the provider are suspended after consecutive failures."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is unavailable, requests are suspended")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    """Stops requests to a provider after a number of consecutive failures.
+
+    Breaker opens after `threshold` consecutive failures and rejects all
+    requests for `cooldown` seconds. Then it becomes half-open and lets a
+    single probe request through: success closes the breaker, failure opens
+    it for another cooldown.
+    """
+
+    #: breaker talks to an external service, so coroutines call it from a worker thread
+    blocking: bool = False
+
+    def __init__(self, provider: str, threshold: int, cooldown: int):
+        self.provider = provider
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def allow(self) -> bool:
+        """Decide whether the request can be sent."""
+        raise NotImplementedError
+
+    def record_success(self):
+        raise NotImplementedError
+
+    def record_failure(self):
+        raise NotImplementedError
+
+    def status(self) -> dict[str, Any]:
+        """Current state, number of consecutive failures and opening time."""
+        raise NotImplementedError
+
+    def _state(self, opened_at: float | None) -> str:
+        if opened_at is None:
+            return STATE_CLOSED
+        if time.time() < opened_at + self.cooldown:
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+
+
+class MemoryCircuitBreaker(CircuitBreaker):
+    """Breaker that keeps state in the current process."""
+
+    def __init__(self, provider: str, threshold: int, cooldown: int):
+        super().__init__(provider, threshold, cooldown)
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state(self._opened_at)
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_OPEN or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.time()
+            self._probing = False
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state(self._opened_at),
+                "failures": self._failures,
+                "opened_at": self._opened_at,
+            }
+
+
+class RedisCircuitBreaker(CircuitBreaker):
+    """Breaker that shares state between all processes using the same Redis."""
+
+    blocking = True
+
+    def __init__(self, provider: str, threshold: int, cooldown: int):
+        super().__init__(provider, threshold, cooldown)
+        site_id = tk.config["ckan.site_id"]
+        self.key = f"ckan:{site_id}:scim:circuit:{provider}"
+
+    def allow(self) -> bool:
+        conn = connect_to_redis()
+        state = self._state(self._opened_at(conn.hget(self.key, "opened_at")))
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_OPEN:
+            return False
+        # only one process gets the probe
+        return bool(conn.set(self.key + ":probe", 1, nx=True, ex=max(self.cooldown, 1)))
+
+    def record_success(self):
+        connect_to_redis().delete(self.key, self.key + ":probe")
+
+    def record_failure(self):
+        conn = connect_to_redis()
+        failures = conn.hincrby(self.key, "failures", 1)
+        probing = conn.delete(self.key + ":probe")
+        if probing or failures >= self.threshold:
+            conn.hset(self.key, "opened_at", time.time())
+
+    def status(self) -> dict[str, Any]:
+        data = connect_to_redis().hgetall(self.key)
+        opened_at = self._opened_at(data.get(b"opened_at"))
+        return {
+            "state": self._state(opened_at),
+            "failures": int(data.get(b"failures") or 0),
+            "opened_at": opened_at,
+        }
+
+    def _opened_at(self, value: bytes | None) -> float | None:
+        return float(value) if value else None
+
+
+def get_breaker(provider: str) -> CircuitBreaker | None:
+    """Breaker of the provider or None if breakers are disabled."""
+    if not config.circuit_breaker_threshold():
+        return None
+
+    if provider not in _breakers:
+        with _lock:
+            if provider not in _breakers:
+                _breakers[provider] = _make_breaker(provider)
+    return _breakers[provider]
+
+
+def statuses(providers: Iterable[str]) -> dict[str, dict[str, Any]]:
+    """Status of breakers of the given providers."""
+    result: dict[str, dict[str, Any]] = {}
+    for provider in providers:
+        breaker = get_breaker(provider)
+        if breaker:
+            result[provider] = breaker.status()
+    return result
+
+
+def reset():
+    """Forget existing breakers, so they are rebuilt from config on next access."""
+    _breakers.clear()
+
+
+def _make_breaker(provider: str) -> CircuitBreaker:
+    threshold = config.circuit_breaker_threshold()
+    cooldown = config.circuit_breaker_cooldown()
+    if config.circuit_breaker_backend() == "redis":
+        return RedisCircuitBreaker(provider, threshold, cooldown)
+    return MemoryCircuitBreaker(provider, threshold, cooldown)
@@ -1,9 +1,13 @@
+import json
+from datetime import timedelta
+
 import click
 
-import ckan.plugins.toolkit as tk
 from ckan import model
 
-from ckanext.scientometrics import config
+from ckanext.scientometrics import circuit, config, payloads, stats, utils
+from ckanext.scientometrics.model import DatasetMetric, RefreshRun, UserMetric, UserMetricRank
+from ckanext.scientometrics.refresh import AsyncBulkRefresher, BulkRefresher, DatasetRefresher, pending_tasks
 
 __all__ = [
     "scim",
@@ -30,21 +34,290 @@ def scim():
     multiple=True,
     help="The sources to update the metrics for.",
 )
-def update_user_metrics(user_ids: tuple, requested_sources: tuple):
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="The number of concurrent requests to external sources.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["threads", "asyncio"]),
+    default="threads",
+    show_default=True,
+    help="Concurrency model: a pool of worker threads or a single event loop.",
+)
+@click.option(
+    "--max-age",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Skip metrics refreshed less than this number of seconds ago.",
+)
+@click.option(
+    "--stats-file",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write JSON summary of timings and outcomes to this file.",
+)
+@click.option(
+    "--resume",
+    is_flag=False,
+    flag_value="latest",
+    default=None,
+    metavar="[RUN_ID]",
+    help=(
+        "Continue the interrupted run, skipping pairs it has already refreshed. RUN_ID can be omitted when there "
+        "is a single unfinished run, or a single one of the shard given by --shard. Completed runs cannot be resumed."
+    ),
+)
+@click.option(
+    "--shard",
+    callback=lambda _ctx, _param, value: _parse_shard(value),
+    default=None,
+    metavar="I/N",
+    help="Refresh only users of the shard I out of N, where I is from 0 to N-1.",
+)
+def update_user_metrics(  # noqa: PLR0913, PLR0917
+    user_ids: tuple,
+    requested_sources: tuple,
+    workers: int,
+    engine: str,
+    max_age: int | None,
+    stats_file: str | None,
+    resume: str | None,
+    shard: tuple[int, int] | None,
+):
     """Update the metrics for all users.
 
     If a user_ids is provided, only update the metrics for those users.
     If requested_sources is provided, only update the metrics for those sources.
+    If max_age is provided, only update metrics that are older or missing.
+    Requests to external sources are spread between workers, respecting
+    per-source limits from `ckanext.scientometrics.refresh.source_limits`.
+    With asyncio engine, workers is the number of requests kept in flight by
+    a single event loop.
+    If stats_file is provided, summary of timings and outcomes is written there.
+    Every run is checkpointed with each commit. With resume, the interrupted
+    run continues with its original arguments and skips pairs it has already
+    processed, except failed ones. A run that is still running cannot be
+    resumed until its lease (`ckanext.scientometrics.refresh.run_lease`)
+    expires, and a completed run cannot be resumed at all: its failed pairs
+    are retried by a new run with max_age.
+    With shard, users are split into N disjoint groups by hash of user ID, so
+    N nodes can share a refresh without coordination.
     """
-    if not user_ids:
-        user_ids = [user.id for user in model.User.all()]
+    if resume:
+        refresh_run = _resumed_run(resume, shard)
+        user_ids = tuple(refresh_run.params["user_ids"] or ())
+        requested_sources = tuple(refresh_run.params["sources"])
+        max_age = refresh_run.params["max_age"]
+        shard = _parse_shard(refresh_run.params.get("shard"))
+        click.echo(f"Resuming refresh run {refresh_run.id}")
+    else:
+        if not requested_sources:
+            requested_sources = config.enabled_metrics()
+        refresh_run = RefreshRun.start(
+            {
+                "user_ids": list(user_ids) or None,
+                "sources": list(requested_sources),
+                "max_age": max_age,
+                "shard": f"{shard[0]}/{shard[1]}" if shard else None,
+            }
+        )
+        model.Session.commit()
+        click.echo(f"Started refresh run {refresh_run.id}")
 
-    if not requested_sources:
-        requested_sources = config.enabled_metrics()
-    with click.progressbar(user_ids, label="Updating user metrics") as bar:
-        for user_id in bar:
-            tk.get_action("scim_update_user_metrics")(
-                {"ignore_auth": True}, {"user_id": user_id, "requested_sources": requested_sources}
+    age = timedelta(seconds=max_age) if max_age is not None else None
+    users = user_ids or None
+    total = UserMetric.refresh_candidates(users, requested_sources, age, run_id=refresh_run.id, shard=shard).count()
+
+    stats.reset()
+    factory = AsyncBulkRefresher if engine == "asyncio" else BulkRefresher
+    refresher = factory(workers, config.source_limits())
+    try:
+        with click.progressbar(length=total, label="Updating user metrics") as bar:
+            summary = refresher.run(
+                pending_tasks(users, requested_sources, age, run_id=refresh_run.id, shard=shard),
+                on_task_done=lambda _: bar.update(1),
+                refresh_run=refresh_run,
             )
+    except BaseException:
+        # keep committed checkpoints and let the next `--resume` continue at once
+        model.Session.rollback()
+        refresh_run.interrupt()
+        model.Session.commit()
+        raise
+    refresh_run.finish()
+    model.Session.commit()
+
+    click.echo(
+        f"Metrics update complete! Processed: {summary.total}, updated: {summary.updated}, "
+        f"empty: {summary.empty}, failed: {summary.failed}, skipped: {summary.skipped}"
+    )
+    _report_stats(stats_file)
+    if summary.updated:
+        _refresh_ranks()
+    for provider, status in circuit.statuses(utils.source_providers(requested_sources)).items():
+        if status["state"] != circuit.STATE_CLOSED:
+            click.secho(
+                f"Requests to {provider} are suspended after {status['failures']} consecutive failures",
+                fg="yellow",
+            )
+
+
+@scim.command()
+@click.option(
+    "--package-ids",
+    type=str,
+    default=(),
+    multiple=True,
+    help="The dataset ID to update the metrics for.",
+)
+@click.option(
+    "--requested-sources",
+    type=str,
+    default=(),
+    multiple=True,
+    help="The sources to update the metrics for.",
+)
+@click.option(
+    "--max-age",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Skip metrics refreshed less than this number of seconds ago.",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help="The number of datasets loaded and committed together.",
+)
+@click.option("--reindex/--no-reindex", default=True, show_default=True, help="Update search index of datasets.")
+@click.option(
+    "--stats-file",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write JSON summary of timings and outcomes to this file.",
+)
+def update_dataset_metrics(  # noqa: PLR0913, PLR0917
+    package_ids: tuple,
+    requested_sources: tuple,
+    max_age: int | None,
+    chunk_size: int,
+    reindex: bool,
+    stats_file: str | None,
+):
+    """Update citation metrics of datasets that have DOI.
+
+    Datasets are streamed from the database in chunks, so the whole catalog
+    is never loaded into memory.
+    """
+    if not requested_sources:
+        requested_sources = config.dataset_enabled_metrics()
+
+    age = timedelta(seconds=max_age) if max_age is not None else None
+    packages = package_ids or None
+    stats.reset()
+    refresher = DatasetRefresher(chunk_size, reindex)
+    for source in requested_sources:
+        total = DatasetMetric.refresh_candidates(source, config.dataset_doi_field(), packages, age).count()
+        with click.progressbar(length=total, label=f"Updating {source} dataset metrics") as bar:
+            summary = refresher.run(source, packages, age, on_chunk_done=bar.update)
+
+        click.echo(
+            f"{source}: processed: {summary.total}, updated: {summary.updated}, "
+            f"empty: {summary.empty}, failed: {summary.failed}, skipped: {summary.skipped}"
+        )
+    _report_stats(stats_file)
+
+
+def _parse_shard(value: str | None) -> tuple[int, int] | None:
+    if not value:
+        return None
+
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        shard = (-1, 0)
+    if not 0 <= shard[0] < shard[1]:
+        msg = f"Shard must be I/N, where 0 <= I < N, got {value}"
+        raise click.BadParameter(msg)
+    return shard
+
+
+def _resumed_run(run_id: str, shard: tuple[int, int] | None) -> RefreshRun:
+    shard_param = f"{shard[0]}/{shard[1]}" if shard else None
+    if run_id == "latest":
+        # runs of other nodes share the table, so never guess between them
+        runs = RefreshRun.unfinished(shard_param)
+        if len(runs) > 1:
+            ids = ", ".join(run.id for run in runs)
+            msg = f"There are {len(runs)} unfinished refresh runs, pass RUN_ID of one of them: {ids}"
+            raise click.ClickException(msg)
+        refresh_run = runs[0] if runs else None
+    else:
+        refresh_run = RefreshRun.get(run_id)
+
+    if not refresh_run:
+        msg = "There is no refresh run to resume"
+        raise click.ClickException(msg)
+    if shard_param and refresh_run.params.get("shard") != shard_param:
+        msg = f"Refresh run {refresh_run.id} belongs to shard {refresh_run.params.get('shard')}, not {shard_param}"
+        raise click.ClickException(msg)
+    if refresh_run.status == RefreshRun.STATUS_COMPLETED:
+        # outcomes of refreshed pairs are dropped on completion, so resume would start from scratch
+        msg = (
+            f"Refresh run {refresh_run.id} is already completed and cannot be resumed, "
+            "start a new run with --max-age to retry its failed pairs"
+        )
+        raise click.ClickException(msg)
+    if not refresh_run.claim(config.refresh_run_lease()):
+        msg = f"Refresh run {refresh_run.id} is still running, the last checkpoint was at {refresh_run.updated_at}"
+        raise click.ClickException(msg)
+    model.Session.commit()
+    return refresh_run
+
+
+def _report_stats(stats_file: str | None):
+    """Print per-source timings, keep them for `scim_refresh_stats` and write them to the file."""
+    snapshot = stats.get_collector().flush()
+    for source, data in snapshot["sources"].items():
+        parts = [f"calls: {data['calls']}", f"failed: {data['failed_calls']}"]
+        latency = data["latency"]
+        if latency["mean"] is not None:
+            parts.append(f"mean: {latency['mean']:.2f}s, p95: {latency['p95']:.2f}s")
+        click.echo(f"{source}: " + ", ".join(parts))
+
+    upsert = snapshot["upsert"]
+    click.echo(f"Written {upsert['rows']} rows in {upsert['seconds']:.2f}s, {upsert['rows_per_second']:.1f} rows/s")
+
+    stats.save_last_run(snapshot)
+    if stats_file:
+        with open(stats_file, "w") as dest:
+            json.dump(snapshot, dest, indent=2)
+
+
+@scim.command()
+def refresh_user_ranks():
+    """Rebuild the materialized view used for ranking users by metrics."""
+    _refresh_ranks()
+    click.echo("User ranks refreshed")
+
+
+def _refresh_ranks():
+    UserMetricRank.refresh()
+    model.Session.commit()
+
+
+@scim.command()
+def purge_payload_cache():
+    """Remove expired provider responses from the payload cache."""
+    payload_cache = payloads.get_payload_cache()
+    if not isinstance(payload_cache, payloads.SqlitePayloadCache):
+        click.echo("Payload cache is disabled")
+        return
 
-    click.echo("Metrics update complete!")
+    click.echo(f"Removed {payload_cache.purge()} expired records")
@@ -1,9 +1,41 @@
 from __future__ import annotations
 
+from datetime import timedelta
+
 import ckan.plugins.toolkit as tk
 
 CONFIG_ENABLED_METRICS = "ckanext.scientometrics.enabled_metrics"
 CONFIG_SHOW_ON_USER_PAGE = "ckanext.scientometrics.show_on_user_page"
+CONFIG_DATASET_ENABLED_METRICS = "ckanext.scientometrics.dataset.enabled_metrics"
+CONFIG_DATASET_DOI_FIELD = "ckanext.scientometrics.dataset.doi_field"
+CONFIG_INDEX_METRICS = "ckanext.scientometrics.index.metrics"
+CONFIG_SOURCE_LIMITS = "ckanext.scientometrics.refresh.source_limits"
+CONFIG_RATE_LIMITS = "ckanext.scientometrics.rate_limit.rates"
+CONFIG_RATE_LIMIT_BACKEND = "ckanext.scientometrics.rate_limit.backend"
+CONFIG_RATE_LIMIT_MAX_ATTEMPTS = "ckanext.scientometrics.rate_limit.max_attempts"
+CONFIG_RATE_LIMIT_BASE_BACKOFF = "ckanext.scientometrics.rate_limit.base_backoff"
+CONFIG_RATE_LIMIT_MAX_BACKOFF = "ckanext.scientometrics.rate_limit.max_backoff"
+CONFIG_CIRCUIT_BREAKER_THRESHOLD = "ckanext.scientometrics.circuit_breaker.threshold"
+CONFIG_CIRCUIT_BREAKER_COOLDOWN = "ckanext.scientometrics.circuit_breaker.cooldown"
+CONFIG_CIRCUIT_BREAKER_BACKEND = "ckanext.scientometrics.circuit_breaker.backend"
+CONFIG_CREDENTIALS_API_KEYS = "ckanext.scientometrics.credentials.api_keys"
+CONFIG_CREDENTIALS_PROXIES = "ckanext.scientometrics.credentials.proxies"
+CONFIG_CREDENTIALS_COOLDOWN = "ckanext.scientometrics.credentials.cooldown"
+CONFIG_HTTP_POOL_SIZE = "ckanext.scientometrics.http.pool_size"
+CONFIG_HTTP_TIMEOUT = "ckanext.scientometrics.http.timeout"
+CONFIG_PAYLOAD_CACHE_PATH = "ckanext.scientometrics.payload_cache.path"
+CONFIG_PAYLOAD_CACHE_TTL = "ckanext.scientometrics.payload_cache.ttl"
+CONFIG_STATS_EXPORTER = "ckanext.scientometrics.stats.exporter"
+CONFIG_STATS_STATSD_ADDRESS = "ckanext.scientometrics.stats.statsd_address"
+CONFIG_STATS_PREFIX = "ckanext.scientometrics.stats.prefix"
+CONFIG_STATS_PUSHGATEWAY = "ckanext.scientometrics.stats.pushgateway"
+CONFIG_OPENALEX_EMAIL = "ckanext.scientometrics.openalex.email"
+CONFIG_REFRESH_ON_UPDATE = "ckanext.scientometrics.refresh.on_user_update"
+CONFIG_REFRESH_QUEUE = "ckanext.scientometrics.refresh.queue"
+CONFIG_REFRESH_RUN_LEASE = "ckanext.scientometrics.refresh.run_lease"
+CONFIG_CACHE_BACKEND = "ckanext.scientometrics.cache.backend"
+CONFIG_CACHE_TTL = "ckanext.scientometrics.cache.ttl"
+CONFIG_CACHE_SIZE = "ckanext.scientometrics.cache.size"
 
 
 def enabled_metrics() -> list[str]:
@@ -14,3 +46,170 @@ def enabled_metrics() -> list[str]:
 def show_metrics_on_user_page() -> bool:
     """Show metrics on user page in the info section."""
     return tk.config[CONFIG_SHOW_ON_USER_PAGE]
+
+
+def dataset_enabled_metrics() -> list[str]:
+    """List of enabled sources of dataset metrics."""
+    return tk.config[CONFIG_DATASET_ENABLED_METRICS]
+
+
+def dataset_doi_field() -> str:
+    """Name of the dataset field that contains DOI."""
+    return tk.config[CONFIG_DATASET_DOI_FIELD]
+
+
+def index_metrics() -> list[str]:
+    """Numeric dataset metrics added to the search index."""
+    return tk.config[CONFIG_INDEX_METRICS]
+
+
+def source_limits() -> dict[str, int]:
+    """Max number of concurrent requests per source during bulk refresh."""
+    limits: dict[str, int] = {}
+    for item in tk.config[CONFIG_SOURCE_LIMITS]:
+        source, _, limit = item.partition(":")
+        limits[source] = tk.asint(limit)
+    return limits
+
+
+def rate_limits() -> dict[str, float]:
+    """Max number of requests per second for every provider."""
+    rates: dict[str, float] = {}
+    for item in tk.config[CONFIG_RATE_LIMITS]:
+        provider, _, rate = item.partition(":")
+        rates[provider] = float(rate)
+    return rates
+
+
+def rate_limit_backend() -> str:
+    """Storage of rate limiter state."""
+    return tk.config[CONFIG_RATE_LIMIT_BACKEND]
+
+
+def rate_limit_max_attempts() -> int:
+    """Max number of attempts for a throttled request."""
+    return max(tk.config[CONFIG_RATE_LIMIT_MAX_ATTEMPTS], 1)
+
+
+def rate_limit_base_backoff() -> int:
+    """Delay in seconds after the first throttled request."""
+    return tk.config[CONFIG_RATE_LIMIT_BASE_BACKOFF]
+
+
+def rate_limit_max_backoff() -> int:
+    """Max delay in seconds between attempts of a throttled request."""
+    return tk.config[CONFIG_RATE_LIMIT_MAX_BACKOFF]
+
+
+def circuit_breaker_threshold() -> int:
+    """Number of consecutive failures that suspend requests to a provider."""
+    return tk.config[CONFIG_CIRCUIT_BREAKER_THRESHOLD]
+
+
+def circuit_breaker_cooldown() -> int:
+    """Seconds requests to a failing provider stay suspended."""
+    return tk.config[CONFIG_CIRCUIT_BREAKER_COOLDOWN]
+
+
+def circuit_breaker_backend() -> str:
+    """Storage of circuit breaker state."""
+    return tk.config[CONFIG_CIRCUIT_BREAKER_BACKEND]
+
+
+def credentials_api_keys() -> dict[str, list[str]]:
+    """API keys of every provider."""
+    return _credentials(CONFIG_CREDENTIALS_API_KEYS)
+
+
+def credentials_proxies() -> dict[str, list[str]]:
+    """Proxy URLs of every provider."""
+    return _credentials(CONFIG_CREDENTIALS_PROXIES)
+
+
+def _credentials(option: str) -> dict[str, list[str]]:
+    pools: dict[str, list[str]] = {}
+    for item in tk.config[option]:
+        provider, _, value = item.partition(":")
+        if value:
+            pools.setdefault(provider, []).append(value)
+    return pools
+
+
+def credentials_cooldown() -> int:
+    """Seconds a failed API key or proxy stays out of rotation."""
+    return tk.config[CONFIG_CREDENTIALS_COOLDOWN]
+
+
+def http_pool_size() -> int:
+    """Max number of connections kept open for every provider."""
+    return tk.config[CONFIG_HTTP_POOL_SIZE]
+
+
+def http_timeout() -> int:
+    """Seconds to wait for connection to and response from a provider."""
+    return tk.config[CONFIG_HTTP_TIMEOUT]
+
+
+def payload_cache_path() -> str | None:
+    """Location of SQLite database with raw provider responses."""
+    return tk.config[CONFIG_PAYLOAD_CACHE_PATH]
+
+
+def payload_cache_ttl() -> int:
+    """Number of seconds raw provider responses stay fresh."""
+    return tk.config[CONFIG_PAYLOAD_CACHE_TTL]
+
+
+def stats_exporter() -> str:
+    """Receiver of refresh stats."""
+    return tk.config[CONFIG_STATS_EXPORTER]
+
+
+def stats_statsd_address() -> str:
+    """Address of StatsD server as `host:port`."""
+    return tk.config[CONFIG_STATS_STATSD_ADDRESS]
+
+
+def stats_prefix() -> str:
+    """Prefix of StatsD metric names."""
+    return tk.config[CONFIG_STATS_PREFIX]
+
+
+def stats_pushgateway() -> str | None:
+    """Address of Prometheus Pushgateway."""
+    return tk.config[CONFIG_STATS_PUSHGATEWAY]
+
+
+def openalex_email() -> str | None:
+    """Contact email sent to OpenAlex to use the polite pool."""
+    return tk.config[CONFIG_OPENALEX_EMAIL]
+
+
+def refresh_on_user_update() -> bool:
+    """Refresh metrics in background when author IDs of a user change."""
+    return tk.config[CONFIG_REFRESH_ON_UPDATE]
+
+
+def refresh_run_lease() -> timedelta:
+    """Time without checkpoints after which a running refresh run can be resumed."""
+    return timedelta(seconds=tk.config[CONFIG_REFRESH_RUN_LEASE])
+
+
+def refresh_queue() -> str:
+    """Name of the background jobs queue for metrics refresh."""
+    return tk.config[CONFIG_REFRESH_QUEUE]
+
+
+def cache_backend() -> str:
+    """Backend of user metrics cache."""
+    return tk.config[CONFIG_CACHE_BACKEND]
+
+
+def cache_ttl() -> int:
+    """Number of seconds cached user metrics are kept."""
+    return tk.config[CONFIG_CACHE_TTL]
+
+
+def cache_size() -> int:
+    """Max number of users kept by the in-process cache."""
+    return tk.config[CONFIG_CACHE_SIZE]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+import httpx
+import requests
+
+from ckanext.scientometrics import config, ratelimit
+from ckanext.scientometrics.sessions import RateLimitedError
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+KIND_API_KEY = "api_key"
+KIND_PROXY = "proxy"
+
+HTTP_UNAUTHORIZED = 401
+HTTP_FORBIDDEN = 403
+HTTP_SERVER_ERROR = 500
+
+# failures in a row after which the cooldown stops growing
+_MAX_BACKOFF_STEP = 5
+
+_pools: dict[tuple[str, str], CredentialPool | None] = {}
+_lock = threading.Lock()
+
+
+class Credential:
+    """API key or proxy of a provider with its own rate budget and health.
+
+    Args:
+        provider: provider that accepts the credential
+        index: position of the credential in the pool, used instead of the
+            secret value in logs
+        value: API key or proxy URL
+        rate: number of requests per second allowed for the credential
+    """
+
+    def __init__(self, provider: str, index: int, value: str, rate: float | None):
+        self.provider = provider
+        self.index = index
+        self.value = value
+        self.limiter = ratelimit.make_limiter(f"{provider}:{self.fingerprint}", rate)
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def label(self) -> str:
+        return f"{self.provider}#{self.index}"
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable identifier of the value that does not reveal it.
+
+        Rate budget is keyed by it, so hosts that share Redis share the budget
+        of the same key or proxy, regardless of its position in their config.
+        """
+        return hashlib.sha256(self.value.encode()).hexdigest()[:16]
+
+
+class CredentialPool:
+    """Rotates credentials of a provider, skipping unhealthy and exhausted ones.
+
+    Every credential has its own rate budget, so aggregate throughput grows
+    with the number of credentials. A credential that is throttled, rejected
+    or unreachable is benched for `cooldown` seconds(or the time suggested by
+    the provider), and the cooldown doubles with every failure in a row.
+
+    Args:
+        provider: name of the provider
+        values: API keys or proxy URLs
+        rate: number of requests per second allowed for every credential
+        cooldown: seconds a failed credential stays out of rotation
+    """
+
+    def __init__(self, provider: str, values: list[str], rate: float | None, cooldown: int):
+        self.provider = provider
+        self.cooldown = cooldown
+        self.credentials = [Credential(provider, index, value, rate) for index, value in enumerate(values)]
+        # budgets are kept in Redis, so coroutines check them from a worker thread
+        self.blocking = any(credential.limiter.blocking for credential in self.credentials)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Credential:
+        """Block until a healthy credential has budget for the request."""
+        while isinstance(result := self.try_acquire(), float):
+            time.sleep(result)
+        return result
+
+    async def acquire_async(self) -> Credential:
+        """Wait without blocking the event loop until a credential is available."""
+        while True:
+            result = await asyncio.to_thread(self.try_acquire) if self.blocking else self.try_acquire()
+            if not isinstance(result, float):
+                return result
+            await asyncio.sleep(result)
+
+    def try_acquire(self) -> Credential | float:
+        """Take the next available credential.
+
+        Returns:
+            credential with a taken token, otherwise seconds until the next attempt
+        """
+        # limiters may talk to Redis, so they are checked outside of the lock
+        with self._lock:
+            now = time.monotonic()
+            count = len(self.credentials)
+            ordered = [self.credentials[(self._next + offset) % count] for offset in range(count)]
+            healthy = [credential for credential in ordered if credential.unhealthy_until <= now]
+            waits = [credential.unhealthy_until - now for credential in ordered if credential.unhealthy_until > now]
+
+        for credential in healthy:
+            wait = credential.limiter.try_acquire()
+            if wait <= 0:
+                with self._lock:
+                    self._next = (credential.index + 1) % count
+                return credential
+            waits.append(wait)
+        return min(waits)
+
+    def call(self, func: Callable[[Credential], T]) -> T:
+        """Call function with the next available credential, tracking its health."""
+        credential = self.acquire()
+        try:
+            result = func(credential)
+        except Exception as err:
+            self._record_error(credential, err)
+            raise
+        self.record_success(credential)
+        return result
+
+    async def call_async(self, func: Callable[[Credential], Awaitable[T]]) -> T:
+        """Asynchronous version of `call`."""
+        credential = await self.acquire_async()
+        try:
+            result = await func(credential)
+        except Exception as err:
+            self._record_error(credential, err)
+            raise
+        self.record_success(credential)
+        return result
+
+    def record_success(self, credential: Credential):
+        with self._lock:
+            credential.failures = 0
+
+    def record_failure(self, credential: Credential, retry_after: float | None = None):
+        """Take the credential out of rotation for a while."""
+        with self._lock:
+            credential.failures += 1
+            delay = retry_after or self.cooldown * 2 ** min(credential.failures - 1, _MAX_BACKOFF_STEP)
+            credential.unhealthy_until = time.monotonic() + delay
+        log.warning(
+            "Credential %s is unhealthy for %.0fs after %d failures", credential.label, delay, credential.failures
+        )
+
+    def status(self) -> list[dict[str, Any]]:
+        """Health of credentials, without their values."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "credential": credential.label,
+                    "failures": credential.failures,
+                    "unhealthy_for": max(credential.unhealthy_until - now, 0),
+                }
+                for credential in self.credentials
+            ]
+
+    def _record_error(self, credential: Credential, err: Exception):
+        if isinstance(err, RateLimitedError):
+            self.record_failure(credential, err.retry_after)
+        elif is_credential_failure(err):
+            self.record_failure(credential)
+        else:
+            # e.g. unknown author: the request itself was served
+            self.record_success(credential)
+
+
+def is_credential_failure(err: Exception) -> bool:
+    """Decide whether the error means that the credential is rejected or unusable."""
+    if isinstance(err, RateLimitedError):
+        return True
+    if isinstance(err, requests.HTTPError | httpx.HTTPStatusError):
+        status = err.response.status_code if err.response is not None else HTTP_SERVER_ERROR
+        return status in (HTTP_UNAUTHORIZED, HTTP_FORBIDDEN) or status >= HTTP_SERVER_ERROR
+    return isinstance(err, requests.ConnectionError | requests.Timeout | httpx.TransportError)
+
+
+def get_pool(provider: str, kind: str) -> CredentialPool | None:
+    """Pool of credentials of the provider, or None if there are none.
+
+    Args:
+        provider: name of the provider
+        kind: `api_key` for `ckanext.scientometrics.credentials.api_keys`
+            or `proxy` for `ckanext.scientometrics.credentials.proxies`
+    """
+    key = (provider, kind)
+    if key not in _pools:
+        with _lock:
+            if key not in _pools:
+                _pools[key] = _make_pool(provider, kind)
+    return _pools[key]
+
+
+def reset():
+    """Forget existing pools, so they are rebuilt from config on next access."""
+    _pools.clear()
+
+
+def _make_pool(provider: str, kind: str) -> CredentialPool | None:
+    options = {KIND_API_KEY: config.credentials_api_keys, KIND_PROXY: config.credentials_proxies}
+    values = options[kind]().get(provider)
+    if not values:
+        return None
+    return CredentialPool(provider, values, config.rate_limits().get(provider), config.credentials_cooldown())
@@ -12,6 +12,11 @@ def scim_get_user_metrics(user_id: str) -> dict[str, Any]:
     return tk.get_action("scim_get_user_metrics")({}, {"user_id": user_id})
 
 
+def scim_get_user_metrics_many(user_ids: list[str]) -> dict[str, dict[str, Any]]:
+    """Retrieve the metrics for multiple users, keyed by user ID."""
+    return tk.get_action("scim_get_user_metrics_many")({}, {"user_ids": user_ids})
+
+
 def scim_get_enabled_metrics() -> list[str]:
     """List of enabled metrics."""
     return config.enabled_metrics()
@@ -2,18 +2,27 @@ from __future__ import annotations
 
 from ckan.plugins.interfaces import Interface
 
-from ckanext.scientometrics.metrics_extractors import AuthorMetricsExtractor
+from ckanext.scientometrics.metrics_extractors import MetricsExtractor
 
 
 class IScientometrics(Interface):
-    def get_metrics_extractors(self) -> dict[str, type[AuthorMetricsExtractor]]:
+    def get_metrics_extractors(self) -> dict[str, type[MetricsExtractor]]:
         """Allows to redefine the default metrics extractors.
 
+        Extractors of all implementations are merged, and plugins listed
+        earlier in `ckan.plugins` take precedence. Every extractor is
+        instantiated once and shared by all threads, so it must be
+        thread-safe.
+
         Default:
         extractors = {
             "google_scholar_author": GoogleScholarAuthorMetricsExtractor,
             "semantic_scholar_author": SemanticScholarAuthorMetricsExtractor,
             "openalex_author": OpenAlexAuthorMetricsExtractor,
+            "openalex_dataset": OpenAlexDatasetMetricsExtractor,
         }
+
+        Keys of author extractors end with `_author`, keys of dataset
+        extractors(subclasses of `DatasetMetricsExtractor`) end with `_dataset`.
         """
         return {}
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+
+from redis.exceptions import RedisError
+from rq import Queue
+from rq.job import JobStatus
+
+import ckan.plugins.toolkit as tk
+from ckan.lib.jobs import get_queue
+
+from ckanext.scientometrics import config
+
+log = logging.getLogger(__name__)
+
+PENDING_STATUSES = {JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+
+
+def enqueue_refresh(user_id: str, sources: Iterable[str]) -> list[str]:
+    """Schedule background refresh of user metrics, one job per source.
+
+    A job is skipped if the same (user, source) pair is already waiting in the
+    queue. While a job of the pair is running, it may have read previous
+    author IDs, so a follow-up job is enqueued under a different ID. Jobs are
+    processed by `ckan jobs worker` listening to the queue from
+    `ckanext.scientometrics.refresh.queue`.
+
+    Returns:
+        IDs of enqueued jobs
+    """
+    queue_name = config.refresh_queue()
+    queue = get_queue(queue_name)
+    enqueued: list[str] = []
+
+    for source in sources:
+        try:
+            job_id = _available_job_id(queue, f"scim-refresh-{user_id}-{source}")
+            if not job_id:
+                continue
+
+            tk.enqueue_job(
+                refresh_user_metrics,
+                [user_id, [source]],
+                title=f"Refresh {source} metrics of user {user_id}",
+                queue=queue_name,
+                rq_kwargs={"job_id": job_id},
+            )
+        except RedisError:
+            log.exception("Cannot enqueue refresh of %s metrics for user %s", source, user_id)
+            continue
+
+        enqueued.append(job_id)
+
+    return enqueued
+
+
+def _available_job_id(queue: Queue, job_id: str) -> str | None:
+    """ID for a new refresh job of the pair, or None if no job is needed.
+
+    The pair alternates between the main and the follow-up ID, so a new job
+    never replaces a running one. When both are running, the change is
+    picked up by the next scheduled refresh.
+    """
+    candidates = [job_id, f"{job_id}-followup"]
+    statuses = [job.get_status() if (job := queue.fetch_job(candidate)) else None for candidate in candidates]
+    if any(status in PENDING_STATUSES for status in statuses):
+        return None
+
+    for candidate, status in zip(candidates, statuses, strict=True):
+        if status != JobStatus.STARTED:
+            return candidate
+
+    log.info("Refresh jobs %s are running, changes are picked up by the next refresh", candidates)
+    return None
+
+
+def refresh_user_metrics(user_id: str, sources: list[str]):
+    """Background job that refreshes metrics of the user."""
+    tk.get_action("scim_update_user_metrics")(
+        {"ignore_auth": True},
+        {"user_id": user_id, "requested_sources": sources},
+    )
@@ -1,25 +1,39 @@
 from __future__ import annotations
 
 import copy
+import dataclasses
 import logging
+from datetime import timedelta
 from typing import Any
 
+import requests
+
 import ckan.plugins.toolkit as tk
 from ckan import model, types
 from ckan.logic import validate
 
-from ckanext.scientometrics import config, utils
+from ckanext.scientometrics import cache, circuit, config, jobs, stats, utils
 from ckanext.scientometrics.logic import schema
-from ckanext.scientometrics.model import UserMetric
+from ckanext.scientometrics.model import DatasetMetric, UserMetric, UserMetricHistory, UserMetricRank
+from ckanext.scientometrics.refresh import DatasetRefresher
+from ckanext.scientometrics.sessions import ProviderError
 
 log = logging.getLogger(__name__)
 
+LEADERBOARD_PERCENTILES = {"p25": 0.25, "median": 0.5, "p75": 0.75, "p90": 0.9, "p99": 0.99}
+
 
 @tk.chained_action
 def user_update(next_: Any, context: types.Context, data_dict: dict[str, Any]):
-    """Attach scientometrics extras to a user when it is updated."""
+    """Attach scientometrics extras to a user when it is updated.
+
+    When author IDs are added or changed, their metrics are refreshed in
+    background.
+    """
     user = next_(context, data_dict)
-    _attach_extras(context, data_dict, user["id"])
+    changed = _attach_extras(context, data_dict, user["id"])
+    if changed and config.refresh_on_user_update():
+        jobs.enqueue_refresh(user["id"], changed)
     return user
 
 
@@ -29,15 +43,21 @@ def user_show(next_: Any, context: types.Context, data_dict: dict[str, Any]):
     """Retrieve a user's scientometrics extras."""
     user_data = next_(context, data_dict)
 
-    userobj = context["model"].User.get(user_data["id"])
+    # user_show keeps the loaded user in the context
+    userobj = context.get("user_obj") or context["model"].User.get(user_data["id"])
     if not userobj:
         raise tk.ObjectNotFound("user")
     if userobj.plugin_extras and "scim" in userobj.plugin_extras:
-        user_data["scim"] = copy.deepcopy(userobj.plugin_extras.get("scim", {}))
+        user_data["scim"] = dict(userobj.plugin_extras["scim"] or {})
     return user_data
 
 
-def _attach_extras(context: types.Context, data_dict: dict[str, Any], user_id: str):
+def _attach_extras(context: types.Context, data_dict: dict[str, Any], user_id: str) -> set[str]:
+    """Store author IDs in user extras.
+
+    Returns:
+        sources with new or changed author IDs
+    """
     sm_details, _ = tk.navl_validate(data_dict, schema.user_extras(), context)
 
     sm_details.pop("__extras", None)
@@ -45,6 +65,7 @@ def _attach_extras(context: types.Context, data_dict: dict[str, Any], user_id: s
     if not userobj:
         raise tk.ObjectNotFound("user")
     extras = copy.deepcopy(userobj.plugin_extras or {})
+    previous = utils.get_authors(extras)
 
     scim = extras.setdefault("scim", {})
     for source in config.enabled_metrics():
@@ -55,6 +76,9 @@ def _attach_extras(context: types.Context, data_dict: dict[str, Any], user_id: s
     userobj.plugin_extras = extras
     userobj.save()
 
+    current = utils.get_authors(extras)
+    return {source for source, author_id in current.items() if previous.get(source) != author_id}
+
 
 @tk.side_effect_free
 @validate(schema.scim_update_user_metrics)
@@ -70,10 +94,143 @@ def scim_get_user_metrics(context: types.Context, data_dict: dict[str, Any]) ->
         Dict[str, Any]: The user's scientometrics metrics keyed by source.
     """
     user_id_or_name = data_dict["user_id"]
+    metrics_cache = cache.get_cache()
+
+    # cache is keyed by ID, so lookups by name always resolve the user first
+    metrics = metrics_cache.get(user_id_or_name)
+    if metrics is not None:
+        return metrics
+
+    user_id = utils.resolve_user(user_id_or_name).id
+    records = UserMetric.by_user_id(user_id)
+    metrics = {record.source: record.dictize({}) for record in records}
+    metrics_cache.set(user_id, metrics)
+    return metrics
+
+
+@tk.side_effect_free
+@validate(schema.scim_get_user_metrics_many)
+def scim_get_user_metrics_many(context: types.Context, data_dict: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Retrieve scientometrics metrics of multiple users.
+
+    Args:
+        context (Dict[str, Any]): The CKAN action context.
+        data_dict (Dict[str, Any]): A dictionary containing:
+            - "user_ids": IDs of users whose metrics we want to retrieve.
+
+    Returns:
+        Dict[str, Any]: Metrics keyed by user ID and then by source. Unknown
+            users and users without metrics are mapped to an empty dict.
+    """
+    tk.check_access("scim_get_user_metrics_many", context, data_dict)
+    metrics_cache = cache.get_cache()
+    user_ids = list(dict.fromkeys(data_dict["user_ids"]))
+    cached = metrics_cache.get_many(user_ids)
+    result = {user_id: cached.get(user_id, {}) for user_id in user_ids}
 
-    user_dict = tk.get_action("user_show")({"ignore_auth": True}, {"id": user_id_or_name})
-    records = UserMetric.by_user_id(user_dict["id"])
-    return {record.source: record.dictize({}) for record in records}
+    missing = [user_id for user_id in user_ids if user_id not in cached]
+    if missing:
+        for record in UserMetric.by_user_ids(missing):
+            result[record.user_id][record.source] = record.dictize({})
+
+        # unknown IDs are not cached, so they cannot push real entries out
+        existing = model.Session.query(model.User.id).filter(model.User.id.in_(missing))
+        metrics_cache.set_many({user_id: result[user_id] for (user_id,) in existing})
+
+    return result
+
+
+@tk.side_effect_free
+@validate(schema.scim_get_user_metric_history)
+def scim_get_user_metric_history(context: types.Context, data_dict: dict[str, Any]) -> dict[str, list[dict[str, Any]]]:
+    """Retrieve snapshots of user metrics recorded during refreshes.
+
+    Args:
+        context (Dict[str, Any]): The CKAN action context.
+        data_dict (Dict[str, Any]): A dictionary containing:
+            - "user_id": The ID or name of the user.
+            - "source": Optional source to limit snapshots to.
+            - "start": Optional ISO date. Only snapshots recorded since then are returned.
+            - "end": Optional ISO date. Only snapshots recorded before then are returned.
+            - "limit": Max number of the most recent snapshots, up to 1000. Default: 1000.
+
+    Returns:
+        Dict[str, Any]: Snapshots keyed by source, oldest first. Every snapshot
+            contains `recorded_at` and tracked metrics(h_index, i10_index,
+            citation_count, paper_count).
+    """
+    tk.check_access("scim_get_user_metric_history", context, data_dict)
+    user_id = utils.resolve_user(data_dict["user_id"]).id
+    records = UserMetricHistory.by_user_id(
+        user_id,
+        data_dict.get("source"),
+        data_dict.get("start"),
+        data_dict.get("end"),
+        data_dict["limit"],
+    )
+
+    history: dict[str, list[dict[str, Any]]] = {}
+    for record in records:
+        history.setdefault(record.source, []).append(record.dictize({}))
+    return history
+
+
+@tk.side_effect_free
+@validate(schema.scim_metrics_leaderboard)
+def scim_metrics_leaderboard(context: types.Context, data_dict: dict[str, Any]) -> dict[str, Any]:
+    """Rank users by a metric and summarize its distribution across the portal.
+
+    Computed in PostgreSQL over the `scim_user_metric_rank` materialized view,
+    which is refreshed after bulk updates, so metrics updated for a single
+    user appear here after the next refresh.
+
+    Args:
+        context (Dict[str, Any]): The CKAN action context.
+        data_dict (Dict[str, Any]): A dictionary containing:
+            - "source": The source of metrics.
+            - "metric": One of h_index(default), i10_index, citation_count, paper_count.
+            - "limit": Number of top users, up to 100. Default: 10.
+            - "offset": Number of top users to skip. Default: 0.
+
+    Returns:
+        Dict[str, Any]: `top` list of users(`user_id`, `name`, `fullname`,
+            `value`) in descending order of the metric and `stats` with
+            `count`, `mean`, `min`, `max`, `median` and `p25`, `p75`, `p90`,
+            `p99` percentiles of users that have the metric.
+    """
+    tk.check_access("scim_metrics_leaderboard", context, data_dict)
+    source = data_dict["source"]
+    metric = data_dict["metric"]
+
+    top = [
+        {
+            "user_id": row.user_id,
+            "name": row.name,
+            "fullname": row.fullname,
+            "value": _number(row._mapping[metric]),
+        }
+        for row in UserMetricRank.top(source, metric, data_dict["limit"], data_dict["offset"])
+    ]
+
+    row = UserMetricRank.stats(source, metric, LEADERBOARD_PERCENTILES.values())
+    summary: dict[str, Any] = {
+        "count": row._mapping["count"],
+        "mean": _number(row.mean),
+        "min": _number(row.min),
+        "max": _number(row.max),
+    }
+    summary.update(zip(LEADERBOARD_PERCENTILES, row.percentiles or [None] * len(LEADERBOARD_PERCENTILES), strict=True))
+
+    return {"source": source, "metric": metric, "top": top, "stats": summary}
+
+
+def _number(value: Any) -> int | float | None:
+    """Convert numeric value from DB into JSON-friendly number."""
+    if value is None:
+        return None
+    if value == int(value):
+        return int(value)
+    return float(value)
 
 
 @validate(schema.scim_update_user_metrics)
@@ -85,21 +242,23 @@ def scim_update_user_metrics(context: types.Context, data_dict: dict[str, Any])
         data_dict (dict[str, Any]): A dictionary containing:
             - "user_id": The ID of the user to update.
             - "requested_sources": A list or dict indicating which metrics to update (subset of extras).
+            - "max_age": Optional number of seconds. Metrics refreshed more recently are skipped.
 
     Returns:
         Dict[str, Any]: A dictionary containing the updated metrics.
     """
     tk.check_access("scim_update_user_metrics", context, data_dict)
-    user_id_or_name = data_dict["user_id"]
-    user_dict = tk.get_action("user_show")({"ignore_auth": True}, {"id": user_id_or_name})
-    user_id = user_dict["id"]
+    user_id, authors = utils.resolve_user(data_dict["user_id"])
 
     requested_sources = set(data_dict["requested_sources"] or [])
     records = UserMetric.by_user_id(user_id)
-    existing = {record.source: record for record in records}
-    authors = _collect_authors(user_id, existing)
+    existing = {record.source: utils.StoredMetricState.from_record(record) for record in records}
     sources = requested_sources & set(authors.keys()) if requested_sources else set(authors.keys())
+    if "max_age" in data_dict:
+        max_age = timedelta(seconds=data_dict["max_age"])
+        sources &= {row.source for row in UserMetric.refresh_candidates([user_id], sources, max_age)}
     updated_metrics: dict[str, dict[str, Any]] = {}
+    rows: list[dict[str, Any]] = []
 
     for source in sources:
         author_id = authors.get(source)
@@ -111,52 +270,108 @@ def scim_update_user_metrics(context: types.Context, data_dict: dict[str, Any])
         except tk.ValidationError as exc:
             log.warning("Failed to fetch metrics for user %s source %s: %s", user_id, source, exc, exc_info=True)
             extracted_metrics = {"error": str(exc)}
+        except (ProviderError, requests.RequestException) as exc:
+            log.warning("Failed to fetch metrics for user %s source %s: %s", user_id, source, exc)
+            continue
         if not extracted_metrics:
             continue
 
-        payload = dict(extracted_metrics)
-        payload["author_id"] = author_id
-        existing_record = existing.get(source)
-        external_id = payload.get("external_id") or (existing_record.external_id if existing_record else str(author_id))
-        external_url = (
-            payload.get("external_url")
-            or payload.get("url")
-            or (existing_record.external_url if existing_record else None)
-        )
-        status = existing_record.status if existing_record else "pending"
-        external = {"id": external_id, "url": external_url}
-
-        UserMetric.upsert(
-            user_id=user_id,
-            source=source,
-            metrics=payload,
-            external=external,
-            status=status,
-        )
+        rows.append(utils.user_metric_row(user_id, source, author_id, extracted_metrics, existing.get(source)))
         updated_metrics[source] = extracted_metrics
 
+    UserMetric.bulk_upsert(rows)
     model.Session.commit()
 
     return updated_metrics
 
 
+@tk.side_effect_free
+@validate(schema.scim_get_dataset_metrics)
+def scim_get_dataset_metrics(context: types.Context, data_dict: dict[str, Any]) -> dict[str, Any]:
+    """Retrieve scientometrics metrics of a dataset.
+
+    Args:
+        context (Dict[str, Any]): The CKAN action context.
+        data_dict (Dict[str, Any]): A dictionary containing:
+            - "package_id": The ID or name of the dataset.
+
+    Returns:
+        Dict[str, Any]: The dataset's metrics keyed by source.
+    """
+    tk.check_access("scim_get_dataset_metrics", context, data_dict)
+    pkg = model.Package.get(data_dict["package_id"])
+    if not pkg:
+        raise tk.ObjectNotFound("package")
+    return {record.source: record.dictize({}) for record in DatasetMetric.by_package_id(pkg.id)}
+
+
+@validate(schema.scim_update_dataset_metrics)
+def scim_update_dataset_metrics(context: types.Context, data_dict: dict[str, Any]) -> dict[str, dict[str, int]]:
+    """Refresh metrics of datasets that have DOI.
+
+    Datasets are refreshed within the request, so their number is limited.
+    The whole catalog is refreshed by `ckan scim update-dataset-metrics`
+    command.
+
+    Args:
+        context (Context): The CKAN action context.
+        data_dict (dict[str, Any]): A dictionary containing:
+            - "package_ids": List of at most 100 dataset IDs.
+            - "requested_sources": Optional list of sources.
+            - "max_age": Optional number of seconds. Metrics refreshed more recently are skipped.
+
+    Returns:
+        Dict[str, Any]: Number of processed, updated, empty, failed and skipped datasets keyed by source.
+    """
+    tk.check_access("scim_update_dataset_metrics", context, data_dict)
+    sources = data_dict["requested_sources"]
+    for source in sources:
+        try:
+            utils.get_dataset_metrics_extractor(source + "_dataset")
+        except ValueError as err:
+            raise tk.ValidationError({"requested_sources": [f"Unsupported source: {source}"]}) from err
+
+    max_age = timedelta(seconds=data_dict["max_age"]) if "max_age" in data_dict else None
+    refresher = DatasetRefresher()
+    return {source: dataclasses.asdict(refresher.run(source, data_dict["package_ids"], max_age)) for source in sources}
+
+
+@tk.side_effect_free
+def scim_circuit_breaker_status(context: types.Context, data_dict: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Report state of circuit breakers of enabled sources.
+
+    Returns:
+        Dict[str, Any]: Breaker status keyed by provider. Every status contains
+            `state`(closed, open or half_open), number of consecutive
+            `failures` and `opened_at` timestamp. Empty when circuit breakers
+            are disabled.
+    """
+    tk.check_access("scim_circuit_breaker_status", context, data_dict)
+    return circuit.statuses(utils.source_providers(config.enabled_metrics()))
+
+
+@tk.side_effect_free
+def scim_refresh_stats(context: types.Context, data_dict: dict[str, Any]) -> dict[str, Any]:
+    """Report timings and outcomes of metrics refresh.
+
+    Returns:
+        Dict[str, Any]: `last_run` is the summary of the latest CLI refresh or
+            None, `process` is the summary of refreshes made by the current
+            process since it started. Every summary contains per-source
+            `calls`, `latency` and `items` by outcome, and `upsert` timings
+            with `rows_per_second`.
+    """
+    tk.check_access("scim_refresh_stats", context, data_dict)
+    return {
+        "last_run": stats.last_run(),
+        "process": stats.get_collector().snapshot(),
+    }
+
+
 @validate(schema.scim_delete_user_metrics)
 def scim_delete_user_metrics(context: types.Context, data_dict: dict[str, Any]) -> int:
     """Delete all scientometrics metrics for a user."""
     tk.check_access("scim_delete_user_metrics", context, data_dict)
-    user_dict = tk.get_action("user_show")({"ignore_auth": True}, {"id": data_dict["user_id"]})
-    deleted = UserMetric.delete_by_user_id(user_dict["id"])
+    deleted = UserMetric.delete_by_user_id(utils.resolve_user(data_dict["user_id"]).id)
     model.Session.commit()
     return deleted
-
-
-def _collect_authors(user_id: str, existing: dict[str, UserMetric]) -> dict[str, str]:
-    """Collect authors strictly from user extras (scim or legacy scientometrics)."""
-    authors: dict[str, str] = {}
-    user_obj = model.User.get(user_id)
-    extras = (user_obj.plugin_extras or {}) if user_obj else {}
-    scim_extras = extras.get("scim") or extras.get("scientometrics") or {}
-    for key, val in scim_extras.items():
-        if key.endswith("_author_id") and val:
-            authors[key.removesuffix("_author_id")] = val
-    return authors
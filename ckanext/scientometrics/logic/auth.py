@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from typing import Any
 
-from ckan import types
+import ckan.plugins.toolkit as tk
+from ckan import authz, types
 
 
 def scim_update_user_metrics(context: types.Context, data_dict: dict[str, Any]):
@@ -13,5 +14,42 @@ def scim_get_user_metrics(context: types.Context, data_dict: dict[str, Any]):
     return {"success": True}
 
 
+@tk.auth_allow_anonymous_access
+def scim_get_user_metrics_many(context: types.Context, data_dict: dict[str, Any]):
+    for user_id in tk.aslist(data_dict.get("user_ids")):
+        result = authz.is_authorized("user_show", context, {"id": user_id})
+        if not result["success"]:
+            return result
+    return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def scim_get_user_metric_history(context: types.Context, data_dict: dict[str, Any]):
+    return authz.is_authorized("user_show", context, {"id": data_dict.get("user_id")})
+
+
+@tk.auth_allow_anonymous_access
+def scim_metrics_leaderboard(context: types.Context, data_dict: dict[str, Any]):
+    # ranked users are listed with names, so the list follows `user_list`
+    return authz.is_authorized("user_list", context, {})
+
+
+@tk.auth_allow_anonymous_access
+def scim_get_dataset_metrics(context: types.Context, data_dict: dict[str, Any]):
+    return authz.is_authorized("package_show", context, {"id": data_dict.get("package_id")})
+
+
+def scim_update_dataset_metrics(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": False}
+
+
+def scim_circuit_breaker_status(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": False}
+
+
+def scim_refresh_stats(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": False}
+
+
 def scim_delete_user_metrics(context: types.Context, data_dict: dict[str, Any]):
     return {"success": False}
@@ -1,7 +1,47 @@
+from typing import Any
+
+import ckan.plugins.toolkit as tk
 from ckan import types
 from ckan.logic.schema import validator_args
 
 from ckanext.scientometrics import config
+from ckanext.scientometrics.model import UserMetricRank
+
+#: max number of users accepted by `scim_get_user_metrics_many`
+MAX_USER_IDS = 1000
+
+#: max number of datasets refreshed by `scim_update_dataset_metrics` within a request
+MAX_PACKAGE_IDS = 100
+
+#: max number of snapshots returned by `scim_get_user_metric_history`
+MAX_HISTORY_LIMIT = 1000
+
+#: max number of users returned by `scim_metrics_leaderboard`
+MAX_LEADERBOARD_LIMIT = 100
+
+
+def max_items(limit: int) -> types.Validator:
+    """Reject lists longer than the limit."""
+
+    def validator(value: Any) -> Any:
+        if len(value) > limit:
+            msg = f"Must contain at most {limit} items"
+            raise tk.Invalid(msg)
+        return value
+
+    return validator
+
+
+def max_value(limit: int) -> types.Validator:
+    """Reject numbers greater than the limit."""
+
+    def validator(value: Any) -> Any:
+        if value > limit:
+            msg = f"Must be at most {limit}"
+            raise tk.Invalid(msg)
+        return value
+
+    return validator
 
 
 @validator_args
@@ -14,6 +54,8 @@ def scim_update_user_metrics(
     not_empty: types.Validator,
     default: types.Validator,
     convert_to_list_if_string: types.Validator,
+    ignore_missing: types.Validator,
+    natural_number_validator: types.Validator,
 ) -> types.Schema:
     return {
         "user_id": [not_empty],
@@ -21,6 +63,71 @@ def scim_update_user_metrics(
             default(config.enabled_metrics()),
             convert_to_list_if_string,
         ],
+        "max_age": [ignore_missing, natural_number_validator],
+    }
+
+
+@validator_args
+def scim_get_user_metrics_many(
+    not_empty: types.Validator,
+    convert_to_list_if_string: types.Validator,
+) -> types.Schema:
+    return {
+        "user_ids": [not_empty, convert_to_list_if_string, max_items(MAX_USER_IDS)],
+    }
+
+
+@validator_args
+def scim_get_user_metric_history(
+    not_empty: types.Validator,
+    ignore_missing: types.Validator,
+    isodate: types.Validator,
+    default: types.Validator,
+    natural_number_validator: types.Validator,
+) -> types.Schema:
+    return {
+        "user_id": [not_empty],
+        "source": [ignore_missing],
+        "start": [ignore_missing, isodate],
+        "end": [ignore_missing, isodate],
+        "limit": [default(MAX_HISTORY_LIMIT), natural_number_validator, max_value(MAX_HISTORY_LIMIT)],
+    }
+
+
+@validator_args
+def scim_metrics_leaderboard(
+    not_empty: types.Validator,
+    default: types.Validator,
+    one_of: types.Validator,
+    natural_number_validator: types.Validator,
+) -> types.Schema:
+    return {
+        "source": [not_empty, one_of(config.enabled_metrics())],
+        "metric": [default("h_index"), one_of(UserMetricRank.METRICS)],
+        "limit": [default(10), natural_number_validator, max_value(MAX_LEADERBOARD_LIMIT)],
+        "offset": [default(0), natural_number_validator],
+    }
+
+
+@validator_args
+def scim_get_dataset_metrics(not_empty: types.Validator) -> types.Schema:
+    return {
+        "package_id": [not_empty],
+    }
+
+
+@validator_args
+def scim_update_dataset_metrics(
+    not_empty: types.Validator,
+    ignore_missing: types.Validator,
+    default: types.Validator,
+    convert_to_list_if_string: types.Validator,
+    natural_number_validator: types.Validator,
+) -> types.Schema:
+    return {
+        "package_ids": [not_empty, convert_to_list_if_string, max_items(MAX_PACKAGE_IDS)],
+        "requested_sources": [default(config.dataset_enabled_metrics()), convert_to_list_if_string],
+        "max_age": [ignore_missing, natural_number_validator],
     }
 
 
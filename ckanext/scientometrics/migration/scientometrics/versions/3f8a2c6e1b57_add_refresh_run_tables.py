@@ -0,0 +1,48 @@
+"""Add scim_refresh_run and scim_refresh_run_item tables.
+
+Revision ID: 3f8a2c6e1b57
+Revises: 9c3e7a1d4b26
+Create Date: 2026-10-17 23:05:47.309126
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+# revision identifiers, used by Alembic.
+revision = "3f8a2c6e1b57"
+down_revision = "9c3e7a1d4b26"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scim_refresh_run",
+        sa.Column("id", sa.Text, primary_key=True),
+        sa.Column("status", sa.Text, nullable=False),
+        sa.Column("params", JSONB, nullable=False),
+        sa.Column("summary", JSONB, nullable=False),
+        sa.Column("started_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column("finished_at", sa.DateTime),
+    )
+    op.create_index("ix_scim_refresh_run_status", "scim_refresh_run", ["status", "started_at"])
+    op.create_table(
+        "scim_refresh_run_item",
+        sa.Column(
+            "run_id",
+            sa.Text,
+            sa.ForeignKey("scim_refresh_run.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("user_id", sa.Text, sa.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("source", sa.Text, primary_key=True),
+        sa.Column("outcome", sa.Text, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("scim_refresh_run_item")
+    op.drop_index("ix_scim_refresh_run_status", table_name="scim_refresh_run")
+    op.drop_table("scim_refresh_run")
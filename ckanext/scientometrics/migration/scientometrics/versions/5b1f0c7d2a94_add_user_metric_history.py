@@ -0,0 +1,39 @@
+"""Add scim_user_metric_history table.
+
+Revision ID: 5b1f0c7d2a94
+Revises: e132bccf90e5
+Create Date: 2026-10-17 10:12:40.118204
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b1f0c7d2a94"
+down_revision = "e132bccf90e5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scim_user_metric_history",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("user_id", sa.Text, sa.ForeignKey("user.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("source", sa.Text, nullable=False),
+        sa.Column("recorded_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column("h_index", sa.Integer),
+        sa.Column("i10_index", sa.Integer),
+        sa.Column("citation_count", sa.Integer),
+        sa.Column("paper_count", sa.Integer),
+    )
+    op.create_index(
+        "ix_scim_user_metric_history_lookup",
+        "scim_user_metric_history",
+        ["user_id", "source", "recorded_at"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_scim_user_metric_history_lookup", table_name="scim_user_metric_history")
+    op.drop_table("scim_user_metric_history")
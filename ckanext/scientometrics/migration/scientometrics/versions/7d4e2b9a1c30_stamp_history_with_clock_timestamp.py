@@ -0,0 +1,23 @@
+"""Stamp user metric history with clock_timestamp().
+
+Revision ID: 7d4e2b9a1c30
+Revises: 3f8a2c6e1b57
+Create Date: 2026-10-18 09:41:26.573018
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7d4e2b9a1c30"
+down_revision = "3f8a2c6e1b57"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column("scim_user_metric_history", "recorded_at", server_default=sa.func.clock_timestamp())
+
+
+def downgrade():
+    op.alter_column("scim_user_metric_history", "recorded_at", server_default=sa.func.now())
@@ -0,0 +1,38 @@
+"""Add scim_user_metric_rank materialized view.
+
+Revision ID: 9c3e7a1d4b26
+Revises: 5b1f0c7d2a94
+Create Date: 2026-10-17 15:02:11.482913
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9c3e7a1d4b26"
+down_revision = "5b1f0c7d2a94"
+branch_labels = None
+depends_on = None
+
+METRICS = ("h_index", "i10_index", "citation_count", "paper_count")
+
+
+def upgrade():
+    columns = ", ".join(
+        f"CASE WHEN jsonb_typeof(m.metrics -> '{name}') = 'number' THEN (m.metrics ->> '{name}')::numeric END AS {name}"
+        for name in METRICS
+    )
+    op.execute(
+        f"""CREATE MATERIALIZED VIEW scim_user_metric_rank AS
+        SELECT m.user_id, m.source, m.updated_at, {columns}
+        FROM scim_user_metric m JOIN "user" u ON u.id = m.user_id
+        WHERE u.state = 'active'"""  # noqa: S608
+    )
+    op.execute("CREATE UNIQUE INDEX ux_scim_user_metric_rank ON scim_user_metric_rank (user_id, source)")
+    for name in METRICS:
+        op.execute(
+            f"CREATE INDEX ix_scim_user_metric_rank_{name} ON scim_user_metric_rank (source, {name} DESC NULLS LAST)"
+        )
+
+
+def downgrade():
+    op.execute("DROP MATERIALIZED VIEW scim_user_metric_rank")
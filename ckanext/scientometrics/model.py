@@ -1,25 +1,37 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, TypedDict
+import time
+from collections.abc import Collection, Iterable
+from datetime import datetime, timedelta
+from typing import Any, ClassVar, TypedDict
 
+import sqlalchemy as sa
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     Text,
     UniqueConstraint,
     func,
 )
-from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.dialects.postgresql import ARRAY, BIT, JSONB, Insert, array, insert
 from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import Query
 
 from ckan import model
+from ckan.model.types import make_uuid
 from ckan.plugins import toolkit as tk
 
+from ckanext.scientometrics import cache, stats
+
 log = logging.getLogger(__name__)
 
+AUTHOR_ID_SUFFIX = "_author_id"
+
 
 class ExternalRef(TypedDict, total=False):
     id: str | None
@@ -28,6 +40,8 @@ class ExternalRef(TypedDict, total=False):
 
 class _MetricBase(tk.BaseModel):
     __abstract__ = True
+    _owner_column: ClassVar[str]
+    _unique_constraint: ClassVar[str]
 
     id = Column(Integer, primary_key=True)
     source = Column(Text, nullable=False)
@@ -49,10 +63,64 @@ class _MetricBase(tk.BaseModel):
             data.setdefault("external_url", self.external_url)
         return data
 
+    @classmethod
+    def bulk_upsert(cls, rows: Iterable[dict[str, Any]], chunk_size: int = 1000) -> int:
+        """Insert or update many records using one multi-row statement per chunk.
+
+        Every row contains the owner ID(`user_id` or `package_id`), `source`,
+        `metrics` and optionally `external_id`, `external_url` and `status`.
+        Unlike `upsert`, nothing is loaded back from the database.
+
+        Returns:
+            number of written rows
+        """
+        stmt = insert(cls)
+        stmt = stmt.on_conflict_do_update(
+            constraint=cls._unique_constraint,
+            set_={
+                "metrics": stmt.excluded.metrics,
+                "external_id": stmt.excluded.external_id,
+                "external_url": stmt.excluded.external_url,
+                "status": stmt.excluded.status,
+                "updated_at": func.now(),
+            },
+        )
+
+        started = time.perf_counter()
+        total = 0
+        chunk: dict[tuple[str, str], dict[str, Any]] = {}
+        for row in rows:
+            # a statement cannot update the same record twice, so the last row wins
+            chunk[(row[cls._owner_column], row["source"])] = {
+                cls._owner_column: row[cls._owner_column],
+                "source": row["source"],
+                "metrics": row.get("metrics") or {},
+                "external_id": row.get("external_id"),
+                "external_url": row.get("external_url"),
+                "status": row.get("status") or "pending",
+            }
+            if len(chunk) >= chunk_size:
+                total += cls._execute_upsert(stmt, list(chunk.values()))
+                chunk = {}
+
+        if chunk:
+            total += cls._execute_upsert(stmt, list(chunk.values()))
+
+        if total:
+            stats.get_collector().record_upsert(cls.__tablename__, total, time.perf_counter() - started)
+        return total
+
+    @classmethod
+    def _execute_upsert(cls, stmt: Insert, values: list[dict[str, Any]]) -> int:
+        model.Session.execute(stmt.values(values))
+        return len(values)
+
 
 class UserMetric(_MetricBase):
     __tablename__ = "scim_user_metric"
     __table_args__ = (UniqueConstraint("user_id", "source", name="uq_scim_user_metric"),)
+    _owner_column = "user_id"
+    _unique_constraint = "uq_scim_user_metric"
     user_id = Column(
         "user_id",
         Text,
@@ -97,25 +165,245 @@ class UserMetric(_MetricBase):
             .returning(cls.id)
         )
         record_id = session.execute(stmt).scalar_one()
+        UserMetricHistory.record([{"user_id": user_id, "source": source, "metrics": metrics}])
         session.flush()
+        cache.invalidate_on_commit(session, [user_id])
         return session.get(cls, record_id)
 
+    @classmethod
+    def _execute_upsert(cls, stmt: Insert, values: list[dict[str, Any]]) -> int:
+        count = super()._execute_upsert(stmt, values)
+        UserMetricHistory.record(values)
+        cache.invalidate_on_commit(model.Session, {row["user_id"] for row in values})
+        return count
+
     @classmethod
     def by_user_id(cls, user_id: str) -> list[UserMetric]:
         session = model.Session
         return session.query(cls).filter(cls.user_id == user_id).all()
 
+    @classmethod
+    def by_user_ids(cls, user_ids: Collection[str]) -> list[UserMetric]:
+        """Load records of multiple users using a single query."""
+        session = model.Session
+        ids = sa.bindparam("user_ids", list(user_ids), type_=ARRAY(Text))
+        return session.query(cls).filter(cls.user_id == sa.any_(ids)).all()
+
     @classmethod
     def delete_by_user_id(cls, user_id: str) -> int:
         session = model.Session
         count = session.query(cls).filter(cls.user_id == user_id).delete(synchronize_session=False)
         session.flush()
+        cache.invalidate_on_commit(session, [user_id])
         return count
 
+    @classmethod
+    def refresh_candidates(  # noqa: PLR0913
+        cls,
+        user_ids: Collection[str] | None = None,
+        sources: Collection[str] | None = None,
+        max_age: timedelta | None = None,
+        *,
+        after: tuple[str, str] | None = None,
+        run_id: str | None = None,
+        shard: tuple[int, int] | None = None,
+    ) -> Query[Any]:
+        """Query (user, source) pairs that have an author ID in user extras.
+
+        Every row contains `user_id`, `source`, `author_id` and the state of
+        the existing record(`external_id`, `external_url`, `status`), which is
+        None when the pair was never fetched. Rows are ordered by user ID and
+        source. Users without `scim`/`scientometrics` extras are filtered out
+        before their extras are expanded.
+
+        Args:
+            user_ids: only include these users
+            sources: only include these sources
+            max_age: skip pairs refreshed more recently than this
+            after: only include pairs that follow this (user ID, source) pair
+            run_id: skip pairs already completed by this refresh run
+            shard: only include users of the shard `index` out of `count`,
+                as `(index, count)` tuple
+        """
+        user = model.User.__table__
+        extras = func.coalesce(
+            func.nullif(user.c.plugin_extras["scim"], sa.cast("{}", JSONB)),
+            user.c.plugin_extras["scientometrics"],
+        )
+        author = func.jsonb_each_text(extras).table_valued("key", "value").alias("author")
+        source = func.left(author.c.key, -len(AUTHOR_ID_SUFFIX))
+
+        query = (
+            model.Session.query(
+                user.c.id.label("user_id"),
+                source.label("source"),
+                author.c.value.label("author_id"),
+                cls.external_id,
+                cls.external_url,
+                cls.status,
+            )
+            .select_from(user)
+            .join(author, sa.true())
+            .outerjoin(cls, sa.and_(cls.user_id == user.c.id, cls.source == source))
+            .filter(
+                user.c.state != model.State.DELETED,
+                user.c.plugin_extras.has_any(array(["scim", "scientometrics"])),
+                author.c.key.endswith(AUTHOR_ID_SUFFIX, autoescape=True),
+                author.c.value != "",
+            )
+            .order_by(user.c.id, source)
+        )
+
+        if user_ids is not None:
+            query = query.filter(user.c.id.in_(user_ids))
+        if sources:
+            query = query.filter(source.in_(sources))
+        if max_age is not None:
+            query = query.filter(sa.or_(cls.id.is_(None), cls.updated_at < func.now() - max_age))
+        if after is not None:
+            # row comparison involves a computed column, so the planner cannot
+            # use it for an index range scan. The first condition can.
+            query = query.filter(user.c.id >= after[0], sa.tuple_(user.c.id, source) > sa.tuple_(*after))
+        if run_id is not None:
+            item = RefreshRunItem
+            completed = sa.exists().where(
+                item.run_id == run_id,
+                item.user_id == user.c.id,
+                item.source == source,
+                item.outcome.in_(item.COMPLETED),
+            )
+            query = query.filter(~completed)
+        if shard is not None:
+            index, count = shard
+            query = query.filter(user_shard(user.c.id, count) == index)
+
+        return query
+
+
+def user_shard(user_id: sa.ColumnElement[str], count: int) -> sa.ColumnElement[int]:
+    """SQL expression with the shard of the user, from 0 to `count - 1`.
+
+    Shard is derived from the first 28 bits of MD5 of the user ID, so it is
+    stable across hosts, processes and PostgreSQL versions.
+    """
+    digest = sa.literal("x") + func.substr(func.md5(user_id), 1, 7)
+    return sa.cast(sa.cast(digest, BIT(28)), Integer) % count
+
+
+class UserMetricHistory(tk.BaseModel):
+    """Snapshots of numeric user metrics, one per change.
+
+    Only metrics listed in `TRACKED_METRICS` are kept, as integer columns.
+    A snapshot is added only when it differs from the latest snapshot of the
+    same (user, source) pair, so daily refreshes of unchanged authors do not
+    grow the table. Snapshots are stamped with the time of the statement, not
+    of the transaction, so refreshes within one transaction stay ordered.
+    """
+
+    __tablename__ = "scim_user_metric_history"
+    __table_args__ = (Index("ix_scim_user_metric_history_lookup", "user_id", "source", "recorded_at"),)
+    TRACKED_METRICS: ClassVar[tuple[str, ...]] = ("h_index", "i10_index", "citation_count", "paper_count")
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Text, ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    source = Column(Text, nullable=False)
+    recorded_at = Column(DateTime, nullable=False, default=func.clock_timestamp())
+    h_index = Column(Integer)
+    i10_index = Column(Integer)
+    citation_count = Column(Integer)
+    paper_count = Column(Integer)
+
+    def dictize(self, _context: Any) -> dict[str, Any]:
+        data: dict[str, Any] = {"recorded_at": self.recorded_at.isoformat()}
+        for name in self.TRACKED_METRICS:
+            data[name] = getattr(self, name)
+        return data
+
+    @classmethod
+    def record(cls, rows: Iterable[dict[str, Any]]) -> None:
+        """Add snapshots for metric rows that changed since the latest snapshot.
+
+        Every row contains `user_id`, `source` and `metrics` dict, as rows of
+        `UserMetric.bulk_upsert`. Rows without tracked metrics are ignored.
+        """
+        data = [snapshot for row in rows if (snapshot := cls._snapshot(row))]
+        if not data:
+            return
+
+        # columns are passed as typed arrays, so NULLs keep integer type
+        names = ["user_id", "source", *cls.TRACKED_METRICS]
+        types = {name: Text if name in ("user_id", "source") else Integer for name in names}
+        arrays = [
+            sa.bindparam(f"history_{name}", [item[name] for item in data], type_=ARRAY(types[name])) for name in names
+        ]
+        incoming = (
+            func.unnest(*arrays)
+            .table_valued(*(sa.column(name, types[name]) for name in names))
+            .render_derived(name="incoming", with_types=False)
+        )
+
+        history = cls.__table__
+        latest = (
+            sa.select(*(history.c[name] for name in cls.TRACKED_METRICS))
+            .where(history.c.user_id == incoming.c.user_id, history.c.source == incoming.c.source)
+            .order_by(history.c.recorded_at.desc(), history.c.id.desc())
+            .limit(1)
+            .correlate(incoming)
+            .subquery("latest")
+        )
+        unchanged = (
+            sa.exists()
+            .select_from(latest)
+            .where(*(latest.c[name].is_not_distinct_from(incoming.c[name]) for name in cls.TRACKED_METRICS))
+        )
+
+        stmt = insert(cls).from_select(names, sa.select(*(incoming.c[name] for name in names)).where(~unchanged))
+        model.Session.execute(stmt)
+
+    @classmethod
+    def _snapshot(cls, row: dict[str, Any]) -> dict[str, Any] | None:
+        metrics = row.get("metrics") or {}
+        values = {name: _as_int(metrics.get(name)) for name in cls.TRACKED_METRICS}
+        if all(value is None for value in values.values()):
+            return None
+        return {"user_id": row["user_id"], "source": row["source"], **values}
+
+    @classmethod
+    def by_user_id(
+        cls,
+        user_id: str,
+        source: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        limit: int | None = None,
+    ) -> list[UserMetricHistory]:
+        """Load snapshots of the user within the time range, oldest first.
+
+        When `limit` is set, only the most recent snapshots are returned.
+        """
+        query = model.Session.query(cls).filter(cls.user_id == user_id)
+        if source:
+            query = query.filter(cls.source == source)
+        if start:
+            query = query.filter(cls.recorded_at >= start)
+        if end:
+            query = query.filter(cls.recorded_at < end)
+        records = query.order_by(cls.recorded_at.desc(), cls.id.desc()).limit(limit).all()
+        return records[::-1]
+
+
+def _as_int(value: Any) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 
 class DatasetMetric(_MetricBase):
     __tablename__ = "scim_dataset_metric"
     __table_args__ = (UniqueConstraint("package_id", "source", name="uq_scim_dataset_metric"),)
+    _owner_column = "package_id"
+    _unique_constraint = "uq_scim_dataset_metric"
     package_id = Column(
         "package_id",
         Text,
@@ -175,6 +463,306 @@ class DatasetMetric(_MetricBase):
         session.flush()
         return count
 
+    @classmethod
+    def refresh_candidates(
+        cls,
+        source: str,
+        doi_field: str,
+        package_ids: Collection[str] | None = None,
+        max_age: timedelta | None = None,
+    ) -> Query[Any]:
+        """Active datasets with DOI whose metrics from the source need a refresh.
+
+        DOI is taken from the dataset extra named `doi_field`. Without
+        `max_age` every dataset with DOI is returned, otherwise only those
+        that have no metrics from the source or were refreshed earlier than
+        `max_age` ago.
+
+        Rows contain `package_id` and raw `doi`. Query is not ordered, so the
+        caller can add keyset pagination by `model.Package.id`.
+        """
+        package = model.Package
+        extra = model.PackageExtra
+        query = (
+            model.Session.query(package.id.label("package_id"), extra.value.label("doi"))
+            .join(extra, sa.and_(extra.package_id == package.id, extra.key == doi_field))
+            .outerjoin(cls, sa.and_(cls.package_id == package.id, cls.source == source))
+            .filter(package.state == model.State.ACTIVE, func.coalesce(extra.value, "") != "")
+        )
+        if package_ids is not None:
+            query = query.filter(package.id.in_(package_ids))
+        if max_age is not None:
+            query = query.filter(sa.or_(cls.id.is_(None), cls.updated_at < func.now() - max_age))
+        return query
+
+    @classmethod
+    def index_fields(cls, package_id: str, names: Collection[str]) -> dict[str, int | float]:
+        """Numeric metrics of the dataset as `scim_<source>_<metric>` search index fields."""
+        fields: dict[str, int | float] = {}
+        for record in cls.by_package_id(package_id):
+            for name in names:
+                value = (record.metrics or {}).get(name)
+                if isinstance(value, int | float) and not isinstance(value, bool):
+                    fields[f"scim_{record.source}_{name}"] = value
+        return fields
+
+
+class UserMetricRank:
+    """Materialized view with numeric user metrics, used for sorting users.
+
+    Metrics are extracted from JSONB into typed columns and indexed per
+    source, so ranking queries use index scans instead of loading every
+    metric record. The view is updated by `refresh`, usually after a bulk
+    refresh of metrics.
+    """
+
+    METRICS: ClassVar[tuple[str, ...]] = UserMetricHistory.TRACKED_METRICS
+
+    # view is kept outside of CKAN metadata, so `create_all` never creates it as a table
+    table = sa.Table(
+        "scim_user_metric_rank",
+        sa.MetaData(),
+        Column("user_id", Text, primary_key=True),
+        Column("source", Text, primary_key=True),
+        Column("updated_at", DateTime),
+        *(Column(name, sa.Numeric) for name in METRICS),
+    )
+
+    @classmethod
+    def create(cls, engine: sa.engine.Engine):
+        """Create the view and its indexes if they are missing."""
+        columns = ",\n".join(
+            f"CASE WHEN jsonb_typeof(m.metrics -> '{name}') = 'number' "
+            f"THEN (m.metrics ->> '{name}')::numeric END AS {name}"
+            for name in cls.METRICS
+        )
+        statements = [
+            # only constant metric names are interpolated
+            f"""CREATE MATERIALIZED VIEW IF NOT EXISTS scim_user_metric_rank AS
+            SELECT m.user_id, m.source, m.updated_at, {columns}
+            FROM scim_user_metric m JOIN "user" u ON u.id = m.user_id
+            WHERE u.state = 'active'""",  # noqa: S608
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_scim_user_metric_rank ON scim_user_metric_rank (user_id, source)",
+            *(
+                f"CREATE INDEX IF NOT EXISTS ix_scim_user_metric_rank_{name} "
+                f"ON scim_user_metric_rank (source, {name} DESC NULLS LAST)"
+                for name in cls.METRICS
+            ),
+        ]
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(sa.text(statement))
+
+    @classmethod
+    def refresh(cls):
+        """Rebuild the view without blocking readers."""
+        model.Session.execute(sa.text("REFRESH MATERIALIZED VIEW CONCURRENTLY scim_user_metric_rank"))
+
+    @classmethod
+    def top(cls, source: str, metric: str, limit: int = 10, offset: int = 0) -> list[sa.Row[Any]]:
+        """Users with the highest value of the metric in the source.
+
+        Rows contain columns of the view, along with `name` and `fullname`
+        of the user.
+
+        Raises:
+            ValueError: metric is not one of `METRICS`
+        """
+        column = cls._column(metric)
+        user = model.User
+        stmt = (
+            sa.select(cls.table, user.name, user.fullname)
+            .join(user, user.id == cls.table.c.user_id)
+            .where(cls.table.c.source == source, column.is_not(None))
+            .order_by(column.desc().nulls_last(), cls.table.c.user_id)
+            .limit(limit)
+            .offset(offset)
+        )
+        return list(model.Session.execute(stmt))
+
+    @classmethod
+    def stats(cls, source: str, metric: str, fractions: Collection[float]) -> sa.Row[Any]:
+        """Aggregates of the metric across all users of the source.
+
+        Result contains `count`, `mean`, `min`, `max` and `percentiles`, a
+        list of continuous percentiles for the given fractions. All of them
+        are computed by a single scan of the source's index.
+
+        Raises:
+            ValueError: metric is not one of `METRICS`
+        """
+        column = cls._column(metric)
+        percentiles = func.percentile_cont(
+            sa.bindparam("fractions", list(fractions), type_=ARRAY(sa.Float)),
+            type_=ARRAY(sa.Float),
+        ).within_group(column)
+        stmt = sa.select(
+            func.count(column).label("count"),
+            func.avg(column).label("mean"),
+            func.min(column).label("min"),
+            func.max(column).label("max"),
+            percentiles.label("percentiles"),
+        ).where(cls.table.c.source == source, column.is_not(None))
+        return model.Session.execute(stmt).one()
+
+    @classmethod
+    def _column(cls, metric: str) -> sa.Column[Any]:
+        if metric not in cls.METRICS:
+            raise ValueError(metric)
+        return cls.table.c[metric]
+
+
+class RefreshRun(tk.BaseModel):
+    """Bulk refresh of user metrics that can be resumed after interruption.
+
+    Run keeps arguments of the refresh, so the resumed run selects the same
+    pairs, and the outcome of every processed pair in `RefreshRunItem`. When
+    the run completes, only outcomes of failed and skipped pairs are kept, so
+    a completed run cannot be resumed.
+
+    Every checkpoint renews the lease of the process that executes the run
+    (`updated_at`). A run can be resumed when it's explicitly interrupted or
+    when its lease has expired, i.e. the process died without a chance to
+    mark the run.
+    """
+
+    __tablename__ = "scim_refresh_run"
+    __table_args__ = (Index("ix_scim_refresh_run_status", "status", "started_at"),)
+    STATUS_RUNNING: ClassVar[str] = "running"
+    STATUS_INTERRUPTED: ClassVar[str] = "interrupted"
+    STATUS_COMPLETED: ClassVar[str] = "completed"
+    UNFINISHED: ClassVar[tuple[str, ...]] = (STATUS_RUNNING, STATUS_INTERRUPTED)
+
+    id = Column(Text, primary_key=True, default=make_uuid)
+    status = Column(Text, nullable=False, default=STATUS_RUNNING)
+    params = Column(MutableDict.as_mutable(JSONB), nullable=False, default=dict)
+    summary = Column(MutableDict.as_mutable(JSONB), nullable=False, default=dict)
+    started_at = Column(DateTime, nullable=False, default=func.now())
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime)
+
+    def dictize(self, _context: Any) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "params": dict(self.params or {}),
+            "summary": dict(self.summary or {}),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @classmethod
+    def start(cls, params: dict[str, Any]) -> RefreshRun:
+        """Register a new run with JSON-serializable arguments of the refresh."""
+        run = cls(params=params)
+        model.Session.add(run)
+        model.Session.flush()
+        return run
+
+    @classmethod
+    def get(cls, run_id: str) -> RefreshRun | None:
+        return model.Session.get(cls, run_id)
+
+    @classmethod
+    def unfinished(cls, shard: str | None = None) -> list[RefreshRun]:
+        """Runs that are interrupted or still running, the most recent first.
+
+        Args:
+            shard: only include runs of this shard, as `I/N` string
+        """
+        query = model.Session.query(cls).filter(cls.status.in_(cls.UNFINISHED))
+        if shard is not None:
+            query = query.filter(cls.params["shard"].astext == shard)
+        return query.order_by(cls.started_at.desc()).all()
+
+    def claim(self, lease: timedelta) -> bool:
+        """Take over the run if it's interrupted or its lease has expired.
+
+        The check and the update are done by a single statement, so only one
+        of processes that try to resume the same run succeeds.
+        """
+        table = type(self).__table__
+        stmt = (
+            sa.update(table)
+            .where(
+                table.c.id == self.id,
+                sa.or_(
+                    table.c.status == self.STATUS_INTERRUPTED,
+                    sa.and_(table.c.status == self.STATUS_RUNNING, table.c.updated_at < func.now() - lease),
+                ),
+            )
+            .values(status=self.STATUS_RUNNING, updated_at=func.now())
+            .returning(table.c.id)
+        )
+        claimed = model.Session.execute(stmt).scalar() is not None
+        model.Session.expire(self)
+        return claimed
+
+    def checkpoint(self, outcomes: Iterable[tuple[str, str, str]]):
+        """Record outcomes of processed (user ID, source) pairs and renew the lease.
+
+        Caller is responsible for commit, so the checkpoint is stored in the
+        same transaction as fetched metrics.
+        """
+        RefreshRunItem.record(self.id, outcomes)
+        self.updated_at = func.now()
+        model.Session.flush()
+
+    def interrupt(self):
+        """Mark the run as stopped, so it can be resumed right away."""
+        self.status = self.STATUS_INTERRUPTED
+        self.updated_at = func.now()
+        model.Session.flush()
+
+    def finish(self):
+        """Mark the run as completed and summarize outcomes of its pairs."""
+        item = RefreshRunItem
+        counts = dict(
+            model.Session.query(item.outcome, func.count()).filter(item.run_id == self.id).group_by(item.outcome).all()
+        )
+        self.summary = {"total": sum(counts.values()), **counts}
+        model.Session.query(item).filter(
+            item.run_id == self.id,
+            item.outcome.in_(RefreshRunItem.COMPLETED),
+        ).delete(synchronize_session=False)
+        self.status = self.STATUS_COMPLETED
+        self.finished_at = func.now()
+        model.Session.flush()
+
+
+class RefreshRunItem(tk.BaseModel):
+    """Outcome of a (user, source) pair processed by a refresh run.
+
+    Outcome is one of `updated`, `empty`, `failed` or `skipped`. Pairs with
+    `COMPLETED` outcomes are not fetched again when the run is resumed.
+    """
+
+    __tablename__ = "scim_refresh_run_item"
+    COMPLETED: ClassVar[tuple[str, ...]] = ("updated", "empty")
+
+    run_id = Column(Text, ForeignKey("scim_refresh_run.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Text, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    source = Column(Text, primary_key=True)
+    outcome = Column(Text, nullable=False)
+
+    @classmethod
+    def record(cls, run_id: str, outcomes: Iterable[tuple[str, str, str]], chunk_size: int = 1000):
+        """Insert or update outcomes of (user ID, source, outcome) triples."""
+        stmt = insert(cls)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.run_id, cls.user_id, cls.source],
+            set_={"outcome": stmt.excluded.outcome},
+        )
+        chunk: dict[tuple[str, str], dict[str, Any]] = {}
+        for user_id, source, outcome in outcomes:
+            chunk[(user_id, source)] = {"run_id": run_id, "user_id": user_id, "source": source, "outcome": outcome}
+            if len(chunk) >= chunk_size:
+                model.Session.execute(stmt.values(list(chunk.values())))
+                chunk = {}
+        if chunk:
+            model.Session.execute(stmt.values(list(chunk.values())))
+
 
 def init_tables() -> None:
     """Create extension tables if they are missing."""
@@ -185,6 +773,13 @@ def init_tables() -> None:
         return
     model.meta.metadata.create_all(
         bind=engine,
-        tables=[UserMetric.__table__, DatasetMetric.__table__],
+        tables=[
+            UserMetric.__table__,
+            UserMetricHistory.__table__,
+            DatasetMetric.__table__,
+            RefreshRun.__table__,
+            RefreshRunItem.__table__,
+        ],
         checkfirst=True,
     )
+    UserMetricRank.create(engine)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from typing import Any
+
+from ckanext.scientometrics import config
+
+log = logging.getLogger(__name__)
+
+_cache: PayloadCache | None = None
+_lock = threading.Lock()
+
+# stay below the default limit of SQLite host parameters
+_CHUNK_SIZE = 500
+
+
+class PayloadCache:
+    """Base class for caches of raw provider responses.
+
+    Values are JSON-serializable payloads of individual authors, keyed by
+    provider and author ID.
+    """
+
+    #: cache reads files, so coroutines call it from a worker thread
+    blocking: bool = False
+
+    def get_many(self, provider: str, author_ids: list[str]) -> dict[str, Any]:
+        """Return fresh payloads of the given authors. Missing authors are omitted."""
+        raise NotImplementedError
+
+    def set_many(self, provider: str, payloads: dict[str, Any]):
+        """Store payloads of authors keyed by author ID."""
+        raise NotImplementedError
+
+
+class NullPayloadCache(PayloadCache):
+    """Cache that never keeps anything."""
+
+    def get_many(self, provider: str, author_ids: list[str]) -> dict[str, Any]:
+        return {}
+
+    def set_many(self, provider: str, payloads: dict[str, Any]):
+        pass
+
+
+class SqlitePayloadCache(PayloadCache):
+    """Payloads compressed with zlib and stored in a local SQLite database.
+
+    Every thread uses its own connection. The database is in WAL mode, so
+    multiple processes on the same host can share it.
+
+    Args:
+        path: location of the database file
+        ttl: number of seconds payloads stay fresh. 0 keeps them forever
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def get_many(self, provider: str, author_ids: list[str]) -> dict[str, Any]:
+        conn = self._connection()
+        oldest = time.time() - self.ttl if self.ttl else 0
+        result: dict[str, Any] = {}
+        for chunk in _chunks(list(dict.fromkeys(author_ids))):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                "SELECT author_id, data FROM payload"  # noqa: S608
+                f" WHERE provider = ? AND fetched_at >= ? AND author_id IN ({placeholders})",
+                [provider, oldest, *chunk],
+            )
+            for author_id, data in rows:
+                result[author_id] = json.loads(zlib.decompress(data))
+        return result
+
+    def set_many(self, provider: str, payloads: dict[str, Any]):
+        if not payloads:
+            return
+
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO payload(provider, author_id, fetched_at, data) VALUES (?, ?, ?, ?)",
+                [
+                    (provider, author_id, now, zlib.compress(json.dumps(payload).encode()))
+                    for author_id, payload in payloads.items()
+                ],
+            )
+
+    def purge(self) -> int:
+        """Remove expired payloads and return their number."""
+        if not self.ttl:
+            return 0
+
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM payload WHERE fetched_at < ?", [time.time() - self.ttl]).rowcount
+
+    def _connection(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS payload("
+                "provider TEXT NOT NULL, author_id TEXT NOT NULL, fetched_at REAL NOT NULL, data BLOB NOT NULL,"
+                "PRIMARY KEY (provider, author_id)) WITHOUT ROWID"
+            )
+            self._local.conn = conn
+        return conn
+
+
+def get_payload_cache() -> PayloadCache:
+    """Cache configured by `ckanext.scientometrics.payload_cache.*` options."""
+    global _cache  # noqa: PLW0603
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = _make_cache()
+    return _cache
+
+
+def reset():
+    """Forget the current cache, so it's rebuilt from config on next access."""
+    global _cache  # noqa: PLW0603
+    _cache = None
+
+
+def _make_cache() -> PayloadCache:
+    path = config.payload_cache_path()
+    if not path:
+        return NullPayloadCache()
+    return SqlitePayloadCache(path, config.payload_cache_ttl())
+
+
+def _chunks(items: list[str]) -> Iterator[list[str]]:
+    for start in range(0, len(items), _CHUNK_SIZE):
+        yield items[start : start + _CHUNK_SIZE]
@@ -1,7 +1,14 @@
+from __future__ import annotations
+
+from typing import Any
+
 import ckan.plugins.toolkit as tk
 from ckan import plugins as p
 from ckan.common import CKANConfig
 
+from ckanext.scientometrics import cache, circuit, config, credentials, payloads, ratelimit, sessions, stats, utils
+from ckanext.scientometrics.model import DatasetMetric
+
 
 @tk.blanket.helpers
 @tk.blanket.actions
@@ -10,6 +17,8 @@ from ckan.common import CKANConfig
 @tk.blanket.cli
 class ScientometricsPlugin(p.SingletonPlugin):
     p.implements(p.IConfigurer)
+    p.implements(p.IConfigurable)
+    p.implements(p.IPackageController, inherit=True)
     # p.implements(p.IScientometrics)
 
     # IConfigurer
@@ -19,6 +28,24 @@ class ScientometricsPlugin(p.SingletonPlugin):
         tk.add_public_directory(config_, "public")
         tk.add_resource("assets", "scientometrics")
 
+    # IConfigurable
+
+    def configure(self, config_: CKANConfig):
+        cache.reset()
+        circuit.reset()
+        credentials.reset()
+        payloads.reset()
+        ratelimit.reset()
+        sessions.reset()
+        stats.reset()
+        utils.reset_metrics_extractors()
+
+    # IPackageController
+
+    def before_dataset_index(self, pkg_dict: dict[str, Any]) -> dict[str, Any]:
+        pkg_dict.update(DatasetMetric.index_fields(pkg_dict["id"], config.index_metrics()))
+        return pkg_dict
+
     # IScientometrics
 
     # def get_extractors(self):
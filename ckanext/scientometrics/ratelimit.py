@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import ckan.plugins.toolkit as tk
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.scientometrics import config
+from ckanext.scientometrics.sessions import RateLimitedError
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_limiters: dict[tuple[str, bool], RateLimiter] = {}
+_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Token bucket that spaces out requests to a single provider.
+
+    Args:
+        rate: number of requests per second
+        burst: number of requests that can be sent without waiting
+    """
+
+    #: limiter talks to an external service, so coroutines call it from a worker thread
+    blocking: bool = False
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+
+    @property
+    def interval(self) -> float:
+        return 1 / self.rate
+
+    def acquire(self):
+        """Block until the request can be sent."""
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait without blocking the event loop until the request can be sent."""
+        while (wait := await self.try_acquire_async()) > 0:
+            await asyncio.sleep(wait)
+
+    async def try_acquire_async(self) -> float:
+        """Asynchronous version of `try_acquire`."""
+        if self.blocking:
+            return await asyncio.to_thread(self.try_acquire)
+        return self.try_acquire()
+
+    def try_acquire(self) -> float:
+        """Take a token if it's available.
+
+        Returns:
+            zero when the token is taken, otherwise seconds until the next attempt
+        """
+        raise NotImplementedError
+
+    def pause(self, seconds: float):
+        """Stop every consumer of the bucket for the given number of seconds."""
+        raise NotImplementedError
+
+    async def pause_async(self, seconds: float):
+        """Asynchronous version of `pause`."""
+        if self.blocking:
+            await asyncio.to_thread(self.pause, seconds)
+        else:
+            self.pause(seconds)
+
+
+class UnlimitedRateLimiter(RateLimiter):
+    """Limiter for providers without configured rate.
+
+    Requests are never spaced out, but pauses requested after throttling are
+    still respected.
+    """
+
+    def __init__(self):
+        super().__init__(0)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        return max(self._paused_until - time.monotonic(), 0)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Token bucket shared by threads of the current process.
+
+    Implemented as GCRA: instead of counting tokens, it keeps the theoretical
+    arrival time(TAT) of the next request.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        super().__init__(rate, burst)
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            # same as `tat + interval - now - burst * interval`, without the
+            # rounding error that never lets the wait reach zero
+            wait = tat - now - (self.burst - 1) * self.interval
+            if wait <= 0:
+                self._tat = tat + self.interval
+                return 0
+            return wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            # shift TAT so that even the burst cannot pass until pause ends
+            self._tat = max(self._tat, time.monotonic() + seconds + (self.burst - 1) * self.interval)
+
+
+class RedisRateLimiter(RateLimiter):
+    """Token bucket shared by all processes and hosts that use the same Redis."""
+
+    blocking = True
+
+    _script = """
+    local now = tonumber(ARGV[1])
+    local interval = tonumber(ARGV[2])
+    local burst = tonumber(ARGV[3])
+    local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or 0), now)
+    local wait = tat - now - (burst - 1) * interval
+    if wait > 0 then
+        return tostring(wait)
+    end
+    redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now) * 1000) + 1000)
+    return '0'
+    """
+
+    _pause_script = """
+    local until_ = tonumber(ARGV[1])
+    local tat = tonumber(redis.call('GET', KEYS[1]) or 0)
+    if until_ > tat then
+        redis.call('SET', KEYS[1], tostring(until_), 'PX', math.ceil((until_ - tonumber(ARGV[2])) * 1000) + 1000)
+    end
+    return 0
+    """
+
+    def __init__(self, key: str, rate: float, burst: int = 1):
+        super().__init__(rate, burst)
+        site_id = tk.config["ckan.site_id"]
+        self.key = f"ckan:{site_id}:scim:rate_limit:{key}"
+
+    def try_acquire(self) -> float:
+        wait = float(connect_to_redis().eval(self._script, 1, self.key, time.time(), self.interval, self.burst))
+        return max(wait, 0)
+
+    def pause(self, seconds: float):
+        now = time.time()
+        until = now + seconds + (self.burst - 1) * self.interval
+        connect_to_redis().eval(self._pause_script, 1, self.key, until, now)
+
+
+def get_limiter(provider: str, pooled: bool = False) -> RateLimiter:
+    """Rate limiter of the provider, configured by `ckanext.scientometrics.rate_limit.*`.
+
+    Args:
+        provider: name of the provider
+        pooled: requests are sent with credentials from a pool, that
+            enforces the rate for every credential separately
+    """
+    key = (provider, pooled)
+    if key not in _limiters:
+        with _lock:
+            if key not in _limiters:
+                _limiters[key] = _make_limiter(provider, pooled)
+    return _limiters[key]
+
+
+def reset():
+    """Forget existing limiters, so they are rebuilt from config on next access."""
+    _limiters.clear()
+
+
+def call(provider: str, func: Callable[[], T], pooled: bool = False) -> T:
+    """Call function that sends request to the provider, respecting rate limits.
+
+    When the provider rejects the request with `RateLimitedError`, every
+    consumer of the provider's limiter is paused for the time suggested by
+    the provider (or for jittered exponential delay) and the call is
+    repeated, up to `ckanext.scientometrics.rate_limit.max_attempts` times.
+
+    Pooled calls are repeated without the pause: the credential pool benches
+    only the throttled credential and the next attempt takes another one,
+    waiting only when every credential is cooling down.
+    """
+    limiter = get_limiter(provider, pooled)
+    attempts = config.rate_limit_max_attempts()
+    for attempt in range(1, attempts + 1):
+        limiter.acquire()
+        try:
+            return func()
+        except RateLimitedError as err:
+            if attempt >= attempts:
+                raise
+            if pooled:
+                log.warning("%s is throttling a credential, retrying with another one (attempt %d)", provider, attempt)
+                continue
+            delay = err.retry_after or backoff_delay(attempt)
+            log.warning("%s is throttling requests, retrying in %.1fs (attempt %d)", provider, delay, attempt)
+            limiter.pause(delay)
+
+    # attempts are always positive, the loop either returns or raises
+    raise RateLimitedError(provider)
+
+
+async def call_async(provider: str, func: Callable[[], Awaitable[T]], pooled: bool = False) -> T:
+    """Asynchronous version of `call`, that never blocks the event loop."""
+    limiter = get_limiter(provider, pooled)
+    attempts = config.rate_limit_max_attempts()
+    for attempt in range(1, attempts + 1):
+        await limiter.acquire_async()
+        try:
+            return await func()
+        except RateLimitedError as err:
+            if attempt >= attempts:
+                raise
+            if pooled:
+                log.warning("%s is throttling a credential, retrying with another one (attempt %d)", provider, attempt)
+                continue
+            delay = err.retry_after or backoff_delay(attempt)
+            log.warning("%s is throttling requests, retrying in %.1fs (attempt %d)", provider, delay, attempt)
+            await limiter.pause_async(delay)
+
+    raise RateLimitedError(provider)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential delay with random jitter for the given attempt."""
+    cap = min(config.rate_limit_max_backoff(), config.rate_limit_base_backoff() * 2 ** (attempt - 1))
+    return random.uniform(cap / 2, cap)  # noqa: S311
+
+
+def make_limiter(key: str, rate: float | None) -> RateLimiter:
+    """Limiter of the configured backend with the given rate.
+
+    Args:
+        key: name of the bucket, shared by processes when backend is redis
+        rate: number of requests per second, no limit when empty
+    """
+    if not rate:
+        return UnlimitedRateLimiter()
+
+    burst = max(int(rate), 1)
+    if config.rate_limit_backend() == "redis":
+        return RedisRateLimiter(key, rate, burst)
+    return MemoryRateLimiter(rate, burst)
+
+
+def _make_limiter(provider: str, pooled: bool) -> RateLimiter:
+    if pooled:
+        # the rate applies to every API key or proxy and is enforced by the
+        # credential pool of the provider
+        return UnlimitedRateLimiter()
+    return make_limiter(provider, config.rate_limits().get(provider))
@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Collection, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.lib import search
+
+from ckanext.scientometrics import config, sessions, utils
+from ckanext.scientometrics.circuit import CircuitOpenError
+from ckanext.scientometrics.metrics_extractors import normalize_doi
+from ckanext.scientometrics.model import DatasetMetric, RefreshRun, UserMetric
+
+log = logging.getLogger(__name__)
+
+# how many times the backlog may grow while a slow source holds most of it
+_MAX_BACKLOG_FACTOR = 10
+
+_Fetched = dict[str, dict[str, Any]]
+_Submit = Callable[[str, list["RefreshTask"]], Future[_Fetched]]
+
+
+@dataclass(frozen=True)
+class RefreshTask:
+    """Single (user, source) pair scheduled for refresh."""
+
+    user_id: str
+    source: str
+    author_id: str
+    previous: utils.StoredMetricState | None = None
+
+
+@dataclass
+class RefreshSummary:
+    """Counters collected during a bulk refresh."""
+
+    total: int = 0
+    updated: int = 0
+    empty: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+class BulkRefresher:
+    """Refresh metrics of many users concurrently.
+
+    Refresher consumes (user, source) tasks, usually produced by
+    `pending_tasks`. Network requests are executed by a pool of worker
+    threads. Every source has its own limit of in-flight requests, so a slow
+    or strict provider does not occupy the whole pool. Sources that support batch lookups
+    receive authors in chunks of the extractor's `batch_size`, so a single
+    request covers many users. Workers never touch the database: tasks are
+    loaded, and fetched metrics are written and committed, by the thread
+    that calls `run`.
+
+    Args:
+        workers: size of the thread pool
+        source_limits: max number of in-flight requests per source
+        commit_every: number of records written by a single multi-row upsert and transaction
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        source_limits: dict[str, int] | None = None,
+        commit_every: int = 500,
+    ):
+        self.workers = max(workers, 1)
+        self.source_limits = source_limits or {}
+        self.commit_every = max(commit_every, 1)
+
+    def run(
+        self,
+        tasks: Iterable[RefreshTask],
+        on_task_done: Callable[[RefreshTask], None] | None = None,
+        refresh_run: RefreshRun | None = None,
+    ) -> RefreshSummary:
+        """Refresh metrics for the given tasks.
+
+        Args:
+            tasks: (user, source) pairs to refresh. Consumed lazily.
+            on_task_done: callback called once the task is processed.
+            refresh_run: run that receives a checkpoint with every commit and
+                at least every quarter of its lease.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scim-refresh") as pool:
+            return self._execute(
+                _RunState(self, iter(tasks), on_task_done, refresh_run),
+                lambda source, batch: pool.submit(_fetch, source, batch),
+            )
+
+    def _execute(self, state: _RunState, submit: _Submit) -> RefreshSummary:
+        """Submit batches and collect their results until tasks are exhausted."""
+        while True:
+            state.fill()
+            state.dispatch(submit)
+            if not state.inflight:
+                break
+
+            done, _ = wait(state.inflight, timeout=state.heartbeat, return_when=FIRST_COMPLETED)
+            for future in done:
+                state.collect(future)
+            state.renew_lease()
+
+        state.flush()
+        return state.summary
+
+
+class AsyncBulkRefresher(BulkRefresher):
+    """Refresh metrics of many users using a single event loop.
+
+    Scheduling is the same as in `BulkRefresher`, but requests are sent by
+    `extract_metrics_many_async` coroutines instead of threads, so `workers`
+    is the max number of in-flight requests and can be set to hundreds
+    without spawning hundreds of threads. Extractors without native async
+    implementation still run in the default thread pool of the loop.
+
+    The loop runs in its own thread, while tasks are loaded, and results are
+    written and committed, by the thread that calls `run`, so database
+    round trips never stall requests in flight.
+    """
+
+    def run(
+        self,
+        tasks: Iterable[RefreshTask],
+        on_task_done: Callable[[RefreshTask], None] | None = None,
+        refresh_run: RefreshRun | None = None,
+    ) -> RefreshSummary:
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="scim-refresh-loop", daemon=True)
+        thread.start()
+        try:
+            return self._execute(
+                _RunState(self, iter(tasks), on_task_done, refresh_run),
+                lambda source, batch: asyncio.run_coroutine_threadsafe(_fetch_async(source, batch), loop),
+            )
+        finally:
+            asyncio.run_coroutine_threadsafe(_shutdown_loop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+class _RunState:
+    """Mutable state of a single `BulkRefresher.run` call."""
+
+    def __init__(
+        self,
+        refresher: BulkRefresher,
+        tasks: Iterator[RefreshTask],
+        on_task_done: Callable[[RefreshTask], None] | None,
+        refresh_run: RefreshRun | None = None,
+    ):
+        self.refresher = refresher
+        self.tasks = tasks
+        self.on_task_done = on_task_done
+        self.refresh_run = refresh_run
+        self.summary = RefreshSummary()
+        self.pending: dict[str, deque[RefreshTask]] = {}
+        self.batch_sizes: dict[str, int] = {}
+        self.active: Counter[str] = Counter()
+        self.inflight: dict[Future[_Fetched], list[RefreshTask]] = {}
+        self.rows: list[dict[str, Any]] = []
+        self.exhausted = False
+        self.outcomes: list[tuple[str, str, str]] = []
+        # seconds between checkpoints that keep the lease of the run
+        self.heartbeat = config.refresh_run_lease().total_seconds() / 4 if refresh_run else None
+        self.flushed_at = time.monotonic()
+
+    def fill(self):
+        """Load tasks until there is enough queued work for every worker.
+
+        Tasks of a slow source pile up in its queue, so loading continues
+        past the backlog while any other source is short of work, up to
+        `_MAX_BACKLOG_FACTOR` times the backlog.
+        """
+        while not self.exhausted and self._hungry():
+            task = next(self.tasks, None)
+            if task is None:
+                self.exhausted = True
+                break
+
+            if task.source not in self.pending:
+                self.pending[task.source] = deque()
+                self.batch_sizes[task.source] = _batch_size(task.source)
+            self.pending[task.source].append(task)
+
+    def dispatch(self, submit: _Submit):
+        """Submit queued tasks in batches while their sources are below the limit.
+
+        Incomplete batch is postponed while the source is busy and more tasks
+        can be loaded.
+        """
+        for source, queue in self.pending.items():
+            limit = self.refresher.source_limits.get(source, self.refresher.workers)
+            size = self.batch_sizes[source]
+            while queue and self.active[source] < limit and len(self.inflight) < self.refresher.workers:
+                if len(queue) < size and self.active[source] and not self.exhausted:
+                    break
+
+                batch = [queue.popleft() for _ in range(min(size, len(queue)))]
+                self.inflight[submit(source, batch)] = batch
+                self.active[source] += 1
+
+    def collect(self, future: Future[_Fetched]):
+        """Write results of the finished batch."""
+        batch = self.inflight.pop(future)
+        self.active[batch[0].source] -= 1
+        skipped = False
+        try:
+            results = future.result()
+        except CircuitOpenError:
+            log.debug("Source %s is suspended, skipping %d tasks", batch[0].source, len(batch))
+            results = None
+            skipped = True
+        except Exception:
+            log.exception("Failed to fetch metrics from source %s", batch[0].source)
+            results = None
+
+        for task in batch:
+            if skipped:
+                outcome = "skipped"
+            elif results is None:
+                outcome = "failed"
+            else:
+                outcome = self._store(task, results.get(task.author_id) or {})
+            self._finish(task, outcome)
+
+            if self.on_task_done:
+                self.on_task_done(task)
+
+        if len(self.rows) >= self.refresher.commit_every or len(self.outcomes) >= self.refresher.commit_every:
+            self.flush()
+
+    def flush(self):
+        """Write and commit collected rows together with the checkpoint."""
+        if self.rows:
+            UserMetric.bulk_upsert(self.rows)
+            self.rows = []
+        if self.refresh_run:
+            self.refresh_run.checkpoint(self.outcomes)
+            self.outcomes = []
+        model.Session.commit()
+        self.flushed_at = time.monotonic()
+
+    def renew_lease(self):
+        """Checkpoint the run when it was not checkpointed for a while."""
+        if self.heartbeat is not None and time.monotonic() - self.flushed_at >= self.heartbeat:
+            self.flush()
+
+    def _backlog(self) -> int:
+        return max(self.refresher.workers * 4, 2 * max(self.batch_sizes.values(), default=1))
+
+    def _hungry(self) -> bool:
+        total = sum(map(len, self.pending.values()))
+        if total < self._backlog():
+            return True
+        if total >= self._backlog() * _MAX_BACKLOG_FACTOR:
+            return False
+        return any(len(queue) < self._quota(source) for source, queue in self.pending.items())
+
+    def _quota(self, source: str) -> int:
+        """Queued tasks that keep all request slots of the source busy."""
+        limit = min(self.refresher.source_limits.get(source, self.refresher.workers), self.refresher.workers)
+        return max(limit, 1) * self.batch_sizes[source]
+
+    def _store(self, task: RefreshTask, extracted: dict[str, Any]) -> str:
+        if not extracted:
+            return "empty"
+
+        self.rows.append(utils.user_metric_row(task.user_id, task.source, task.author_id, extracted, task.previous))
+        return "updated"
+
+    def _finish(self, task: RefreshTask, outcome: str):
+        self.summary.total += 1
+        setattr(self.summary, outcome, getattr(self.summary, outcome) + 1)
+        if not self.refresh_run:
+            return
+
+        self.outcomes.append((task.user_id, task.source, outcome))
+
+
+class DatasetRefresher:
+    """Refresh metrics of datasets identified by DOI.
+
+    Datasets are streamed from the database in chunks, using keyset
+    pagination by package ID, so memory usage does not depend on the size of
+    the catalog, and every chunk is written by multi-row upserts and
+    committed before the next one is loaded. Inside a chunk DOIs are sent to
+    the provider in batches of the extractor's `batch_size`.
+
+    Args:
+        chunk_size: number of datasets loaded, written and committed together
+        reindex: update search index of datasets with new metrics
+    """
+
+    def __init__(self, chunk_size: int = 1000, reindex: bool = True):
+        self.chunk_size = max(chunk_size, 1)
+        self.reindex = reindex
+
+    def run(
+        self,
+        source: str,
+        package_ids: Collection[str] | None = None,
+        max_age: timedelta | None = None,
+        on_chunk_done: Callable[[int], None] | None = None,
+    ) -> RefreshSummary:
+        """Refresh metrics from the source for datasets with DOI.
+
+        Args:
+            source: source of metrics, e.g. `openalex`
+            package_ids: limit refresh to these datasets
+            max_age: skip metrics refreshed more recently
+            on_chunk_done: callback called with the number of processed datasets
+        """
+        summary = RefreshSummary()
+        batch_size = utils.get_dataset_metrics_extractor(source + "_dataset").batch_size
+        candidates = DatasetMetric.refresh_candidates(source, config.dataset_doi_field(), package_ids, max_age)
+        after = ""
+
+        while True:
+            rows = candidates.filter(model.Package.id > after).order_by(model.Package.id).limit(self.chunk_size).all()
+            if not rows:
+                break
+
+            after = rows[-1].package_id
+            self._process(source, {row.package_id: normalize_doi(row.doi) for row in rows}, batch_size, summary)
+            if on_chunk_done:
+                on_chunk_done(len(rows))
+
+        return summary
+
+    def _process(self, source: str, dois: dict[str, str], batch_size: int, summary: RefreshSummary):
+        """Fetch, write and commit metrics of a single chunk of datasets."""
+        metrics: dict[str, dict[str, Any]] = {}
+        failed: set[str] = set()
+        skipped: set[str] = set()
+        unique = list(dict.fromkeys(dois.values()))
+        for start in range(0, len(unique), batch_size):
+            batch = unique[start : start + batch_size]
+            try:
+                metrics.update(utils.fetch_many_dataset_metrics(source + "_dataset", batch))
+            except CircuitOpenError:
+                skipped.update(batch)
+            except Exception:
+                log.exception("Failed to fetch dataset metrics from source %s", source)
+                failed.update(batch)
+
+        rows: list[dict[str, Any]] = []
+        for package_id, doi in dois.items():
+            summary.total += 1
+            if doi in skipped:
+                summary.skipped += 1
+            elif doi in failed:
+                summary.failed += 1
+            elif metrics.get(doi):
+                rows.append(utils.dataset_metric_row(package_id, source, doi, metrics[doi]))
+                summary.updated += 1
+            else:
+                summary.empty += 1
+
+        DatasetMetric.bulk_upsert(rows)
+        model.Session.commit()
+
+        if self.reindex and rows:
+            search.rebuild(package_ids=[row["package_id"] for row in rows], defer_commit=True)
+            search.commit()
+
+
+def pending_tasks(  # noqa: PLR0913
+    user_ids: Collection[str] | None = None,
+    sources: Collection[str] | None = None,
+    max_age: timedelta | None = None,
+    *,
+    chunk_size: int = 1000,
+    run_id: str | None = None,
+    shard: tuple[int, int] | None = None,
+) -> Iterator[RefreshTask]:
+    """Produce refresh tasks for pairs that are stale or were never fetched.
+
+    Pairs are loaded in chunks using keyset pagination, so memory usage does
+    not depend on the number of users, and results can be committed while
+    tasks are consumed. See `UserMetric.refresh_candidates` for the meaning
+    of other arguments.
+    """
+    after: tuple[str, str] | None = None
+    while True:
+        query = UserMetric.refresh_candidates(user_ids, sources, max_age, after=after, run_id=run_id, shard=shard)
+        rows = query.limit(chunk_size).all()
+        for row in rows:
+            previous = utils.StoredMetricState(row.external_id, row.external_url, row.status) if row.status else None
+            yield RefreshTask(row.user_id, row.source, row.author_id, previous)
+
+        if len(rows) < chunk_size:
+            break
+        after = (rows[-1].user_id, rows[-1].source)
+
+
+def _batch_size(source: str) -> int:
+    try:
+        return utils.get_metrics_extractor(source + "_author").batch_size
+    except ValueError:
+        return 1
+
+
+def _fetch(source: str, batch: list[RefreshTask]) -> _Fetched:
+    author_ids = list(dict.fromkeys(task.author_id for task in batch))
+    try:
+        return utils.fetch_many_author_metrics(source + "_author", author_ids)
+    except tk.ValidationError as exc:
+        log.warning("Failed to fetch metrics for source %s: %s", source, exc)
+        return dict.fromkeys(author_ids, {"error": str(exc)})
+
+
+async def _shutdown_loop():
+    """Cancel requests left after interruption and release resources of the loop."""
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await sessions.close_async_sessions()
+    await asyncio.get_running_loop().shutdown_default_executor()
+
+
+async def _fetch_async(source: str, batch: list[RefreshTask]) -> _Fetched:
+    author_ids = list(dict.fromkeys(task.author_id for task in batch))
+    try:
+        return await utils.fetch_many_author_metrics_async(source + "_author", author_ids)
+    except tk.ValidationError as exc:
+        log.warning("Failed to fetch metrics for source %s: %s", source, exc)
+        return dict.fromkeys(author_ids, {"error": str(exc)})
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple
+from weakref import WeakKeyDictionary
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from ckanext.scientometrics import config
+
+log = logging.getLogger(__name__)
+
+HTTP_NOT_MODIFIED = 304
+HTTP_NOT_FOUND = 404
+HTTP_TOO_MANY_REQUESTS = 429
+
+_sessions: dict[str, ProviderSession] = {}
+_async_sessions: WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, AsyncProviderSession]] = WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class ProviderError(Exception):
+    """Provider cannot serve the request at the moment."""
+
+
+class RateLimitedError(ProviderError):
+    """Provider rejected the request because of rate limits.
+
+    Args:
+        retry_after: number of seconds suggested by the provider
+    """
+
+    def __init__(self, provider: str, retry_after: float | None = None):
+        super().__init__(f"{provider} rate limit exceeded")
+        self.provider = provider
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, provider: str, response: requests.Response | httpx.Response | None) -> RateLimitedError:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        try:
+            return cls(provider, float(retry_after) if retry_after else None)
+        except ValueError:
+            # HTTP-date form of Retry-After is not worth parsing
+            return cls(provider)
+
+
+class _Validated(NamedTuple):
+    etag: str | None
+    last_modified: str | None
+    payload: Any
+
+
+class _Validators:
+    """LRU of responses that can be revalidated with a conditional request."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data: OrderedDict[str, _Validated] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> _Validated | None:
+        with self._lock:
+            validated = self._data.get(key)
+            if validated:
+                # revalidated responses are the most valuable ones to keep
+                self._data.move_to_end(key)
+            return validated
+
+    def remember(self, key: str, etag: str | None, last_modified: str | None, payload: Any):
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._data[key] = _Validated(etag, last_modified, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def headers(self, validated: _Validated | None, headers: dict[str, str] | None) -> dict[str, str]:
+        """Request headers extended with validators of the previous response."""
+        headers = dict(headers or {})
+        if validated and validated.etag:
+            headers["If-None-Match"] = validated.etag
+        if validated and validated.last_modified:
+            headers["If-Modified-Since"] = validated.last_modified
+        return headers
+
+
+class ProviderSession:
+    """Keep-alive HTTP session for requests to a single provider.
+
+    Connections are pooled and reused by all threads. GET responses that
+    contain `ETag` or `Last-Modified` are remembered, and the next request
+    for the same URL is made conditional, so an unchanged resource costs a
+    `304 Not Modified` without payload.
+
+    Args:
+        provider: name of the provider, used in errors
+        pool_size: max number of connections kept open
+        timeout: seconds to wait for connection and response
+        validators_size: max number of remembered conditional responses
+    """
+
+    def __init__(self, provider: str, pool_size: int = 10, timeout: float = 30, validators_size: int = 1000):
+        self.provider = provider
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._validators = _Validators(validators_size)
+
+    def get_json(self, url: str, params: dict[str, Any] | None = None, headers: dict[str, str] | None = None) -> Any:
+        """Send GET request and return decoded JSON body.
+
+        Raises:
+            RateLimitedError: provider responded with HTTP 429
+            requests.HTTPError: any other error response
+        """
+        key = requests.Request("GET", url, params=params).prepare().url or url
+        validated = self._validators.get(key)
+        headers = self._validators.headers(validated, headers)
+
+        resp = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        if resp.status_code == HTTP_NOT_MODIFIED and validated:
+            return validated.payload
+
+        payload = self._decode(resp)
+        self._validators.remember(key, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), payload)
+        return payload
+
+    def post_json(
+        self,
+        url: str,
+        body: Any,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        """Send POST request with JSON body and return decoded JSON response."""
+        resp = self.session.post(url, json=body, params=params, headers=headers, timeout=self.timeout)
+        return self._decode(resp)
+
+    def _decode(self, resp: requests.Response) -> Any:
+        if resp.status_code == HTTP_TOO_MANY_REQUESTS:
+            raise RateLimitedError.from_response(self.provider, resp)
+        resp.raise_for_status()
+        return resp.json()
+
+
+class AsyncProviderSession:
+    """Asynchronous counterpart of `ProviderSession`.
+
+    Client is bound to the event loop that created it, so every loop gets
+    its own session from `get_async_session`.
+
+    Raises:
+        RateLimitedError: provider responded with HTTP 429
+        httpx.HTTPStatusError: any other error response
+    """
+
+    def __init__(self, provider: str, pool_size: int = 10, timeout: float = 30, validators_size: int = 1000):
+        self.provider = provider
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self._validators = _Validators(validators_size)
+
+    async def get_json(
+        self,
+        url: str,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        """Send GET request and return decoded JSON body."""
+        key = str(httpx.URL(url, params=params))
+        validated = self._validators.get(key)
+        headers = self._validators.headers(validated, headers)
+
+        resp = await self.client.get(url, params=params, headers=headers)
+        if resp.status_code == HTTP_NOT_MODIFIED and validated:
+            return validated.payload
+
+        payload = self._decode(resp)
+        self._validators.remember(key, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), payload)
+        return payload
+
+    async def post_json(
+        self,
+        url: str,
+        body: Any,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        """Send POST request with JSON body and return decoded JSON response."""
+        resp = await self.client.post(url, json=body, params=params, headers=headers)
+        return self._decode(resp)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _decode(self, resp: httpx.Response) -> Any:
+        if resp.status_code == HTTP_TOO_MANY_REQUESTS:
+            raise RateLimitedError.from_response(self.provider, resp)
+        resp.raise_for_status()
+        return resp.json()
+
+
+def get_session(provider: str) -> ProviderSession:
+    """Shared HTTP session of the provider, configured by `ckanext.scientometrics.http.*`."""
+    if provider not in _sessions:
+        with _lock:
+            if provider not in _sessions:
+                _sessions[provider] = ProviderSession(
+                    provider,
+                    pool_size=config.http_pool_size(),
+                    timeout=config.http_timeout(),
+                )
+    return _sessions[provider]
+
+
+def reset():
+    """Close existing sessions, so they are rebuilt from config on next access."""
+    with _lock:
+        for session in _sessions.values():
+            session.session.close()
+        _sessions.clear()
+
+
+def get_async_session(provider: str) -> AsyncProviderSession:
+    """HTTP session of the provider bound to the running event loop."""
+    loop_sessions = _async_sessions.setdefault(asyncio.get_running_loop(), {})
+    if provider not in loop_sessions:
+        loop_sessions[provider] = AsyncProviderSession(
+            provider,
+            pool_size=config.http_pool_size(),
+            timeout=config.http_timeout(),
+        )
+    return loop_sessions[provider]
+
+
+async def close_async_sessions():
+    """Close sessions bound to the running event loop."""
+    loop_sessions = _async_sessions.pop(asyncio.get_running_loop(), {})
+    for session in loop_sessions.values():
+        await session.aclose()
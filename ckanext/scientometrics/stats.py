@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import logging
+import socket
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+import ckan.plugins.toolkit as tk
+from ckan.exceptions import CkanConfigurationException
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.scientometrics import config
+
+log = logging.getLogger(__name__)
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_EMPTY = "empty"
+OUTCOME_FAILED = "failed"
+OUTCOME_SKIPPED = "skipped"
+
+_collector: StatsCollector | None = None
+_lock = threading.Lock()
+_prometheus_metrics: dict[str, Any] = {}
+_prometheus_lock = threading.Lock()
+
+# number of latest call durations kept per source for percentiles
+_SAMPLES = 10000
+_OUTCOMES = (OUTCOME_SUCCESS, OUTCOME_EMPTY, OUTCOME_FAILED, OUTCOME_SKIPPED)
+
+
+@dataclass
+class _SourceStats:
+    calls: int = 0
+    failed_calls: int = 0
+    skipped_calls: int = 0
+    seconds: float = 0
+    max_seconds: float = 0
+    items: dict[str, int] = field(default_factory=lambda: dict.fromkeys(_OUTCOMES, 0))
+    samples: deque[float] = field(default_factory=lambda: deque(maxlen=_SAMPLES))
+
+
+class StatsCollector:
+    """Thread-safe counters and timings of metrics refresh.
+
+    Every extractor call is recorded with its duration and the outcome of
+    requested items, every bulk upsert with the number of rows and duration.
+    Events are forwarded to the exporter as they happen.
+
+    Args:
+        exporter: receiver of individual events
+    """
+
+    def __init__(self, exporter: StatsExporter | None = None):
+        self.exporter = exporter or StatsExporter()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._sources: dict[str, _SourceStats] = {}
+        self._upserts: dict[str, float] = {"calls": 0, "rows": 0, "seconds": 0}
+        self._lock = threading.Lock()
+
+    def record_call(self, source: str, seconds: float, outcomes: dict[str, int]):
+        """Record a call of the source's extractor.
+
+        Args:
+            source: extractor key, e.g. `openalex_author`
+            seconds: wall time of the call, including rate limit waits and retries
+            outcomes: number of requested items per outcome
+        """
+        with self._lock:
+            stats = self._sources.setdefault(source, _SourceStats())
+            stats.calls += 1
+            if outcomes.get(OUTCOME_FAILED):
+                stats.failed_calls += 1
+            elif outcomes.get(OUTCOME_SKIPPED):
+                stats.skipped_calls += 1
+            else:
+                stats.seconds += seconds
+                stats.max_seconds = max(stats.max_seconds, seconds)
+                stats.samples.append(seconds)
+            for outcome, count in outcomes.items():
+                stats.items[outcome] += count
+
+        self.exporter.record_call(source, seconds, outcomes)
+
+    def record_upsert(self, table: str, rows: int, seconds: float):
+        """Record a bulk write of metrics."""
+        with self._lock:
+            self._upserts["calls"] += 1
+            self._upserts["rows"] += rows
+            self._upserts["seconds"] += seconds
+
+        self.exporter.record_upsert(table, rows, seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON-serializable summary of everything recorded so far."""
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            sources = {source: _summarize(stats, elapsed) for source, stats in self._sources.items()}
+            upserts = dict(self._upserts)
+
+        # write speed of the database, not the throughput of the whole run
+        upserts["rows_per_second"] = _rate(upserts["rows"], upserts["seconds"])
+        return {
+            "started_at": self.started_at,
+            "elapsed": elapsed,
+            "sources": sources,
+            "upsert": upserts,
+        }
+
+    def flush(self) -> dict[str, Any]:
+        """Send the summary to the exporter and return it."""
+        snapshot = self.snapshot()
+        self.exporter.flush(snapshot)
+        return snapshot
+
+
+class StatsExporter:
+    """Receiver of refresh events that does nothing."""
+
+    def record_call(self, source: str, seconds: float, outcomes: dict[str, int]):
+        pass
+
+    def record_upsert(self, table: str, rows: int, seconds: float):
+        pass
+
+    def flush(self, snapshot: dict[str, Any]):
+        pass
+
+
+class StatsdExporter(StatsExporter):
+    """Send events to StatsD over UDP.
+
+    Args:
+        address: `host:port` of StatsD server
+        prefix: prefix of metric names
+    """
+
+    def __init__(self, address: str, prefix: str):
+        host, _, port = address.rpartition(":")
+        self.address = (host or "localhost", int(port))
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record_call(self, source: str, seconds: float, outcomes: dict[str, int]):
+        lines = [f"{self.prefix}.{source}.call:{seconds * 1000:.3f}|ms"]
+        lines.extend(f"{self.prefix}.{source}.{outcome}:{count}|c" for outcome, count in outcomes.items() if count)
+        self._send(lines)
+
+    def record_upsert(self, table: str, rows: int, seconds: float):
+        self._send(
+            [
+                f"{self.prefix}.upsert.{table}:{seconds * 1000:.3f}|ms",
+                f"{self.prefix}.upsert.{table}.rows:{rows}|c",
+            ]
+        )
+
+    def _send(self, lines: list[str]):
+        try:
+            self._socket.sendto("\n".join(lines).encode(), self.address)
+        except OSError:
+            # stats must never break the refresh
+            log.debug("Cannot send stats to %s", self.address, exc_info=True)
+
+
+class PrometheusExporter(StatsExporter):
+    """Update Prometheus metrics of the default registry.
+
+    Metrics are served by whatever exposes the default registry of the
+    process. When `pushgateway` is set, they are also pushed there on flush,
+    which is the way to collect them from CLI commands.
+
+    Args:
+        pushgateway: address of Prometheus Pushgateway
+    """
+
+    def __init__(self, pushgateway: str | None):
+        try:
+            import prometheus_client  # noqa: PLC0415
+        except ImportError as err:
+            msg = "prometheus-client is required by Prometheus stats exporter"
+            raise CkanConfigurationException(msg) from err
+
+        self.client = prometheus_client
+        self.pushgateway = pushgateway
+        self.metrics = _get_prometheus_metrics(prometheus_client)
+
+    def record_call(self, source: str, seconds: float, outcomes: dict[str, int]):
+        self.metrics["calls"].labels(source).observe(seconds)
+        for outcome, count in outcomes.items():
+            if count:
+                self.metrics["items"].labels(source, outcome).inc(count)
+
+    def record_upsert(self, table: str, rows: int, seconds: float):
+        self.metrics["upserts"].labels(table).observe(seconds)
+        self.metrics["rows"].labels(table).inc(rows)
+
+    def flush(self, snapshot: dict[str, Any]):
+        if not self.pushgateway:
+            return
+        try:
+            self.client.push_to_gateway(self.pushgateway, job="scim_refresh", registry=self.client.REGISTRY)
+        except OSError:
+            log.exception("Cannot push stats to %s", self.pushgateway)
+
+
+def get_collector() -> StatsCollector:
+    """Collector with exporter configured by `ckanext.scientometrics.stats.*` options."""
+    global _collector  # noqa: PLW0603
+    if _collector is None:
+        with _lock:
+            if _collector is None:
+                _collector = StatsCollector(_make_exporter())
+    return _collector
+
+
+def reset():
+    """Forget the current collector, so it's rebuilt from config on next access."""
+    global _collector  # noqa: PLW0603
+    _collector = None
+
+
+def save_last_run(snapshot: dict[str, Any]):
+    """Keep summary of the finished refresh, so it's available to all processes."""
+    connect_to_redis().set(_last_run_key(), json.dumps(snapshot))
+
+
+def last_run() -> dict[str, Any] | None:
+    """Summary of the latest finished refresh."""
+    value = connect_to_redis().get(_last_run_key())
+    return json.loads(value) if value else None
+
+
+def _last_run_key() -> str:
+    site_id = tk.config["ckan.site_id"]
+    return f"ckan:{site_id}:scim:refresh_stats"
+
+
+def _make_exporter() -> StatsExporter:
+    exporter = config.stats_exporter()
+    if exporter == "statsd":
+        return StatsdExporter(config.stats_statsd_address(), config.stats_prefix())
+    if exporter == "prometheus":
+        return PrometheusExporter(config.stats_pushgateway())
+    return StatsExporter()
+
+
+def _get_prometheus_metrics(client: Any) -> dict[str, Any]:
+    # metrics can be registered only once per process
+    with _prometheus_lock:
+        if not _prometheus_metrics:
+            _prometheus_metrics.update(
+                calls=client.Histogram(
+                    "scim_extractor_call_seconds",
+                    "Duration of metrics extractor calls",
+                    ["source"],
+                ),
+                items=client.Counter(
+                    "scim_extractor_items",
+                    "Items requested from metrics extractors by outcome",
+                    ["source", "outcome"],
+                ),
+                upserts=client.Histogram(
+                    "scim_upsert_seconds",
+                    "Duration of bulk writes of metrics",
+                    ["table"],
+                ),
+                rows=client.Counter(
+                    "scim_upsert_rows",
+                    "Number of metrics records written",
+                    ["table"],
+                ),
+            )
+    return _prometheus_metrics
+
+
+def _summarize(stats: _SourceStats, elapsed: float) -> dict[str, Any]:
+    samples = sorted(stats.samples)
+    latency: dict[str, float | None] = dict.fromkeys(["mean", "p50", "p95", "p99", "max"])
+    if samples:
+        latency["mean"] = statistics.fmean(samples)
+        latency["p50"] = _percentile(samples, 0.5)
+        latency["p95"] = _percentile(samples, 0.95)
+        latency["p99"] = _percentile(samples, 0.99)
+        latency["max"] = stats.max_seconds
+
+    return {
+        "calls": stats.calls,
+        "failed_calls": stats.failed_calls,
+        "skipped_calls": stats.skipped_calls,
+        "seconds": stats.seconds,
+        "latency": latency,
+        "items": dict(stats.items),
+        "items_per_second": _rate(sum(stats.items.values()), elapsed),
+    }
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def _rate(count: float, elapsed: float) -> float:
+    return count / elapsed if elapsed > 0 else 0
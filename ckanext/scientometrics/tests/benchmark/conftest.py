@@ -0,0 +1,186 @@
+"""Fixtures of the benchmark suite.
+
+Benchmarks are excluded from the default run. Run them against the test
+database with:
+
+    pytest -m benchmark ckanext/scientometrics/tests/benchmark
+
+Stub providers are configured by environment variables:
+`SCIM_BENCHMARK_LATENCY`(seconds, default 0.02),
+`SCIM_BENCHMARK_ERROR_RATE`(default 0.01) and
+`SCIM_BENCHMARK_MISSING_RATE`(default 0.05). Sizes of synthetic populations
+are set by comma-separated `SCIM_BENCHMARK_POPULATIONS`(default
+1000,10000,100000). When `SCIM_BENCHMARK_OUTPUT` is set, results are also
+written there as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import resource
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import pytest
+import requests
+
+from ckan import model
+
+from ckanext.scientometrics import metrics_extractors, stats
+from ckanext.scientometrics.metrics_extractors import (
+    OpenAlexAuthorMetricsExtractor,
+    SemanticScholarAuthorMetricsExtractor,
+)
+from ckanext.scientometrics.tests.benchmark.stub import HTTP_NOT_FOUND, HTTP_UNAVAILABLE, StubProvider
+
+_results: list[BenchmarkResult] = []
+
+# `ru_maxrss` is reported in bytes on macOS and in KiB elsewhere
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    items: int
+    seconds: float = 0
+    peak_memory: int = 0
+    latency: dict[str, dict[str, float | None]] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds else 0
+
+
+class Benchmark:
+    """Measure wall time, peak memory and per-source latency of a code block.
+
+    Memory is taken from the peak resident set size of the process instead of
+    tracemalloc, which slows down every allocation and skews the wall time.
+    The peak only grows, so `peak_memory` is the amount by which the block
+    raised it: blocks that stay below the peak of earlier ones report 0.
+    """
+
+    @contextmanager
+    def measure(self, name: str, items: int) -> Iterator[BenchmarkResult]:
+        result = BenchmarkResult(name, items)
+        stats.reset()
+        peak_before = _peak_rss()
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result.seconds = time.perf_counter() - started
+            result.peak_memory = _peak_rss() - peak_before
+            snapshot = stats.get_collector().snapshot()
+            result.latency = {source: data["latency"] for source, data in snapshot["sources"].items()}
+            _results.append(result)
+
+
+def _peak_rss() -> int:
+    """Peak resident set size of the process in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+class _ScholarlyStub:
+    """Replacement of `scholarly` that queries the stub provider."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def search_author_id(self, author_id: str) -> dict[str, Any] | None:
+        resp = requests.get(f"{self.url}/citations", params={"user": author_id}, timeout=30)
+        if resp.status_code == HTTP_UNAVAILABLE:
+            raise metrics_extractors.MaxTriesExceededException
+        if resp.status_code == HTTP_NOT_FOUND:
+            # scholarly fails with AttributeError on unknown authors
+            return None
+        return resp.json()
+
+    def fill(self, author: dict[str, Any] | None, sections: list[str]) -> dict[str, Any]:
+        if author is None:
+            raise AttributeError(author)
+        return author
+
+
+@pytest.fixture
+def benchmark() -> Benchmark:
+    return Benchmark()
+
+
+@pytest.fixture
+def stub_provider(monkeypatch: pytest.MonkeyPatch) -> Iterator[StubProvider]:
+    """Running stub of all providers, used by built-in extractors."""
+    stub = StubProvider(
+        latency=float(os.environ.get("SCIM_BENCHMARK_LATENCY", 0.02)),
+        error_rate=float(os.environ.get("SCIM_BENCHMARK_ERROR_RATE", 0.01)),
+        missing_rate=float(os.environ.get("SCIM_BENCHMARK_MISSING_RATE", 0.05)),
+    ).start()
+    monkeypatch.setattr(OpenAlexAuthorMetricsExtractor, "base_url", f"{stub.url}/openalex")
+    monkeypatch.setattr(SemanticScholarAuthorMetricsExtractor, "base_url", f"{stub.url}/semantic_scholar")
+    monkeypatch.setattr(metrics_extractors, "scholarly", _ScholarlyStub(f"{stub.url}/google_scholar"))
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def make_population(scim_db: None):
+    """Factory of users with author IDs of every built-in source.
+
+    Users are inserted directly, in chunks, because creating 100k users
+    through actions takes longer than the benchmark itself.
+    """
+
+    def factory(size: int, chunk_size: int = 5000) -> list[str]:
+        table = model.User.__table__
+        ids: list[str] = []
+        for start in range(0, size, chunk_size):
+            rows = [
+                {
+                    "id": f"scim-bench-{idx}",
+                    "name": f"scim-bench-{idx}",
+                    "email": f"scim-bench-{idx}@example.com",
+                    "state": model.State.ACTIVE,
+                    "plugin_extras": {
+                        "scim": {
+                            "openalex_author_id": f"A{idx}",
+                            "semantic_scholar_author_id": str(idx),
+                            "google_scholar_author_id": f"GS{idx}",
+                        },
+                    },
+                }
+                for idx in range(start, min(start + chunk_size, size))
+            ]
+            model.Session.execute(table.insert(), rows)
+            ids.extend(row["id"] for row in rows)
+        model.Session.commit()
+        return ids
+
+    return factory
+
+
+def pytest_terminal_summary(terminalreporter: Any):
+    if not _results:
+        return
+
+    terminalreporter.section("scientometrics benchmarks")
+    for result in _results:
+        terminalreporter.write_line(
+            f"{result.name}: {result.items} items in {result.seconds:.2f}s, "
+            f"{result.throughput:.1f} items/s, peak memory +{result.peak_memory / 2**20:.1f} MiB"
+        )
+        for source, latency in result.latency.items():
+            if latency["p50"] is None:
+                continue
+            terminalreporter.write_line(
+                f"    {source}: p50 {latency['p50'] * 1000:.1f}ms, p99 {latency['p99'] * 1000:.1f}ms"
+            )
+
+    if output := os.environ.get("SCIM_BENCHMARK_OUTPUT"):
+        with open(output, "w") as dest:
+            json.dump([dict(asdict(result), throughput=result.throughput) for result in _results], dest, indent=2)
@@ -0,0 +1,174 @@
+"""Local HTTP server that imitates APIs of metrics providers.
+
+Responses are derived from author IDs, so runs are reproducible. Every
+request sleeps for `latency` seconds; `error_rate` of requests fail with HTTP
+503 and `missing_rate` of authors are unknown to the provider.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+HTTP_OK = 200
+HTTP_NOT_FOUND = 404
+HTTP_UNAVAILABLE = 503
+
+
+class StubProvider:
+    """Stub of OpenAlex, Semantic Scholar and Google Scholar APIs.
+
+    Routes:
+        GET /openalex/authors/<id>
+        GET /openalex/authors?filter=ids.openalex:<id>|<id>
+        GET /semantic_scholar/author/<id>
+        POST /semantic_scholar/author/batch
+        GET /google_scholar/citations?user=<id>
+
+    Args:
+        latency: seconds spent on every request
+        error_rate: share of requests that fail with HTTP 503
+        missing_rate: share of unknown authors
+        seed: seed of the generator of failures
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, missing_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> StubProvider:
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def author(self, author_id: str) -> dict[str, int] | None:
+        """Deterministic metrics of the author or None if the author is unknown."""
+        digest = zlib.crc32(author_id.encode())
+        if digest % 1000 < self.missing_rate * 1000:
+            return None
+        return {
+            "h_index": digest % 80,
+            "i10_index": digest % 200,
+            "citation_count": digest % 50000,
+            "paper_count": digest % 500,
+        }
+
+    def fails(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            return self._random.random() < self.error_rate
+
+    def route(self, method: str, path: str, query: dict[str, list[str]], body: Any) -> tuple[int, Any]:
+        """Produce status and JSON payload of the response."""
+        provider, _, rest = path.strip("/").partition("/")
+        handler = getattr(self, f"_{provider}", None)
+        if handler is None:
+            return HTTP_NOT_FOUND, {"error": "unknown provider"}
+        return handler(method, rest, query, body)
+
+    def _openalex(self, method: str, path: str, query: dict[str, list[str]], body: Any) -> tuple[int, Any]:
+        if path == "authors":
+            ids = query["filter"][0].removeprefix("ids.openalex:").split("|")
+            return HTTP_OK, {"results": [self._openalex_author(key) for key in ids if self.author(key)]}
+
+        key = path.removeprefix("authors/")
+        if not self.author(key):
+            return HTTP_NOT_FOUND, {"error": "not found"}
+        return HTTP_OK, self._openalex_author(key)
+
+    def _openalex_author(self, key: str) -> dict[str, Any]:
+        metrics = self.author(key) or {}
+        return {
+            "id": f"https://openalex.org/{key}",
+            "summary_stats": {"h_index": metrics["h_index"], "i10_index": metrics["i10_index"]},
+            "cited_by_count": metrics["citation_count"],
+            "works_count": metrics["paper_count"],
+        }
+
+    def _semantic_scholar(self, method: str, path: str, query: dict[str, list[str]], body: Any) -> tuple[int, Any]:
+        if method == "POST" and path == "author/batch":
+            return HTTP_OK, [self._semantic_scholar_author(key) for key in body["ids"]]
+
+        author = self._semantic_scholar_author(path.removeprefix("author/"))
+        if not author:
+            return HTTP_NOT_FOUND, {"error": "not found"}
+        return HTTP_OK, author
+
+    def _semantic_scholar_author(self, key: str) -> dict[str, Any] | None:
+        metrics = self.author(key)
+        if not metrics:
+            return None
+        return {
+            "authorId": key,
+            "hIndex": metrics["h_index"],
+            "citationCount": metrics["citation_count"],
+            "paperCount": metrics["paper_count"],
+        }
+
+    def _google_scholar(self, method: str, path: str, query: dict[str, list[str]], body: Any) -> tuple[int, Any]:
+        metrics = self.author(query["user"][0])
+        if not metrics:
+            return HTTP_NOT_FOUND, {"error": "not found"}
+        return HTTP_OK, {
+            "hindex": metrics["h_index"],
+            "hindex5y": metrics["h_index"] // 2,
+            "i10index": metrics["i10_index"],
+            "i10index5y": metrics["i10_index"] // 2,
+            "citedby": metrics["citation_count"],
+            "citedby5y": metrics["citation_count"] // 2,
+        }
+
+
+def _handler(stub: StubProvider) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # noqa: N802
+            self._respond("GET", None)
+
+        def do_POST(self):  # noqa: N802
+            length = int(self.headers.get("Content-Length") or 0)
+            self._respond("POST", json.loads(self.rfile.read(length) or b"null"))
+
+        def log_message(self, format: str, *args: Any):  # noqa: A002
+            pass
+
+        def _respond(self, method: str, body: Any):
+            if stub.latency:
+                time.sleep(stub.latency)
+
+            url = urlparse(self.path)
+            if stub.fails():
+                status, payload = HTTP_UNAVAILABLE, {"error": "unavailable"}
+            else:
+                status, payload = stub.route(method, url.path, parse_qs(url.query), body)
+
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from ckan import model
+from ckan.cli.cli import ckan
+from ckan.tests.helpers import call_action
+
+from ckanext.scientometrics.model import UserMetric
+
+POPULATIONS = [int(size) for size in os.environ.get("SCIM_BENCHMARK_POPULATIONS", "1000,10000,100000").split(",")]
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.ckan_config("ckan.plugins", "scientometrics"),
+    pytest.mark.ckan_config("ckanext.scientometrics.enabled_metrics", "openalex semantic_scholar google_scholar"),
+    pytest.mark.ckan_config("ckanext.scientometrics.rate_limit.rates", ""),
+    pytest.mark.ckan_config("ckanext.scientometrics.refresh.on_user_update", "false"),
+    pytest.mark.usefixtures("with_plugins", "stub_provider"),
+]
+
+
+def _stored() -> int:
+    return model.Session.query(UserMetric).count()
+
+
+def test_update_user_metrics_action(make_population, benchmark):
+    user_ids = make_population(min(POPULATIONS))
+
+    with benchmark.measure(f"scim_update_user_metrics[{len(user_ids)}]", len(user_ids)):
+        for user_id in user_ids:
+            call_action("scim_update_user_metrics", user_id=user_id)
+
+    assert _stored()
+
+
+@pytest.mark.parametrize("size", POPULATIONS)
+def test_upsert(make_population, benchmark, size):
+    user_ids = make_population(size)
+
+    with benchmark.measure(f"UserMetric.upsert[{size}]", size):
+        for user_id in user_ids:
+            UserMetric.upsert(user_id, "openalex", {"h_index": 1, "citation_count": 10})
+        model.Session.commit()
+
+    assert _stored() == size
+
+
+@pytest.mark.parametrize("size", POPULATIONS)
+def test_bulk_upsert(make_population, benchmark, size):
+    user_ids = make_population(size)
+    rows = [{"user_id": user_id, "source": "openalex", "metrics": {"h_index": 1}} for user_id in user_ids]
+
+    with benchmark.measure(f"UserMetric.bulk_upsert[{size}]", size):
+        UserMetric.bulk_upsert(rows)
+        model.Session.commit()
+
+    assert _stored() == size
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+@pytest.mark.parametrize("size", POPULATIONS)
+def test_cli(make_population, benchmark, cli, size, engine):
+    make_population(size)
+
+    with benchmark.measure(f"update-user-metrics[{engine}-{size}]", size):
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--workers", "16", "--engine", engine])
+
+    assert not result.exit_code, result.output
+    assert _stored()
@@ -0,0 +1,9 @@
+from typing import Any
+
+import pytest
+
+
+@pytest.fixture
+def scim_db(clean_db: None, migrate_db_for: Any):
+    """Clean database with tables of the extension."""
+    migrate_db_for("scientometrics")
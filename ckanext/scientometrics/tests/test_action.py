@@ -0,0 +1,84 @@
+from typing import Any
+
+import pytest
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.tests import factories
+from ckan.tests.helpers import call_action, call_auth
+
+from ckanext.scientometrics.model import UserMetric, UserMetricRank
+
+
+def _user_with_metrics(state: str = model.State.ACTIVE, **metrics: Any) -> str:
+    user_id = factories.User()["id"]
+    UserMetric.upsert(user_id, "openalex", metrics)
+    if state != model.State.ACTIVE:
+        model.Session.query(model.User).filter(model.User.id == user_id).update({"state": state})
+    model.Session.commit()
+    return user_id
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestMetricsLeaderboard:
+    def test_ranking_after_refresh(self):
+        top = _user_with_metrics(h_index=10, citation_count=1)
+        tied = sorted([_user_with_metrics(h_index=5), _user_with_metrics(h_index=5)])
+        _user_with_metrics(h_index="unknown")
+        _user_with_metrics(state=model.State.DELETED, h_index=100)
+
+        result = call_action("scim_metrics_leaderboard", source="openalex")
+        assert result["top"] == []
+
+        UserMetricRank.refresh()
+        model.Session.commit()
+
+        result = call_action("scim_metrics_leaderboard", source="openalex")
+        assert [(item["user_id"], item["value"]) for item in result["top"]] == [(top, 10), (tied[0], 5), (tied[1], 5)]
+        assert result["stats"]["count"] == 3
+        assert (result["stats"]["min"], result["stats"]["max"], result["stats"]["median"]) == (5, 10, 5)
+
+        result = call_action("scim_metrics_leaderboard", source="openalex", limit=1, offset=1)
+        assert [item["user_id"] for item in result["top"]] == [tied[0]]
+
+    def test_limit_is_capped(self):
+        with pytest.raises(tk.ValidationError):
+            call_action("scim_metrics_leaderboard", source="openalex", limit=101)
+
+
+@pytest.mark.ckan_config("ckan.auth.public_user_details", "false")
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestUserDetailsAccess:
+    def test_anonymous_cannot_see_user_metrics(self):
+        user = factories.User()
+        for name, data in [
+            ("scim_metrics_leaderboard", {"source": "openalex"}),
+            ("scim_get_user_metric_history", {"user_id": user["id"]}),
+            ("scim_get_user_metrics_many", {"user_ids": [user["id"]]}),
+        ]:
+            with pytest.raises(tk.NotAuthorized):
+                call_auth(name, {"user": "", "model": model}, **data)
+
+    def test_user_can_see_own_metrics(self):
+        user = factories.User()
+        context = {"user": user["name"], "model": model}
+
+        assert call_auth("scim_get_user_metric_history", context.copy(), user_id=user["id"])
+        assert call_auth("scim_get_user_metrics_many", context.copy(), user_ids=[user["id"]])
+        with pytest.raises(tk.NotAuthorized):
+            call_auth("scim_get_user_metrics_many", context.copy(), user_ids=[user["id"], factories.User()["id"]])
+
+    @pytest.mark.ckan_config("ckan.auth.public_user_details", "true")
+    def test_public_user_details(self):
+        assert call_auth("scim_metrics_leaderboard", {"user": "", "model": model}, source="openalex")
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestUpdateDatasetMetrics:
+    def test_package_ids_are_required(self):
+        with pytest.raises(tk.ValidationError):
+            call_action("scim_update_dataset_metrics")
+
+    def test_package_ids_are_capped(self):
+        with pytest.raises(tk.ValidationError):
+            call_action("scim_update_dataset_metrics", package_ids=[f"pkg-{idx}" for idx in range(101)])
@@ -0,0 +1,55 @@
+import pytest
+
+from ckan import model
+
+from ckanext.scientometrics import cache
+from ckanext.scientometrics.cache import MemoryCache
+
+
+class TestMemoryCache:
+    def test_lru_eviction(self):
+        cache = MemoryCache(ttl=60, size=2)
+        cache.set("a", {"openalex": {}})
+        cache.set("b", {})
+        cache.get("a")
+        cache.set("c", {})
+
+        assert cache.get("a") == {"openalex": {}}
+        assert cache.get("b") is None
+        assert cache.get("c") == {}
+
+    def test_expiration(self):
+        cache = MemoryCache(ttl=-1, size=10)
+        cache.set("a", {})
+        assert cache.get("a") is None
+
+    def test_invalidate(self):
+        cache = MemoryCache(ttl=60, size=10)
+        cache.set("a", {})
+        cache.invalidate("a")
+        assert cache.get("a") is None
+
+    def test_values_are_copied(self):
+        cache = MemoryCache(ttl=60, size=10)
+        cache.set("a", {"openalex": {"h_index": 1}})
+        cache.get("a")["openalex"]["h_index"] = 2
+        assert cache.get("a") == {"openalex": {"h_index": 1}}
+
+    def test_many(self):
+        cache = MemoryCache(ttl=60, size=10)
+        cache.set_many({"a": {"openalex": {}}, "b": {}})
+        assert cache.get_many(["a", "b", "c"]) == {"a": {"openalex": {}}, "b": {}}
+
+
+@pytest.mark.ckan_config("ckanext.scientometrics.cache.backend", "memory")
+@pytest.mark.usefixtures("with_plugins")
+class TestInvalidateOnCommit:
+    def test_invalidated_after_commit(self):
+        metrics_cache = cache.get_cache()
+        metrics_cache.set("a", {})
+
+        cache.invalidate_on_commit(model.Session, ["a"])
+        assert metrics_cache.get("a") == {}
+
+        model.Session.commit()
+        assert metrics_cache.get("a") is None
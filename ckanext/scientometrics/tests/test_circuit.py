@@ -0,0 +1,39 @@
+from ckanext.scientometrics.circuit import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, MemoryCircuitBreaker
+
+
+class TestMemoryCircuitBreaker:
+    def test_opens_after_threshold(self):
+        breaker = MemoryCircuitBreaker("test", threshold=2, cooldown=60)
+        breaker.record_failure()
+        assert breaker.allow()
+
+        breaker.record_failure()
+        assert not breaker.allow()
+        assert breaker.status()["state"] == STATE_OPEN
+
+    def test_success_resets_failures(self):
+        breaker = MemoryCircuitBreaker("test", threshold=2, cooldown=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.allow()
+        assert breaker.status()["state"] == STATE_CLOSED
+
+    def test_single_probe_when_half_open(self):
+        breaker = MemoryCircuitBreaker("test", threshold=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.status()["state"] == STATE_HALF_OPEN
+
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert breaker.status()["state"] == STATE_CLOSED
+
+    def test_failed_probe_opens_again(self):
+        breaker = MemoryCircuitBreaker("test", threshold=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.status()["opened_at"] is not None
+        assert breaker.allow()
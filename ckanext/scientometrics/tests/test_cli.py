@@ -0,0 +1,123 @@
+from typing import Any
+
+import pytest
+
+from ckan import model
+from ckan.cli.cli import ckan
+from ckan.tests import factories
+
+from ckanext.scientometrics import refresh
+from ckanext.scientometrics.model import RefreshRun
+from ckanext.scientometrics.refresh import RefreshTask
+
+
+def _author(author_id: str) -> str:
+    """Create user with OpenAlex author ID in extras."""
+    user = model.User.get(factories.User()["id"])
+    assert user
+    user.plugin_extras = {"scim": {"openalex_author_id": author_id}}
+    model.Session.commit()
+    return user.id
+
+
+def _run(**params: Any) -> RefreshRun:
+    run = RefreshRun.start({"user_ids": None, "sources": ["openalex"], "max_age": None, "shard": None, **params})
+    model.Session.commit()
+    return run
+
+
+@pytest.fixture
+def fetched(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Author IDs requested from providers."""
+    authors: list[str] = []
+
+    def fetch(source: str, batch: list[RefreshTask]) -> dict[str, dict[str, Any]]:
+        authors.extend(task.author_id for task in batch)
+        return {task.author_id: {"h_index": 1} for task in batch}
+
+    monkeypatch.setattr(refresh, "_fetch", fetch)
+    return authors
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestUpdateUserMetricsResume:
+    def test_interrupted_run(self, cli: Any, monkeypatch: pytest.MonkeyPatch):
+        _author("A1")
+
+        def fetch(source: str, batch: list[RefreshTask]) -> dict[str, dict[str, Any]]:
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(refresh, "_fetch", fetch)
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--requested-sources", "openalex"])
+
+        assert result.exit_code
+        [run] = RefreshRun.unfinished()
+        assert run.status == RefreshRun.STATUS_INTERRUPTED
+
+    def test_resume_skips_completed_pairs(self, cli: Any, fetched: list[str]):
+        updated = _author("A1")
+        failed = _author("A2")
+        _author("A3")
+        run = _run()
+        run.checkpoint([(updated, "openalex", "updated"), (failed, "openalex", "failed")])
+        run.interrupt()
+        model.Session.commit()
+
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--resume"])
+
+        assert not result.exit_code, result.output
+        assert sorted(fetched) == ["A2", "A3"]
+        model.Session.refresh(run)
+        assert run.status == RefreshRun.STATUS_COMPLETED
+        assert run.summary == {"total": 3, "updated": 3}
+
+    def test_resume_without_unfinished_pairs(self, cli: Any, fetched: list[str]):
+        user_id = _author("A1")
+        run = _run()
+        run.checkpoint([(user_id, "openalex", "updated")])
+        run.interrupt()
+        model.Session.commit()
+
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--resume", run.id])
+
+        assert not result.exit_code, result.output
+        assert not fetched
+        model.Session.refresh(run)
+        assert run.status == RefreshRun.STATUS_COMPLETED
+
+    def test_running_run_is_not_taken_over(self, cli: Any, fetched: list[str]):
+        _author("A1")
+        run = _run()
+
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--resume", run.id])
+
+        assert result.exit_code
+        assert "is still running" in result.output
+        assert not fetched
+
+    def test_completed_run_is_rejected(self, cli: Any, fetched: list[str]):
+        user_id = _author("A1")
+        run = _run()
+        run.checkpoint([(user_id, "openalex", "failed")])
+        run.finish()
+        model.Session.commit()
+
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--resume", run.id])
+
+        assert result.exit_code
+        assert "start a new run with --max-age" in result.output
+        assert not fetched
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestUpdateUserMetricsShard:
+    @pytest.mark.parametrize("shard", ["3/3", "4/3", "-1/3", "1", "a/b"])
+    def test_invalid_shard(self, cli: Any, fetched: list[str], shard: str):
+        _author("A1")
+
+        result = cli.invoke(ckan, ["scim", "update-user-metrics", "--shard", shard])
+
+        assert result.exit_code
+        assert "Shard must be I/N" in result.output
+        assert not fetched
+        assert not RefreshRun.unfinished()
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+import requests
+
+from ckanext.scientometrics import credentials, ratelimit
+from ckanext.scientometrics.metrics_extractors import RateLimitedError
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.ckan_config("ckanext.scientometrics.rate_limit.rates", "")
+@pytest.mark.ckan_config("ckanext.scientometrics.credentials.api_keys", "test:a test:b")
+@pytest.mark.ckan_config("ckanext.scientometrics.credentials.proxies", "other:http://proxy")
+@pytest.mark.usefixtures("with_plugins")
+class TestCredentialPool:
+    def test_no_pool_without_credentials(self):
+        assert credentials.get_pool("other", credentials.KIND_API_KEY) is None
+
+    def test_kinds_are_kept_apart(self):
+        assert credentials.get_pool("test", credentials.KIND_PROXY) is None
+        pool = credentials.get_pool("other", credentials.KIND_PROXY)
+        assert pool
+        assert [credential.value for credential in pool.credentials] == ["http://proxy"]
+
+    def test_fingerprint_does_not_depend_on_position(self):
+        first = credentials.Credential("test", 0, "a", None)
+        second = credentials.Credential("test", 3, "a", None)
+        assert first.fingerprint == second.fingerprint
+        assert first.fingerprint != credentials.Credential("test", 0, "b", None).fingerprint
+        assert "a" not in first.label
+
+    def test_rotation(self):
+        pool = credentials.get_pool("test", credentials.KIND_API_KEY)
+        assert pool
+        assert [pool.call(lambda key: key.value) for _ in range(4)] == ["a", "b", "a", "b"]
+
+    def test_throttled_credential_is_skipped(self):
+        pool = credentials.get_pool("test", credentials.KIND_API_KEY)
+        assert pool
+
+        def func(key: credentials.Credential):
+            if key.value == "a":
+                raise RateLimitedError("test", retry_after=60)
+            return key.value
+
+        with pytest.raises(RateLimitedError):
+            pool.call(func)
+        assert [pool.call(func) for _ in range(3)] == ["b", "b", "b"]
+
+    def test_throttled_call_is_retried_with_next_credential(self):
+        pool = credentials.get_pool("test", credentials.KIND_API_KEY)
+        assert pool
+        calls: list[tuple[str, float]] = []
+
+        def func(key: credentials.Credential):
+            calls.append((key.value, time.monotonic()))
+            if key.value == "a":
+                raise RateLimitedError("test", retry_after=60)
+            return key.value
+
+        assert ratelimit.call("test", lambda: pool.call(func), pooled=True) == "b"
+        assert [value for value, _ in calls] == ["a", "b"]
+        assert calls[1][1] - calls[0][1] < 1
+        assert ratelimit.get_limiter("test", pooled=True).try_acquire() == 0
+
+    def test_limiters_are_checked_outside_of_lock(self, monkeypatch: pytest.MonkeyPatch):
+        pool = credentials.get_pool("test", credentials.KIND_API_KEY)
+        assert pool
+        locked: list[bool] = []
+        for credential in pool.credentials:
+            monkeypatch.setattr(credential.limiter, "try_acquire", lambda: locked.append(pool._lock.locked()) or 0)
+
+        pool.acquire()
+        assert locked == [False]
+
+    def test_unknown_item_keeps_credential_healthy(self):
+        pool = credentials.get_pool("test", credentials.KIND_API_KEY)
+        assert pool
+
+        def func(key: credentials.Credential):
+            raise _http_error(404)
+
+        with pytest.raises(requests.HTTPError):
+            pool.call(func)
+        assert all(not status["failures"] for status in pool.status())
+
+
+class TestIsCredentialFailure:
+    @pytest.mark.parametrize(("status", "expected"), [(401, True), (403, True), (404, False), (503, True)])
+    def test_http_status(self, status: int, expected: bool):
+        assert credentials.is_credential_failure(_http_error(status)) is expected
+
+    def test_connection_error(self):
+        assert credentials.is_credential_failure(requests.ConnectionError())
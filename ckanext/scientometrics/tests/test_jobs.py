@@ -0,0 +1,81 @@
+from typing import Any
+
+import pytest
+from rq.job import JobStatus
+
+import ckan.plugins.toolkit as tk
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.scientometrics import jobs
+
+
+class FakeJob:
+    def __init__(self, status: JobStatus):
+        self.status = status
+
+    def get_status(self) -> JobStatus:
+        return self.status
+
+
+class FakeQueue:
+    """Queue that keeps jobs in memory, enqueued by the patched `enqueue_job`."""
+
+    def __init__(self):
+        self.jobs: dict[str, FakeJob] = {}
+
+    def fetch_job(self, job_id: str) -> FakeJob | None:
+        return self.jobs.get(job_id)
+
+
+@pytest.fixture
+def queue(monkeypatch: pytest.MonkeyPatch) -> FakeQueue:
+    queue = FakeQueue()
+
+    def enqueue_job(func: Any, args: list[Any], rq_kwargs: dict[str, Any], **kwargs: Any):
+        queue.jobs[rq_kwargs["job_id"]] = FakeJob(JobStatus.QUEUED)
+
+    monkeypatch.setattr(jobs, "get_queue", lambda name: queue)
+    monkeypatch.setattr(tk, "enqueue_job", enqueue_job)
+    return queue
+
+
+@pytest.mark.usefixtures("with_plugins")
+class TestEnqueueRefresh:
+    def test_pending_job_is_not_duplicated(self, queue: FakeQueue):
+        assert jobs.enqueue_refresh("user", ["openalex"]) == ["scim-refresh-user-openalex"]
+        assert jobs.enqueue_refresh("user", ["openalex"]) == []
+
+    def test_finished_job_is_replaced(self, queue: FakeQueue):
+        queue.jobs["scim-refresh-user-openalex"] = FakeJob(JobStatus.FINISHED)
+        assert jobs.enqueue_refresh("user", ["openalex"]) == ["scim-refresh-user-openalex"]
+
+    def test_follow_up_while_job_is_running(self, queue: FakeQueue):
+        queue.jobs["scim-refresh-user-openalex"] = FakeJob(JobStatus.STARTED)
+
+        assert jobs.enqueue_refresh("user", ["openalex"]) == ["scim-refresh-user-openalex-followup"]
+        assert jobs.enqueue_refresh("user", ["openalex"]) == []
+
+    def test_nothing_while_both_jobs_are_running(self, queue: FakeQueue):
+        queue.jobs["scim-refresh-user-openalex"] = FakeJob(JobStatus.STARTED)
+        queue.jobs["scim-refresh-user-openalex-followup"] = FakeJob(JobStatus.STARTED)
+
+        assert jobs.enqueue_refresh("user", ["openalex"]) == []
+
+
+@pytest.mark.ckan_config("ckanext.scientometrics.refresh.on_user_update", "true")
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestRefreshOnUserUpdate:
+    def test_only_changed_sources_are_enqueued(self, monkeypatch: pytest.MonkeyPatch):
+        calls: list[tuple[str, set[str]]] = []
+        monkeypatch.setattr(jobs, "enqueue_refresh", lambda user_id, sources: calls.append((user_id, set(sources))))
+        user = factories.User()
+
+        def update(**extras: str):
+            call_action("user_update", id=user["id"], email=user["email"], **extras)
+
+        update(openalex_author_id="A1", semantic_scholar_author_id="1")
+        update(openalex_author_id="A1", semantic_scholar_author_id="1")
+        update(openalex_author_id="A2", semantic_scholar_author_id="1")
+
+        assert calls == [(user["id"], {"openalex", "semantic_scholar"}), (user["id"], {"openalex"})]
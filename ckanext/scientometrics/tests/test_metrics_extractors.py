@@ -0,0 +1,140 @@
+from typing import Any
+
+import pytest
+
+from ckanext.scientometrics.metrics_extractors import (
+    OpenAlexAuthorMetricsExtractor,
+    OpenAlexDatasetMetricsExtractor,
+    SemanticScholarAuthorMetricsExtractor,
+)
+
+
+class FakeSession:
+    """Session that records requests and answers them from a callable."""
+
+    def __init__(self, respond: Any):
+        self.respond = respond
+        self.requests: list[tuple[str, dict[str, Any]]] = []
+        self.headers: list[dict[str, str]] = []
+
+    def get_json(self, url: str, params: dict[str, Any] | None = None, headers: dict[str, str] | None = None) -> Any:
+        self.requests.append((url, params or {}))
+        self.headers.append(headers or {})
+        return self.respond(url, params or {})
+
+    def post_json(
+        self,
+        url: str,
+        body: Any,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        self.requests.append((url, body))
+        self.headers.append(headers or {})
+        return self.respond(url, body)
+
+
+def _openalex_author(key: str) -> dict[str, Any]:
+    return {
+        "id": f"https://openalex.org/{key}",
+        "summary_stats": {"h_index": 1, "i10_index": 2},
+        "cited_by_count": 3,
+        "works_count": 4,
+    }
+
+
+@pytest.mark.ckan_config("ckanext.scientometrics.rate_limit.rates", "")
+@pytest.mark.ckan_config(
+    "ckanext.scientometrics.credentials.api_keys",
+    "semantic_scholar:key-1 semantic_scholar:key-2",
+)
+@pytest.mark.usefixtures("with_plugins")
+class TestSemanticScholarAuthorMetricsExtractor:
+    def test_batch(self, monkeypatch: pytest.MonkeyPatch):
+        known = {"1": 10, "3": 30, "4": 40}
+        session = FakeSession(
+            lambda url, body: [
+                {"authorId": author_id, "hIndex": known[author_id], "citationCount": 1, "paperCount": 2}
+                if author_id in known
+                else None
+                for author_id in body["ids"]
+            ]
+        )
+        extractor = SemanticScholarAuthorMetricsExtractor()
+        extractor.batch_size = 2
+        monkeypatch.setattr(extractor, "session", lambda: session)
+
+        result = extractor.extract_metrics_many(["1", "2", "3", "4"])
+
+        assert [url.rsplit("/", 2)[-2:] for url, _ in session.requests] == [["author", "batch"]] * 2
+        assert [body["ids"] for _, body in session.requests] == [["1", "2"], ["3", "4"]]
+        assert {author_id: metrics["h_index"] for author_id, metrics in result.items()} == known
+        assert [headers["x-api-key"] for headers in session.headers] == ["key-1", "key-2"]
+
+
+@pytest.mark.usefixtures("with_plugins")
+class TestOpenAlexAuthorMetricsExtractor:
+    def test_batch(self, monkeypatch: pytest.MonkeyPatch):
+        session = FakeSession(
+            lambda url, params: {
+                "results": [
+                    _openalex_author(key)
+                    for key in params["filter"].removeprefix("ids.openalex:").split("|")
+                    if key != "A3"
+                ]
+            }
+        )
+        extractor = OpenAlexAuthorMetricsExtractor()
+        extractor.batch_size = 2
+        monkeypatch.setattr(extractor, "session", lambda: session)
+
+        result = extractor.extract_metrics_many(["A1", "https://openalex.org/A1", "a2", "A3"])
+
+        assert [params["filter"] for _, params in session.requests] == ["ids.openalex:A1|A2", "ids.openalex:A3"]
+        assert set(result) == {"A1", "https://openalex.org/A1", "a2"}
+        assert result["A1"] == {"h_index": 1, "i10_index": 2, "citation_count": 3, "paper_count": 4}
+
+    def test_invalid_ids_are_not_requested(self, monkeypatch: pytest.MonkeyPatch):
+        session = FakeSession(
+            lambda url, params: {
+                "results": [_openalex_author(key) for key in params["filter"].removeprefix("ids.openalex:").split("|")]
+            }
+        )
+        extractor = OpenAlexAuthorMetricsExtractor()
+        monkeypatch.setattr(extractor, "session", lambda: session)
+
+        result = extractor.extract_metrics_many(["A1", "A2|A3", "https://openalex.org/a4", "W5"])
+
+        assert [params["filter"] for _, params in session.requests] == ["ids.openalex:A1|A4"]
+        assert set(result) == {"A1", "https://openalex.org/a4"}
+
+    def test_invalid_single_id_is_unknown(self, monkeypatch: pytest.MonkeyPatch):
+        session = FakeSession(lambda url, params: pytest.fail("must not be requested"))
+        extractor = OpenAlexAuthorMetricsExtractor()
+        monkeypatch.setattr(extractor, "session", lambda: session)
+
+        assert extractor.extract_metrics("not an id") == {}
+
+
+@pytest.mark.usefixtures("with_plugins")
+class TestOpenAlexDatasetMetricsExtractor:
+    def test_dois_that_break_filter_are_requested_separately(self, monkeypatch: pytest.MonkeyPatch):
+        def respond(url: str, params: dict[str, Any]) -> Any:
+            if "filter" in params:
+                dois = params["filter"].removeprefix("doi:").split("|")
+                return {"results": [{"doi": f"https://doi.org/{doi}", "id": doi, "cited_by_count": 1} for doi in dois]}
+            doi = url.rsplit("/works/doi:", 1)[-1]
+            return {"doi": f"https://doi.org/{doi}", "id": doi, "cited_by_count": 2}
+
+        session = FakeSession(respond)
+        extractor = OpenAlexDatasetMetricsExtractor()
+        monkeypatch.setattr(extractor, "session", lambda: session)
+
+        result = extractor.extract_metrics_many(["10.5281/a", "10.5281/b,c", "not-a-doi", "10.5281/d"])
+
+        assert [params.get("filter") for _, params in session.requests] == [None, "doi:10.5281/a|10.5281/d"]
+        assert {doi: metrics["citation_count"] for doi, metrics in result.items()} == {
+            "10.5281/a": 1,
+            "10.5281/b,c": 2,
+            "10.5281/d": 1,
+        }
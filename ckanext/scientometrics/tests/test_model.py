@@ -0,0 +1,312 @@
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy import func
+
+from ckan import model
+from ckan.tests import factories
+
+from ckanext.scientometrics import stats
+from ckanext.scientometrics.model import (
+    DatasetMetric,
+    RefreshRun,
+    RefreshRunItem,
+    UserMetric,
+    UserMetricHistory,
+    UserMetricRank,
+)
+
+
+def _row(user_id: str, **metrics: Any) -> dict[str, Any]:
+    return {"user_id": user_id, "source": "openalex", "metrics": metrics}
+
+
+def _author(**author_ids: str) -> str:
+    """Create user with author IDs in extras."""
+    user = model.User.get(factories.User()["id"])
+    assert user
+    user.plugin_extras = {"scim": {f"{source}_author_id": author_id for source, author_id in author_ids.items()}}
+    model.Session.commit()
+    return user.id
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestRefreshCandidates:
+    def test_max_age(self):
+        fresh = _author(openalex="A1")
+        stale = _author(openalex="A2")
+        new = _author(openalex="A3")
+        UserMetric.upsert(fresh, "openalex", {"h_index": 1})
+        UserMetric.upsert(stale, "openalex", {"h_index": 1})
+        model.Session.query(UserMetric).filter(UserMetric.user_id == stale).update(
+            {"updated_at": func.now() - timedelta(days=10)}
+        )
+        model.Session.commit()
+
+        candidates = UserMetric.refresh_candidates(max_age=timedelta(days=1))
+        assert {row.user_id for row in candidates} == {stale, new}
+        assert {row.user_id for row in UserMetric.refresh_candidates()} == {fresh, stale, new}
+
+    def test_keyset_paging(self):
+        for idx in range(3):
+            _author(openalex=f"A{idx}", semantic_scholar=str(idx))
+        _author(openalex="")
+        expected = [(row.user_id, row.source, row.author_id) for row in UserMetric.refresh_candidates()]
+        assert len(expected) == 6
+
+        pages: list[tuple[str, str, str]] = []
+        after: tuple[str, str] | None = None
+        while rows := UserMetric.refresh_candidates(after=after).limit(4).all():
+            pages.extend((row.user_id, row.source, row.author_id) for row in rows)
+            after = (rows[-1].user_id, rows[-1].source)
+
+        assert pages == expected
+
+    def test_shards_are_disjoint_and_cover_all_candidates(self):
+        for idx in range(12):
+            _author(openalex=f"A{idx}", semantic_scholar=str(idx))
+        expected = {(row.user_id, row.source) for row in UserMetric.refresh_candidates()}
+
+        shards = [
+            {(row.user_id, row.source) for row in UserMetric.refresh_candidates(shard=(idx, 3))} for idx in range(3)
+        ]
+
+        assert set().union(*shards) == expected
+        assert sum(map(len, shards)) == len(expected)
+        # both sources of a user always land in the same shard
+        for shard in shards:
+            assert len(shard) == 2 * len({user_id for user_id, _ in shard})
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestUserMetricHistory:
+    def test_record_skips_unchanged_snapshots(self):
+        user = factories.User()
+
+        for metrics in [
+            {"h_index": 1},
+            {"h_index": 1, "url": "https://example.com"},
+            {"h_index": 1, "citation_count": 5},
+            {"h_index": 1, "citation_count": 5},
+            {"h_index": 1},
+            {"paper_count": "not a number"},
+        ]:
+            UserMetricHistory.record([_row(user["id"], **metrics)])
+            model.Session.commit()
+
+        snapshots = UserMetricHistory.by_user_id(user["id"])
+        assert [(item.h_index, item.citation_count) for item in snapshots] == [(1, None), (1, 5), (1, None)]
+
+    def test_record_compares_with_latest_snapshot_of_the_pair(self):
+        user = factories.User()
+        UserMetricHistory.record([_row(user["id"], h_index=1), _row(factories.User()["id"], h_index=2)])
+        model.Session.commit()
+
+        UserMetricHistory.record([_row(user["id"], h_index=2)])
+        model.Session.commit()
+
+        assert [item.h_index for item in UserMetricHistory.by_user_id(user["id"])] == [1, 2]
+
+    def test_refreshes_in_one_transaction_are_ordered(self):
+        user = factories.User()
+
+        for h_index in [1, 2, 1]:
+            UserMetricHistory.record([_row(user["id"], h_index=h_index)])
+        model.Session.commit()
+
+        snapshots = UserMetricHistory.by_user_id(user["id"])
+        assert [item.h_index for item in snapshots] == [1, 2, 1]
+        assert snapshots[0].recorded_at < snapshots[1].recorded_at < snapshots[2].recorded_at
+
+    def test_limit_keeps_latest_snapshots(self):
+        user = factories.User()
+        for idx in range(5):
+            model.Session.add(
+                UserMetricHistory(
+                    user_id=user["id"],
+                    source="openalex",
+                    recorded_at=datetime(2024, 1, idx + 1, tzinfo=UTC),
+                    h_index=idx,
+                )
+            )
+        model.Session.commit()
+
+        assert [item.h_index for item in UserMetricHistory.by_user_id(user["id"], limit=2)] == [3, 4]
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestUserMetricRank:
+    def test_top_skips_non_numeric_values_and_deleted_users(self):
+        ranked = factories.User()["id"]
+        text = factories.User()["id"]
+        flag = factories.User()["id"]
+        deleted = factories.User()["id"]
+        UserMetric.upsert(ranked, "openalex", {"h_index": 3})
+        UserMetric.upsert(text, "openalex", {"h_index": "3"})
+        UserMetric.upsert(flag, "openalex", {"h_index": True})
+        UserMetric.upsert(deleted, "openalex", {"h_index": 10})
+        UserMetric.upsert(deleted, "semantic_scholar", {"h_index": 10})
+        model.Session.query(model.User).filter(model.User.id == deleted).update({"state": model.State.DELETED})
+        UserMetricRank.refresh()
+        model.Session.commit()
+
+        assert [(row.user_id, row.h_index) for row in UserMetricRank.top("openalex", "h_index")] == [(ranked, 3)]
+        assert UserMetricRank.top("semantic_scholar", "h_index") == []
+        assert UserMetricRank.stats("openalex", "h_index", [0.5]).count == 1
+
+    def test_unknown_metric(self):
+        with pytest.raises(ValueError, match="url"):
+            UserMetricRank.top("openalex", "url")
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestDatasetMetricIndexFields:
+    def test_only_numeric_values_of_requested_metrics(self):
+        package_id = factories.Dataset()["id"]
+        DatasetMetric.upsert(package_id, "openalex", {"citation_count": 5, "score": 1.5, "flag": True, "doi": "10.1"})
+        DatasetMetric.upsert(package_id, "datacite", {"citation_count": "7"})
+
+        assert DatasetMetric.index_fields(package_id, ["citation_count"]) == {"scim_openalex_citation_count": 5}
+        assert DatasetMetric.index_fields(package_id, ["citation_count", "score", "flag", "doi"]) == {
+            "scim_openalex_citation_count": 5,
+            "scim_openalex_score": 1.5,
+        }
+        assert DatasetMetric.index_fields(package_id, []) == {}
+
+
+LEASE = timedelta(minutes=10)
+
+
+def _expire_lease(run: RefreshRun):
+    model.Session.query(RefreshRun).filter(RefreshRun.id == run.id).update({"updated_at": func.now() - 2 * LEASE})
+    model.Session.commit()
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestRefreshRun:
+    def test_claim(self):
+        run = RefreshRun.start({})
+        model.Session.commit()
+        assert not run.claim(LEASE)
+
+        _expire_lease(run)
+        assert run.claim(LEASE)
+        model.Session.commit()
+        assert not run.claim(LEASE)
+
+        run.interrupt()
+        model.Session.commit()
+        assert run.claim(LEASE)
+        assert run.status == RefreshRun.STATUS_RUNNING
+
+        run.finish()
+        model.Session.commit()
+        assert not run.claim(LEASE)
+
+    def test_expired_lease_is_claimed_once(self):
+        run = RefreshRun.start({})
+        model.Session.commit()
+        _expire_lease(run)
+        competitor: list[bool] = []
+
+        def claim():
+            # scoped session of another thread uses its own connection
+            try:
+                other = RefreshRun.get(run.id)
+                assert other
+                competitor.append(other.claim(LEASE))
+                model.Session.commit()
+            finally:
+                model.Session.remove()
+
+        assert run.claim(LEASE)
+        thread = threading.Thread(target=claim)
+        thread.start()
+        # competing update waits for the row lock and re-checks the lease after commit
+        time.sleep(0.2)
+        model.Session.commit()
+        thread.join(5)
+
+        assert competitor == [False]
+
+    def test_checkpoint(self):
+        first = _author(openalex="A1")
+        second = _author(openalex="A2")
+        run = RefreshRun.start({})
+        model.Session.commit()
+        _expire_lease(run)
+
+        run.checkpoint([(first, "openalex", "failed"), (second, "openalex", "updated")])
+        run.checkpoint([(first, "openalex", "empty")])
+        model.Session.commit()
+
+        assert not run.claim(LEASE)
+        items = model.Session.query(RefreshRunItem.user_id, RefreshRunItem.outcome).filter_by(run_id=run.id)
+        assert dict(items.all()) == {first: "empty", second: "updated"}
+        assert not UserMetric.refresh_candidates(run_id=run.id).all()
+
+    def test_failed_pairs_are_not_completed(self):
+        pairs = {outcome: _author(openalex=f"A-{outcome}") for outcome in ("updated", "empty", "failed", "skipped")}
+        run = RefreshRun.start({})
+        run.checkpoint([(user_id, "openalex", outcome) for outcome, user_id in pairs.items()])
+        model.Session.commit()
+
+        candidates = {row.user_id for row in UserMetric.refresh_candidates(run_id=run.id)}
+        assert candidates == {pairs["failed"], pairs["skipped"]}
+
+        run.finish()
+        model.Session.commit()
+
+        assert run.status == RefreshRun.STATUS_COMPLETED
+        assert run.summary == {"total": 4, "updated": 1, "empty": 1, "failed": 1, "skipped": 1}
+        kept = model.Session.query(RefreshRunItem.outcome).filter_by(run_id=run.id)
+        assert sorted(outcome for (outcome,) in kept) == ["failed", "skipped"]
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestBulkUpsert:
+    def test_chunks(self, monkeypatch: pytest.MonkeyPatch):
+        execute = UserMetric._execute_upsert
+        sizes: list[int] = []
+        monkeypatch.setattr(
+            UserMetric, "_execute_upsert", lambda stmt, values: sizes.append(len(values)) or execute(stmt, values)
+        )
+        users = [factories.User()["id"] for _ in range(5)]
+
+        assert UserMetric.bulk_upsert([_row(user_id, h_index=idx) for idx, user_id in enumerate(users)], 2) == 5
+        model.Session.commit()
+
+        assert sizes == [2, 2, 1]
+        assert {record.user_id: record.metrics["h_index"] for record in UserMetric.by_user_ids(users)} == {
+            user_id: idx for idx, user_id in enumerate(users)
+        }
+
+    def test_duplicate_keys_in_batch(self):
+        first = factories.User()["id"]
+        second = factories.User()["id"]
+        UserMetric.upsert(first, "openalex", {"h_index": 1})
+        model.Session.commit()
+
+        rows = [_row(first, h_index=2), _row(second, h_index=1), _row(first, h_index=3), _row(second, h_index=4)]
+        assert UserMetric.bulk_upsert(rows, chunk_size=10) == 2
+        # duplicates across a chunk boundary are written by separate statements, in order
+        assert UserMetric.bulk_upsert([*rows, _row(first, h_index=5)], chunk_size=2) == 5
+        model.Session.commit()
+
+        metrics = {record.user_id: record.metrics["h_index"] for record in UserMetric.by_user_ids([first, second])}
+        assert metrics == {first: 5, second: 4}
+
+    def test_stats(self, monkeypatch: pytest.MonkeyPatch):
+        collector = stats.StatsCollector()
+        monkeypatch.setattr(stats, "get_collector", lambda: collector)
+        package_id = factories.Dataset()["id"]
+
+        DatasetMetric.bulk_upsert([{"package_id": package_id, "source": "openalex", "metrics": {"citation_count": 1}}])
+        DatasetMetric.bulk_upsert([])
+
+        upsert = collector.snapshot()["upsert"]
+        assert (upsert["calls"], upsert["rows"]) == (1, 1)
+        assert upsert["seconds"] > 0
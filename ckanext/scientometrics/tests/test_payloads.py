@@ -0,0 +1,24 @@
+from ckanext.scientometrics.payloads import SqlitePayloadCache
+
+
+class TestSqlitePayloadCache:
+    def test_read_write(self, tmp_path):
+        cache = SqlitePayloadCache(str(tmp_path / "payloads.db"), ttl=60)
+        cache.set_many("openalex", {"A1": {"works_count": 1}, "A2": {"works_count": 2}})
+
+        assert cache.get_many("openalex", ["A1", "A3"]) == {"A1": {"works_count": 1}}
+        assert cache.get_many("semantic_scholar", ["A1"]) == {}
+
+    def test_expiration(self, tmp_path):
+        cache = SqlitePayloadCache(str(tmp_path / "payloads.db"), ttl=-1)
+        cache.set_many("openalex", {"A1": {}})
+
+        assert cache.get_many("openalex", ["A1"]) == {}
+        assert cache.purge() == 1
+
+    def test_no_expiration_without_ttl(self, tmp_path):
+        cache = SqlitePayloadCache(str(tmp_path / "payloads.db"), ttl=0)
+        cache.set_many("openalex", {"A1": {}})
+
+        assert cache.get_many("openalex", ["A1"]) == {"A1": {}}
+        assert cache.purge() == 0
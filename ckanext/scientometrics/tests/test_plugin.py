@@ -1,9 +1,30 @@
 import pytest
 
 from ckan.plugins import plugin_loaded
+from ckan.tests import factories
+
+from ckanext.scientometrics.model import DatasetMetric
+from ckanext.scientometrics.plugin import ScientometricsPlugin
 
 
 @pytest.mark.ckan_config("ckan.plugins", "scientometrics")
 @pytest.mark.usefixtures("with_plugins")
 def test_plugin():
     assert plugin_loaded("scientometrics")
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestBeforeDatasetIndex:
+    def _indexed(self) -> tuple[str, dict[str, object]]:
+        dataset = factories.Dataset()
+        DatasetMetric.upsert(dataset["id"], "openalex", {"citation_count": 5, "h_index": 2, "doi": "10.5281/zenodo.1"})
+        return dataset["id"], ScientometricsPlugin().before_dataset_index({"id": dataset["id"]})
+
+    def test_default_metrics(self):
+        package_id, pkg_dict = self._indexed()
+        assert pkg_dict == {"id": package_id, "scim_openalex_citation_count": 5}
+
+    @pytest.mark.ckan_config("ckanext.scientometrics.index.metrics", "citation_count h_index")
+    def test_configured_metrics(self):
+        package_id, pkg_dict = self._indexed()
+        assert pkg_dict == {"id": package_id, "scim_openalex_citation_count": 5, "scim_openalex_h_index": 2}
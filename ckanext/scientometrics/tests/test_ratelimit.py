@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from ckanext.scientometrics import ratelimit
+from ckanext.scientometrics.metrics_extractors import RateLimitedError
+
+
+class TestMemoryRateLimiter:
+    def test_burst_is_not_delayed(self):
+        limiter = ratelimit.MemoryRateLimiter(rate=10, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        assert time.monotonic() - start < 0.05
+
+    def test_requests_are_spaced(self):
+        limiter = ratelimit.MemoryRateLimiter(rate=20)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        assert time.monotonic() - start >= 0.09
+
+    def test_pause(self):
+        limiter = ratelimit.MemoryRateLimiter(rate=100, burst=5)
+        limiter.pause(0.1)
+        start = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - start >= 0.09
+
+    def test_async_requests_are_spaced(self):
+        limiter = ratelimit.MemoryRateLimiter(rate=20)
+
+        async def acquire_many():
+            await asyncio.gather(*(limiter.acquire_async() for _ in range(3)))
+
+        start = time.monotonic()
+        asyncio.run(acquire_many())
+        assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.ckan_config("ckanext.scientometrics.rate_limit.rates", "")
+@pytest.mark.ckan_config("ckanext.scientometrics.rate_limit.max_attempts", "3")
+@pytest.mark.ckan_config("ckanext.scientometrics.rate_limit.base_backoff", "0")
+@pytest.mark.usefixtures("with_plugins")
+class TestCall:
+    def test_throttled_call_is_retried(self):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) < 3:
+                raise RateLimitedError("test", retry_after=0)
+            return "ok"
+
+        assert ratelimit.call("test", func) == "ok"
+        assert len(calls) == 3
+
+    def test_error_after_last_attempt(self):
+        def func():
+            raise RateLimitedError("test", retry_after=0)
+
+        with pytest.raises(RateLimitedError):
+            ratelimit.call("test", func)
+
+    def test_retry_waits_for_delay(self):
+        calls = []
+
+        def func():
+            calls.append(time.monotonic())
+            if len(calls) < 2:
+                raise RateLimitedError("test", retry_after=0.1)
+            return "ok"
+
+        assert ratelimit.call("test", func) == "ok"
+        assert calls[1] - calls[0] >= 0.09
+
+    def test_async_retry_waits_for_delay(self):
+        calls = []
+
+        async def func():
+            calls.append(time.monotonic())
+            if len(calls) < 2:
+                raise RateLimitedError("test", retry_after=0.1)
+            return "ok"
+
+        assert asyncio.run(ratelimit.call_async("test", func)) == "ok"
+        assert calls[1] - calls[0] >= 0.09
@@ -0,0 +1,271 @@
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any
+
+import pytest
+
+from ckan import model
+from ckan.tests import factories
+
+from ckanext.scientometrics import circuit, refresh, utils
+from ckanext.scientometrics.circuit import CircuitBreaker, CircuitOpenError
+from ckanext.scientometrics.metrics_extractors import AuthorMetricsExtractor
+from ckanext.scientometrics.model import DatasetMetric, UserMetric
+from ckanext.scientometrics.refresh import AsyncBulkRefresher, BulkRefresher, DatasetRefresher, RefreshTask
+
+
+class FakeFetch:
+    """Replacement of `refresh._fetch` that tracks concurrency of sources.
+
+    Authors with `missing` in ID are unknown, batches that contain `error`
+    fail and the `suspended` source has an open circuit breaker.
+    """
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.active: Counter[str] = Counter()
+        self.peak: Counter[str] = Counter()
+        self.batches: list[tuple[str, list[str]]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, source: str, batch: list[RefreshTask]) -> dict[str, dict[str, Any]]:
+        author_ids = [task.author_id for task in batch]
+        with self.lock:
+            self.batches.append((source, author_ids))
+            self.active[source] += 1
+            self.peak[source] = max(self.peak[source], self.active[source])
+        try:
+            time.sleep(self.delay)
+            if source == "suspended":
+                raise CircuitOpenError(source)
+            if any("error" in author_id for author_id in author_ids):
+                raise RuntimeError(source)
+            return {author_id: {"h_index": 1} for author_id in author_ids if "missing" not in author_id}
+        finally:
+            with self.lock:
+                self.active[source] -= 1
+
+
+class FakeRun:
+    """Refresh run that records checkpoints instead of writing them."""
+
+    def __init__(self):
+        self.outcomes: list[tuple[str, str, str]] = []
+        self.threads: set[str] = set()
+
+    def checkpoint(self, outcomes: list[tuple[str, str, str]]):
+        self.threads.add(threading.current_thread().name)
+        self.outcomes.extend(outcomes)
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch: pytest.MonkeyPatch) -> FakeFetch:
+    fetch = FakeFetch()
+    monkeypatch.setattr(refresh, "_fetch", fetch)
+    monkeypatch.setattr(refresh, "_batch_size", lambda source: 5 if source == "batched" else 1)
+    return fetch
+
+
+@pytest.fixture
+def writes(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, int]]:
+    """Thread names and sizes of upserts and commits, in order."""
+    calls: list[tuple[str, int]] = []
+    monkeypatch.setattr(
+        UserMetric,
+        "bulk_upsert",
+        lambda rows: calls.append((threading.current_thread().name, len(rows))),
+    )
+    monkeypatch.setattr(model.Session, "commit", lambda: calls.append((threading.current_thread().name, 0)))
+    return calls
+
+
+def _tasks(sources: list[str], count: int, prefix: str = "author") -> list[RefreshTask]:
+    return [RefreshTask(f"user-{idx}", source, f"{prefix}-{idx}") for idx in range(count) for source in sources]
+
+
+@pytest.mark.usefixtures("with_plugins", "writes")
+class TestBulkRefresher:
+    def test_source_limits(self, fake_fetch: FakeFetch):
+        summary = BulkRefresher(workers=4, source_limits={"slow": 1}).run(_tasks(["slow", "fast"], 20))
+
+        assert summary.updated == 40
+        assert fake_fetch.peak["slow"] == 1
+        assert fake_fetch.peak["fast"] > 1
+
+    def test_batches(self, fake_fetch: FakeFetch):
+        BulkRefresher(workers=2).run(_tasks(["batched"], 12))
+
+        assert sorted(len(author_ids) for _, author_ids in fake_fetch.batches) == [2, 5, 5]
+
+    def test_outcomes(self, fake_fetch: FakeFetch):
+        tasks = [
+            RefreshTask("user-1", "fast", "author-1"),
+            RefreshTask("user-2", "fast", "missing-2"),
+            RefreshTask("user-3", "fast", "error-3"),
+            RefreshTask("user-4", "suspended", "author-4"),
+        ]
+        run = FakeRun()
+        done: list[RefreshTask] = []
+
+        summary = BulkRefresher(workers=2).run(tasks, done.append, refresh_run=run)
+
+        assert (summary.total, summary.updated, summary.empty, summary.failed, summary.skipped) == (4, 1, 1, 1, 1)
+        assert sorted(done, key=lambda task: task.user_id) == tasks
+        assert sorted(run.outcomes) == [
+            ("user-1", "fast", "updated"),
+            ("user-2", "fast", "empty"),
+            ("user-3", "fast", "failed"),
+            ("user-4", "suspended", "skipped"),
+        ]
+
+    def test_single_committer(self, fake_fetch: FakeFetch, writes: list[tuple[str, int]]):
+        run = FakeRun()
+        BulkRefresher(workers=4, commit_every=5).run(_tasks(["fast"], 12), refresh_run=run)
+
+        committer = threading.current_thread().name
+        assert {thread for thread, _ in writes} == {committer}
+        assert run.threads == {committer}
+        assert sum(size for _, size in writes) == 12
+        assert len(run.outcomes) == 12
+
+
+class FakeAsyncExtractor(AuthorMetricsExtractor):
+    """Native coroutine extractor that tracks concurrent requests."""
+
+    provider = "fake"
+    batch_size = 2
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.threads: set[str] = set()
+
+    async def extract_metrics_many_async(self, author_ids: list[str]) -> dict[str, dict[str, Any]]:
+        self.threads.add(threading.current_thread().name)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return {author_id: {"h_index": 1} for author_id in author_ids if "missing" not in author_id}
+
+
+class BlockingBreaker(CircuitBreaker):
+    """Breaker that records threads it is called from."""
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__("fake", threshold=1, cooldown=1)
+        self.threads: set[str] = set()
+
+    def allow(self) -> bool:
+        self.threads.add(threading.current_thread().name)
+        return True
+
+    def record_success(self):
+        self.threads.add(threading.current_thread().name)
+
+
+@pytest.mark.usefixtures("with_plugins", "writes")
+class TestAsyncBulkRefresher:
+    def test_run(self, monkeypatch: pytest.MonkeyPatch, writes: list[tuple[str, int]]):
+        extractor = FakeAsyncExtractor()
+        breaker = BlockingBreaker()
+        monkeypatch.setattr(utils, "get_metrics_extractor", lambda source: extractor)
+        monkeypatch.setattr(circuit, "get_breaker", lambda provider: breaker)
+        tasks = [RefreshTask(f"user-{idx}", "fake", f"author-{idx}") for idx in range(10)]
+        tasks.append(RefreshTask("user-missing", "fake", "missing"))
+
+        summary = AsyncBulkRefresher(workers=3).run(tasks)
+
+        assert (summary.total, summary.updated, summary.empty) == (11, 10, 1)
+        assert 1 < extractor.peak <= 3
+        assert breaker.threads
+        assert threading.current_thread().name not in breaker.threads
+        # the loop has its own thread, database is used only by the caller
+        assert extractor.threads == {"scim-refresh-loop"}
+        assert {thread for thread, _ in writes} == {threading.current_thread().name}
+
+    def test_loop_is_stopped_after_interruption(self, monkeypatch: pytest.MonkeyPatch):
+        extractor = FakeAsyncExtractor()
+        monkeypatch.setattr(utils, "get_metrics_extractor", lambda source: extractor)
+        monkeypatch.setattr(circuit, "get_breaker", lambda provider: None)
+        tasks = [RefreshTask(f"user-{idx}", "fake", f"author-{idx}") for idx in range(10)]
+
+        def interrupt(task: RefreshTask):
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            AsyncBulkRefresher(workers=3).run(tasks, interrupt)
+        assert "scim-refresh-loop" not in {thread.name for thread in threading.enumerate()}
+
+
+@pytest.mark.usefixtures("with_plugins", "fake_fetch")
+class TestRunState:
+    def _state(self, tasks: list[RefreshTask], workers: int = 2, **limits: int) -> refresh._RunState:
+        return refresh._RunState(BulkRefresher(workers=workers, source_limits=limits), iter(tasks), None)
+
+    def test_incomplete_batch_is_postponed_while_source_is_busy(self):
+        state = self._state(_tasks(["batched"], 10, prefix="next"))
+        state.pending["batched"] = deque(_tasks(["batched"], 3))
+        state.batch_sizes["batched"] = 5
+        state.active["batched"] = 1
+
+        state.dispatch(lambda source, batch: Future())
+        assert not state.inflight
+
+        state.exhausted = True
+        state.dispatch(lambda source, batch: Future())
+        assert [len(batch) for batch in state.inflight.values()] == [3]
+
+    def test_slow_source_does_not_take_whole_backlog(self):
+        state = self._state(_tasks(["slow", "fast"], 1000), slow=1)
+        state.pending = {"slow": deque(_tasks(["slow"], 50, prefix="queued")), "fast": deque()}
+        state.batch_sizes = {"slow": 1, "fast": 1}
+
+        state.fill()
+
+        assert len(state.pending["fast"]) >= state._quota("fast")
+        assert sum(map(len, state.pending.values())) <= state._backlog() * refresh._MAX_BACKLOG_FACTOR
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestDatasetRefresher:
+    def test_dois_are_normalized_and_deduplicated(self, monkeypatch: pytest.MonkeyPatch):
+        requested: list[list[str]] = []
+
+        def fetch(source: str, dois: list[str]) -> dict[str, dict[str, Any]]:
+            requested.append(dois)
+            return {doi: {"citation_count": 5} for doi in dois}
+
+        monkeypatch.setattr(utils, "fetch_many_dataset_metrics", fetch)
+        first = factories.Dataset(extras=[{"key": "doi", "value": "https://doi.org/10.5281/ZENODO.1"}])
+        second = factories.Dataset(extras=[{"key": "doi", "value": "doi:10.5281/zenodo.1"}])
+        factories.Dataset()
+
+        summary = DatasetRefresher(reindex=False).run("openalex")
+
+        assert requested == [["10.5281/zenodo.1"]]
+        assert (summary.total, summary.updated) == (2, 2)
+        for dataset in (first, second):
+            [metric] = DatasetMetric.by_package_id(dataset["id"])
+            assert metric.metrics == {"citation_count": 5, "doi": "10.5281/zenodo.1"}
+
+    @pytest.mark.parametrize(
+        ("error", "outcome"),
+        [(CircuitOpenError("openalex"), "skipped"), (KeyError("results"), "failed")],
+    )
+    def test_fetch_errors(self, monkeypatch: pytest.MonkeyPatch, error: Exception, outcome: str):
+        def fetch(source: str, dois: list[str]) -> dict[str, dict[str, Any]]:
+            raise error
+
+        monkeypatch.setattr(utils, "fetch_many_dataset_metrics", fetch)
+        dataset = factories.Dataset(extras=[{"key": "doi", "value": "10.5281/zenodo.1"}])
+
+        summary = DatasetRefresher(reindex=False).run("openalex")
+
+        assert (summary.total, getattr(summary, outcome)) == (1, 1)
+        assert not DatasetMetric.by_package_id(dataset["id"])
@@ -0,0 +1,150 @@
+import asyncio
+import json
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from ckanext.scientometrics.sessions import AsyncProviderSession, ProviderSession, RateLimitedError
+
+_Respond = Callable[[str, dict[str, str]], tuple[int, dict[str, str], Any]]
+
+
+class FakeAdapter(BaseAdapter):
+    """Transport of `requests` that answers from a callable and records requests."""
+
+    def __init__(self, respond: _Respond):
+        super().__init__()
+        self.respond = respond
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        headers = dict(request.headers)
+        self.requests.append((request.url or "", headers))
+        status, response_headers, body = self.respond(request.url or "", headers)
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(response_headers)
+        response._content = json.dumps(body).encode() if body is not None else b""
+        response.url = request.url or ""
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def _versioned(etag: str = '"v1"', last_modified: str | None = None) -> _Respond:
+    """Resource that answers 304 when the request carries its validators."""
+    validators = {"ETag": etag}
+    if last_modified:
+        validators["Last-Modified"] = last_modified
+
+    def respond(url: str, headers: dict[str, str]) -> tuple[int, dict[str, str], Any]:
+        if headers.get("If-None-Match") == etag:
+            return 304, validators, None
+        return 200, validators, {"url": url}
+
+    return respond
+
+
+def _session(respond: _Respond, **kwargs: Any) -> tuple[ProviderSession, FakeAdapter]:
+    session = ProviderSession("test", **kwargs)
+    adapter = FakeAdapter(respond)
+    session.session.mount("https://", adapter)
+    return session, adapter
+
+
+class TestProviderSession:
+    def test_conditional_request(self):
+        session, adapter = _session(_versioned(last_modified="Wed, 21 Oct 2015 07:28:00 GMT"))
+
+        first = session.get_json("https://example.com/items", {"id": "1"})
+        second = session.get_json("https://example.com/items", {"id": "1"})
+
+        assert first == second == {"url": "https://example.com/items?id=1"}
+        assert "If-None-Match" not in adapter.requests[0][1]
+        assert adapter.requests[1][1]["If-None-Match"] == '"v1"'
+        assert adapter.requests[1][1]["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    def test_validators_are_kept_per_url(self):
+        session, adapter = _session(_versioned())
+
+        session.get_json("https://example.com/items", {"id": "1"})
+        session.get_json("https://example.com/items", {"id": "2"})
+
+        assert all("If-None-Match" not in headers for _, headers in adapter.requests)
+
+    def test_lru_eviction(self):
+        session, adapter = _session(_versioned(), validators_size=2)
+
+        for item in ["1", "2", "1", "3", "1", "2"]:
+            session.get_json(f"https://example.com/items/{item}")
+
+        conditional = [url.rsplit("/", 1)[-1] for url, headers in adapter.requests if "If-None-Match" in headers]
+        # "2" is the least recently used when "3" arrives
+        assert conditional == ["1", "1"]
+
+    def test_responses_without_validators_are_not_remembered(self):
+        session, adapter = _session(lambda url, headers: (200, {}, {"ok": True}))
+
+        session.get_json("https://example.com/items")
+        session.get_json("https://example.com/items")
+
+        assert all("If-None-Match" not in headers for _, headers in adapter.requests)
+
+    @pytest.mark.parametrize(("retry_after", "expected"), [("12", 12), ("1.5", 1.5), ("Wed, 21 Oct 2015", None)])
+    def test_rate_limited(self, retry_after: str, expected: float | None):
+        session, _ = _session(lambda url, headers: (429, {"Retry-After": retry_after}, None))
+
+        with pytest.raises(RateLimitedError) as err:
+            session.get_json("https://example.com/items")
+
+        assert err.value.provider == "test"
+        assert err.value.retry_after == expected
+
+    def test_error_response(self):
+        session, _ = _session(lambda url, headers: (503, {}, None))
+
+        with pytest.raises(requests.HTTPError):
+            session.post_json("https://example.com/items", {"ids": ["1"]})
+
+
+class TestAsyncProviderSession:
+    def _session(self, respond: _Respond, **kwargs: Any) -> tuple[AsyncProviderSession, list[dict[str, str]]]:
+        sent: list[dict[str, str]] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            headers = dict(request.headers)
+            sent.append(headers)
+            status, response_headers, body = respond(str(request.url), headers)
+            return httpx.Response(status, headers=response_headers, json=body)
+
+        session = AsyncProviderSession("test", **kwargs)
+        session.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return session, sent
+
+    def test_conditional_request(self):
+        session, sent = self._session(_versioned())
+
+        async def fetch_twice() -> list[Any]:
+            try:
+                return [await session.get_json("https://example.com/items", {"id": "1"}) for _ in range(2)]
+            finally:
+                await session.aclose()
+
+        assert asyncio.run(fetch_twice()) == [{"url": "https://example.com/items?id=1"}] * 2
+        assert "if-none-match" not in sent[0]
+        assert sent[1]["if-none-match"] == '"v1"'
+
+    def test_rate_limited(self):
+        session, _ = self._session(lambda url, headers: (429, {"Retry-After": "7"}, None))
+
+        with pytest.raises(RateLimitedError) as err:
+            asyncio.run(session.get_json("https://example.com/items"))
+
+        assert err.value.retry_after == 7
@@ -0,0 +1,47 @@
+import socket
+
+import pytest
+
+from ckanext.scientometrics import stats
+from ckanext.scientometrics.stats import StatsCollector, StatsdExporter
+
+
+class TestStatsCollector:
+    def test_calls(self):
+        collector = StatsCollector()
+        collector.record_call("openalex_author", 0.5, {"success": 2, "empty": 1})
+        collector.record_call("openalex_author", 1.5, {"success": 1})
+        collector.record_call("openalex_author", 9, {"failed": 3})
+
+        data = collector.snapshot()["sources"]["openalex_author"]
+        assert data["calls"] == 3
+        assert data["failed_calls"] == 1
+        assert data["items"] == {"success": 3, "empty": 1, "failed": 3, "skipped": 0}
+        assert data["latency"]["mean"] == 1
+        assert data["latency"]["max"] == 1.5
+
+    def test_upserts(self, monkeypatch: pytest.MonkeyPatch):
+        clock = iter([0.0, 10.0])
+        monkeypatch.setattr(stats.time, "perf_counter", lambda: next(clock))
+        collector = StatsCollector()
+        collector.record_upsert("scim_user_metric", 100, 0.25)
+        collector.record_upsert("scim_user_metric", 50, 0.5)
+        collector.record_call("openalex_author", 1, {"success": 30})
+
+        snapshot = collector.snapshot()
+        assert snapshot["elapsed"] == 10
+        assert snapshot["upsert"] == {"calls": 2, "rows": 150, "seconds": 0.75, "rows_per_second": 200}
+        assert snapshot["sources"]["openalex_author"]["items_per_second"] == 3
+
+
+class TestStatsdExporter:
+    def test_send(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1)
+        exporter = StatsdExporter(f"127.0.0.1:{receiver.getsockname()[1]}", "ckan.scim")
+
+        exporter.record_call("openalex_author", 0.25, {"success": 2, "empty": 0})
+
+        lines = receiver.recv(1024).decode().splitlines()
+        assert lines == ["ckan.scim.openalex_author.call:250.000|ms", "ckan.scim.openalex_author.success:2|c"]
@@ -0,0 +1,65 @@
+from typing import Any
+
+import pytest
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.tests import factories
+
+from ckanext.scientometrics import utils
+from ckanext.scientometrics.metrics_extractors import AuthorMetricsExtractor, OpenAlexAuthorMetricsExtractor
+
+
+@pytest.mark.usefixtures("with_plugins", "scim_db")
+class TestResolveUser:
+    def test_by_id_and_name(self):
+        user = factories.User()
+        userobj = model.User.get(user["id"])
+        assert userobj
+        userobj.plugin_extras = {"scim": {"openalex_author_id": "A1"}}
+        model.Session.commit()
+
+        expected = utils.ResolvedUser(user["id"], {"openalex": "A1"})
+        assert utils.resolve_user(user["id"]) == expected
+        assert utils.resolve_user(user["name"]) == expected
+
+    def test_id_wins_over_name(self):
+        user = factories.User()
+        factories.User(name=user["id"])
+
+        assert utils.resolve_user(user["id"]).id == user["id"]
+
+    def test_missing_user(self):
+        with pytest.raises(tk.ObjectNotFound):
+            utils.resolve_user("not-a-user")
+
+
+class FirstExtractor(AuthorMetricsExtractor):
+    pass
+
+
+class SecondExtractor(AuthorMetricsExtractor):
+    pass
+
+
+class FakePlugin:
+    def __init__(self, extractors: dict[str, Any]):
+        self.extractors = extractors
+
+    def get_metrics_extractors(self) -> dict[str, Any]:
+        return self.extractors
+
+
+class TestCollectExtractors:
+    def test_earlier_plugin_wins(self, monkeypatch: pytest.MonkeyPatch):
+        plugins = [
+            FakePlugin({"custom_author": FirstExtractor}),
+            FakePlugin({"custom_author": SecondExtractor, "google_scholar_author": SecondExtractor}),
+        ]
+        monkeypatch.setattr(utils.p, "PluginImplementations", lambda interface: plugins)
+
+        extractors = utils._collect_extractors()
+
+        assert type(extractors["custom_author"]) is FirstExtractor
+        assert type(extractors["google_scholar_author"]) is SecondExtractor
+        assert type(extractors["openalex_author"]) is OpenAlexAuthorMetricsExtractor
@@ -1,38 +1,315 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, NamedTuple, TypeVar
+
+import sqlalchemy as sa
 
 import ckan.plugins as p
+import ckan.plugins.toolkit as tk
+from ckan import model
 
+from ckanext.scientometrics import circuit, ratelimit, stats
 from ckanext.scientometrics.interfaces import IScientometrics
 from ckanext.scientometrics.metrics_extractors import (
     AuthorMetricsExtractor,
+    DatasetMetricsExtractor,
     GoogleScholarAuthorMetricsExtractor,
+    MetricsExtractor,
     OpenAlexAuthorMetricsExtractor,
+    OpenAlexDatasetMetricsExtractor,
     SemanticScholarAuthorMetricsExtractor,
 )
+from ckanext.scientometrics.model import AUTHOR_ID_SUFFIX, UserMetric
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+_Results = dict[str, dict[str, Any]]
+
+_extractors: dict[str, MetricsExtractor] | None = None
+_extractors_lock = threading.Lock()
+
+
+class StoredMetricState(NamedTuple):
+    """Part of an existing metric record that survives a refresh."""
+
+    external_id: str | None
+    external_url: str | None
+    status: str
+
+    @classmethod
+    def from_record(cls, record: UserMetric) -> StoredMetricState:
+        return cls(record.external_id, record.external_url, record.status)
+
+
+class ResolvedUser(NamedTuple):
+    """User ID with author IDs from its extras."""
+
+    id: str
+    authors: dict[str, str]
+
 
 def get_metrics_extractor(source: str) -> AuthorMetricsExtractor:
-    extractors = {
+    """Shared author extractor instance registered for the source.
+
+    Raises:
+        ValueError: no author extractor is registered for the source
+    """
+    extractor = get_metrics_extractors().get(source)
+    if isinstance(extractor, AuthorMetricsExtractor):
+        return extractor
+    raise ValueError(source)
+
+
+def get_dataset_metrics_extractor(source: str) -> DatasetMetricsExtractor:
+    """Shared dataset extractor instance registered for the source.
+
+    Raises:
+        ValueError: no dataset extractor is registered for the source
+    """
+    extractor = get_metrics_extractors().get(source)
+    if isinstance(extractor, DatasetMetricsExtractor):
+        return extractor
+    raise ValueError(source)
+
+
+def get_metrics_extractors() -> dict[str, MetricsExtractor]:
+    """Registry of extractor instances, built once from `IScientometrics` implementations."""
+    global _extractors  # noqa: PLW0603
+    if _extractors is None:
+        with _extractors_lock:
+            if _extractors is None:
+                _extractors = _collect_extractors()
+    return _extractors
+
+
+def reset_metrics_extractors():
+    """Forget the registry, so it's rebuilt from plugins on next access."""
+    global _extractors  # noqa: PLW0603
+    _extractors = None
+
+
+def _collect_extractors() -> dict[str, MetricsExtractor]:
+    factories: dict[str, type[MetricsExtractor]] = {
         "google_scholar_author": GoogleScholarAuthorMetricsExtractor,
         "semantic_scholar_author": SemanticScholarAuthorMetricsExtractor,
         "openalex_author": OpenAlexAuthorMetricsExtractor,
+        "openalex_dataset": OpenAlexDatasetMetricsExtractor,
     }
-    for plugin in p.PluginImplementations(IScientometrics):
-        custom = plugin.get_metrics_extractors() or {}
-        if custom:
-            extractors.update(custom)
-            break
-    if source not in extractors:
-        raise ValueError
-    return extractors[source]()
+    # plugins listed earlier in `ckan.plugins` take precedence
+    for plugin in reversed(list(p.PluginImplementations(IScientometrics))):
+        factories.update(plugin.get_metrics_extractors() or {})
+    return {source: factory() for source, factory in factories.items()}
+
+
+def source_providers(sources: Iterable[str]) -> list[str]:
+    """Unique providers that serve the given sources."""
+    providers: list[str] = []
+    for source in sources:
+        try:
+            providers.append(get_metrics_extractor(source + "_author").provider or source)
+        except ValueError:
+            continue
+    return list(dict.fromkeys(providers))
 
 
 def fetch_author_metrics(source: str, author_id: str) -> dict[str, Any]:
-    """Fetch author metrics from the given source using the unified extractor."""
+    """Fetch author metrics from the given source using the unified extractor.
+
+    Raises:
+        CircuitOpenError: provider failed too many times in a row
+    """
+    extractor = get_metrics_extractor(source)
+    results = _call_provider(
+        source,
+        extractor,
+        [author_id],
+        lambda: {author_id: extractor.extract_metrics(author_id)},
+    )
+    return results[author_id]
+
+
+def fetch_many_author_metrics(source: str, author_ids: list[str]) -> dict[str, dict[str, Any]]:
+    """Fetch metrics of multiple authors from the given source in as few requests as possible.
+
+    Raises:
+        CircuitOpenError: provider failed too many times in a row
+    """
+    extractor = get_metrics_extractor(source)
+    return _call_provider(
+        source,
+        extractor,
+        author_ids,
+        lambda: extractor.extract_metrics_many(author_ids),
+    )
+
+
+async def fetch_many_author_metrics_async(source: str, author_ids: list[str]) -> dict[str, dict[str, Any]]:
+    """Asynchronous version of `fetch_many_author_metrics`."""
     extractor = get_metrics_extractor(source)
-    return extractor.extract_metrics(author_id)
+    return await _call_provider_async(
+        source,
+        extractor,
+        author_ids,
+        lambda: extractor.extract_metrics_many_async(author_ids),
+    )
+
+
+def fetch_many_dataset_metrics(source: str, dois: list[str]) -> dict[str, dict[str, Any]]:
+    """Fetch metrics of multiple datasets identified by normalized DOIs.
+
+    Raises:
+        CircuitOpenError: provider failed too many times in a row
+    """
+    extractor = get_dataset_metrics_extractor(source)
+    return _call_provider(source, extractor, dois, lambda: extractor.extract_metrics_many(dois))
+
+
+def _call_provider(
+    source: str,
+    extractor: MetricsExtractor,
+    ids: list[str],
+    func: Callable[[], _Results],
+) -> _Results:
+    """Call provider of the extractor through its circuit breaker and rate limiter, recording stats."""
+    provider = extractor.provider or source
+    started = time.perf_counter()
+    breaker = circuit.get_breaker(provider)
+    if breaker and not breaker.allow():
+        _record_call(source, started, ids, stats.OUTCOME_SKIPPED)
+        raise circuit.CircuitOpenError(provider)
+
+    try:
+        result = ratelimit.call(provider, func, pooled=extractor.credential_pool() is not None)
+    except Exception:
+        _record_call(source, started, ids, stats.OUTCOME_FAILED)
+        if breaker:
+            breaker.record_failure()
+        raise
+
+    _record_call(source, started, ids, result)
+    if breaker:
+        breaker.record_success()
+    return result
+
+
+async def _call_provider_async(
+    source: str,
+    extractor: MetricsExtractor,
+    ids: list[str],
+    func: Callable[[], Awaitable[_Results]],
+) -> _Results:
+    provider = extractor.provider or source
+    started = time.perf_counter()
+    breaker = circuit.get_breaker(provider)
+    if breaker and not await _breaker_call(breaker, breaker.allow):
+        _record_call(source, started, ids, stats.OUTCOME_SKIPPED)
+        raise circuit.CircuitOpenError(provider)
+
+    try:
+        result = await ratelimit.call_async(provider, func, pooled=extractor.credential_pool() is not None)
+    except Exception:
+        _record_call(source, started, ids, stats.OUTCOME_FAILED)
+        if breaker:
+            await _breaker_call(breaker, breaker.record_failure)
+        raise
+
+    _record_call(source, started, ids, result)
+    if breaker:
+        await _breaker_call(breaker, breaker.record_success)
+    return result
+
+
+async def _breaker_call(breaker: circuit.CircuitBreaker, method: Callable[[], T]) -> T:
+    """Call method of the breaker without blocking the event loop on Redis."""
+    if breaker.blocking:
+        return await asyncio.to_thread(method)
+    return method()
+
+
+def _record_call(source: str, started: float, ids: list[str], result: _Results | str):
+    """Record the call with outcome of every requested item.
+
+    Result of the call is either metrics keyed by ID or the outcome shared by
+    all items.
+    """
+    unique = set(ids)
+    if isinstance(result, str):
+        outcomes = {result: len(unique)}
+    else:
+        success = sum(1 for item in unique if result.get(item))
+        outcomes = {stats.OUTCOME_SUCCESS: success, stats.OUTCOME_EMPTY: len(unique) - success}
+    stats.get_collector().record_call(source, time.perf_counter() - started, outcomes)
+
+
+def resolve_user(id_or_name: str) -> ResolvedUser:
+    """Resolve user ID or name into ID and author IDs using a single query.
+
+    When the value is the ID of one user and the name of another, the user
+    with this ID wins, as in `user_show`.
+
+    Raises:
+        ObjectNotFound: user does not exist
+    """
+    user = model.User
+    row = (
+        model.Session.query(user.id, user.plugin_extras)
+        .filter(sa.or_(user.id == id_or_name, user.name == id_or_name))
+        .order_by(sa.case((user.id == id_or_name, 0), else_=1))
+        .first()
+    )
+    if not row:
+        raise tk.ObjectNotFound("user")
+    return ResolvedUser(row.id, get_authors(row.plugin_extras))
+
+
+def get_authors(extras: dict[str, Any] | None) -> dict[str, str]:
+    """Collect author IDs strictly from user extras (scim or legacy scientometrics)."""
+    authors: dict[str, str] = {}
+    scim_extras = (extras or {}).get("scim") or (extras or {}).get("scientometrics") or {}
+    for key, val in scim_extras.items():
+        if key.endswith(AUTHOR_ID_SUFFIX) and val:
+            authors[key.removesuffix(AUTHOR_ID_SUFFIX)] = val
+    return authors
+
+
+def user_metric_row(
+    user_id: str,
+    source: str,
+    author_id: str,
+    extracted: dict[str, Any],
+    previous: StoredMetricState | None = None,
+) -> dict[str, Any]:
+    """Build `UserMetric.bulk_upsert` row, keeping the state of the previous record."""
+    payload = dict(extracted)
+    payload["author_id"] = author_id
+    external_id = payload.get("external_id") or (previous.external_id if previous else str(author_id))
+    external_url = payload.get("external_url") or payload.get("url") or (previous.external_url if previous else None)
+
+    return {
+        "user_id": user_id,
+        "source": source,
+        "metrics": payload,
+        "external_id": external_id,
+        "external_url": external_url,
+        "status": previous.status if previous else "pending",
+    }
+
+
+def dataset_metric_row(package_id: str, source: str, doi: str, extracted: dict[str, Any]) -> dict[str, Any]:
+    """Build `DatasetMetric.bulk_upsert` row."""
+    payload = dict(extracted)
+    payload["doi"] = doi
+    return {
+        "package_id": package_id,
+        "source": source,
+        "metrics": payload,
+        "external_id": payload.get("external_id") or doi,
+        "external_url": payload.get("external_url") or payload.get("url"),
+    }